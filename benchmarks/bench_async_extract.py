@@ -0,0 +1,75 @@
+"""
+Benchmark of the source extraction against a local moto server:
+XetraETL.extract with a thread pool vs. XetraETL.extract_async with the asyncio connector
+
+The requests go over real http connections, which needs the moto server extra
+and aiobotocore (pip install "moto[server]" aiobotocore).
+
+Usage:
+    python -m benchmarks.bench_async_extract --days 10 --files-per-day 100 --workers 16 64 --in-flight 64 256
+"""
+import argparse
+import asyncio
+import logging
+import os
+import pandas as pd
+from unittest.mock import patch
+from moto.server import ThreadedMotoServer
+from benchmarks.common import ACCESS_KEY, SECRET_KEY, put_source_files, timed
+from benchmarks.bench_extract import source_config, target_config
+from xetra.common.async_s3 import AsyncS3BucketConnector
+from xetra.common.meta_process import MetaProcess
+from xetra.common.s3 import S3BucketConnector, S3ClientConfig
+from xetra.transformers.xetra_transformer import XetraETL, XetraETLConfig
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=10)
+    parser.add_argument('--files-per-day', type=int, default=100)
+    parser.add_argument('--rows-per-file', type=int, default=100)
+    parser.add_argument('--workers', type=int, nargs='+', default=[16, 64])
+    parser.add_argument('--in-flight', type=int, nargs='+', default=[64, 256])
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    os.environ[ACCESS_KEY] = 'KEY1'
+    os.environ[SECRET_KEY] = 'KEY2'
+    endpoint_url = f'http://127.0.0.1:{args.port}'
+
+    server = ThreadedMotoServer(port=args.port, verbose=False)
+    server.start()
+    try:
+        buckets = {}
+        for name in ['bench-src', 'bench-trg']:
+            buckets[name] = S3BucketConnector(bucket=name, secret_key=SECRET_KEY, access_key=ACCESS_KEY,
+                                              endpoint_url=endpoint_url)
+            buckets[name]._s3.create_bucket(Bucket=name,
+                                            CreateBucketConfiguration={'LocationConstraint': 'eu-central-1'})
+        dates = [date.strftime('%Y-%m-%d') for date in pd.date_range('2022-01-03', periods=args.days)]
+        keys = put_source_files(buckets['bench-src'], dates, args.files_per_day, args.rows_per_file)
+        print(f'{len(keys)} objects on {endpoint_url}')
+        df_ref = None
+        runs = [('threads', workers) for workers in args.workers] + [('asyncio', limit) for limit in args.in_flight]
+        for mode, concurrency in runs:
+            src = S3BucketConnector(bucket='bench-src', secret_key=SECRET_KEY, access_key=ACCESS_KEY,
+                                    endpoint_url=endpoint_url,
+                                    client_config=S3ClientConfig(max_pool_connections=concurrency))
+            src_async = AsyncS3BucketConnector(bucket='bench-src', secret_key=SECRET_KEY, access_key=ACCESS_KEY,
+                                               endpoint_url=endpoint_url, max_in_flight=concurrency)
+            with patch.object(MetaProcess, 'return_date_list', return_value=[dates[0], dates]):
+                etl = XetraETL(src, buckets['bench-trg'], 'meta_file.csv', source_config(), target_config(),
+                               XetraETLConfig(max_workers=concurrency), src_async)
+            if mode == 'threads':
+                seconds, df = timed(etl.extract)
+            else:
+                seconds, df = timed(lambda: asyncio.run(etl.extract_async()))
+            df_ref = df if df_ref is None else df_ref
+            assert df.equals(df_ref), 'extract output differs between runs'
+            print(f'{mode:8s} concurrency={concurrency:4d}: {seconds:8.3f} s  ({len(keys) / seconds:8.1f} objects/s)')
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Timing report of many concurrent GET requests against a local moto server:
+botocore default pool (10 connections) vs. a pool sized for the number of threads
+
+Unlike the other benchmarks the requests go over real http connections,
+which needs the moto server extra (pip install "moto[server]").
+
+Usage:
+    python -m benchmarks.bench_connections --objects 2000 --threads 8 32 64
+"""
+import argparse
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from moto.server import ThreadedMotoServer
+from benchmarks.common import ACCESS_KEY, SECRET_KEY, timed
+from xetra.common.s3 import S3BucketConnector, S3ClientConfig, shared_s3_resource
+
+
+class DiscardedConnections(logging.Handler):
+    """
+    Counts the connections urllib3 closes because the pool is full,
+    each of them costs a new tcp (and tls) handshake later on
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def emit(self, record):
+        if 'Connection pool is full' in record.getMessage():
+            self.count += 1
+
+
+def get_all(s3_bucket: S3BucketConnector, keys: list, threads: int):
+    """
+    Downloads all keys with a pool of threads
+
+    returns:
+    total number of bytes downloaded
+    """
+    def get(key):
+        return len(s3_bucket._bucket.Object(key=key).get()['Body'].read())
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return sum(executor.map(get, keys))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--objects', type=int, default=2000)
+    parser.add_argument('--object-size', type=int, default=16 * 1024)
+    parser.add_argument('--threads', type=int, nargs='+', default=[8, 32, 64])
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    discarded = DiscardedConnections()
+    urllib3_logger = logging.getLogger('urllib3.connectionpool')
+    urllib3_logger.addHandler(discarded)
+    urllib3_logger.propagate = False
+    os.environ[ACCESS_KEY] = 'KEY1'
+    os.environ[SECRET_KEY] = 'KEY2'
+    endpoint_url = f'http://127.0.0.1:{args.port}'
+
+    server = ThreadedMotoServer(port=args.port, verbose=False)
+    server.start()
+    try:
+        _, s3 = shared_s3_resource('KEY1', 'KEY2', endpoint_url, S3ClientConfig())
+        s3.create_bucket(Bucket='bench-src', CreateBucketConfiguration={'LocationConstraint': 'eu-central-1'})
+        keys = [f'objects/{idx:06d}' for idx in range(args.objects)]
+        body = os.urandom(args.object_size)
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(lambda key: s3.Bucket('bench-src').put_object(Key=key, Body=body), keys))
+        print(f'{args.objects} objects of {args.object_size} bytes on {endpoint_url}')
+        configs = {
+            'default pool': S3ClientConfig(max_pool_connections=10, retry_mode='legacy', tcp_keepalive=False),
+            'sized pool': None}
+        for threads in args.threads:
+            for name, client_config in configs.items():
+                client_config = client_config or S3ClientConfig(max_pool_connections=threads)
+                s3_bucket = S3BucketConnector(bucket='bench-src', secret_key=SECRET_KEY, access_key=ACCESS_KEY,
+                                              endpoint_url=endpoint_url, client_config=client_config)
+                # warm up the connection pool, then measure
+                get_all(s3_bucket, keys[:threads], threads)
+                discarded.count = 0
+                seconds, _ = timed(get_all, s3_bucket, keys, threads)
+                print(f'threads={threads:3d} {name:12s} pool={client_config.max_pool_connections:3d}: '
+                      f'{seconds:7.3f} s  {args.objects / seconds:8.0f} GET/s  '
+                      f'{discarded.count:5d} connections discarded')
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Microbenchmark of the csv parser backends of S3BucketConnector.read_s3_to_df
+across typical Xetra hourly file sizes
+
+Usage:
+    python -m benchmarks.bench_csv_engines --rows 1000 10000 100000 --repeat 5
+"""
+import argparse
+import logging
+from benchmarks.common import start_mock_s3, create_bucket, synthetic_source_df, timed, SRC_COLUMNS
+from benchmarks.bench_memory import CONFIG_PATH
+from xetra.common.constants import CsvEngines
+from xetra.common.s3 import S3BucketConnector
+import yaml
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    src_dtypes = yaml.safe_load(open(CONFIG_PATH))['source_config']['src_dtypes']
+
+    mock = start_mock_s3()
+    try:
+        src = create_bucket('bench-src')
+        connectors = {engine.value: S3BucketConnector(bucket='bench-src', secret_key='AWS_SECRET_ACCESS_KEY',
+                                                      access_key='AWS_ACCESS_KEY_ID', endpoint_url=src.endpoint_url,
+                                                      csv_engine=engine.value)
+                      for engine in CsvEngines}
+        print(f'{"rows":>8s} {"engine":>8s} {"inferred ms":>12s} {"schema ms":>10s}')
+        for rows in args.rows:
+            key = f'bench_{rows}.csv'
+            src.write_df_to_s3(synthetic_source_df(rows, days=1), key, 'csv')
+            for engine, connector in connectors.items():
+                inferred = min(timed(connector.read_s3_to_df, key, 'csv')[0] for _ in range(args.repeat))
+                schema = min(timed(connector.read_s3_to_df, key, 'csv', columns=SRC_COLUMNS, dtypes=src_dtypes)[0]
+                             for _ in range(args.repeat))
+                print(f'{rows:8d} {engine:>8s} {inferred * 1000:12.2f} {schema * 1000:10.2f}')
+    finally:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
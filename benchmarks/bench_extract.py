@@ -0,0 +1,65 @@
+"""
+Benchmark of XetraETL.extract: serial vs. thread pool object fetch on a moto bucket
+
+Usage:
+    python -m benchmarks.bench_extract --days 10 --files-per-day 30 --latency-ms 20
+"""
+import argparse
+import logging
+import pandas as pd
+from unittest.mock import patch
+from benchmarks.common import start_mock_s3, create_bucket, add_latency, put_source_files, timed, SRC_COLUMNS
+from xetra.common.meta_process import MetaProcess
+from xetra.transformers.xetra_transformer import XetraETL, XetraSourceConfig, XetraTargetConfig, \
+    XetraETLConfig
+
+
+def source_config():
+    return XetraSourceConfig(src_first_extract_date='2022-01-01', src_columns=SRC_COLUMNS,
+                             src_col_isin='ISIN', src_col_date='Date', src_col_time='Time',
+                             src_col_start_price='StartPrice', src_col_max_price='MaxPrice',
+                             src_col_min_price='MinPrice', src_col_traded_vol='TradedVolume')
+
+
+def target_config():
+    return XetraTargetConfig(trg_col_isin='isin', trg_col_date='date', trg_col_op_price='opening_price_eur',
+                             trg_col_clos_price='closing_price_eur', trg_col_min_price='minimum_price_eur',
+                             trg_col_max_price='maximum_price_eur', trg_col_daily_trad_vol='daily_traded_volume',
+                             trg_col_ch_prev_clos='change_prev_closing_%', trg_key='report1/xetra_daily_report1_',
+                             trg_key_date_format='%Y%m%d_%H%M%S', trg_format='parquet')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=10)
+    parser.add_argument('--files-per-day', type=int, default=30)
+    parser.add_argument('--rows-per-file', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16, 32])
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    mock = start_mock_s3()
+    try:
+        src = create_bucket('bench-src')
+        trg = create_bucket('bench-trg')
+        dates = [date.strftime('%Y-%m-%d') for date in pd.date_range('2022-01-03', periods=args.days)]
+        keys = put_source_files(src, dates, args.files_per_day, args.rows_per_file)
+        add_latency(src, args.latency_ms)
+        print(f'{len(keys)} objects, {args.latency_ms} ms simulated latency per request')
+        df_ref = None
+        for workers in args.workers:
+            with patch.object(MetaProcess, 'return_date_list', return_value=[dates[1], dates]):
+                etl = XetraETL(src, trg, 'meta_file.csv', source_config(), target_config(),
+                               XetraETLConfig(max_workers=workers))
+            seconds, df = timed(etl.extract)
+            if df_ref is None:
+                df_ref = df
+            assert df.equals(df_ref), 'extract output differs from the serial run'
+            print(f'max_workers={workers:3d}: {seconds:8.3f} s  ({len(keys) / seconds:8.1f} objects/s)')
+    finally:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Timing report of the source listing: serial vs. concurrent prefix listing
+
+Usage:
+    python -m benchmarks.bench_listing --days 60 --files-per-day 2 --latency-ms 50
+"""
+import argparse
+import logging
+import pandas as pd
+from unittest.mock import patch
+from benchmarks.common import start_mock_s3, create_bucket, add_latency, put_source_files, timed
+from benchmarks.bench_extract import source_config, target_config
+from xetra.common.meta_process import MetaProcess
+from xetra.transformers.xetra_transformer import XetraETL, XetraETLConfig
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--files-per-day', type=int, default=2)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8, 32])
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    mock = start_mock_s3()
+    try:
+        src = create_bucket('bench-src')
+        trg = create_bucket('bench-trg')
+        dates = [date.strftime('%Y-%m-%d') for date in pd.date_range('2022-01-03', periods=args.days)]
+        keys = put_source_files(src, dates, args.files_per_day, 1)
+        add_latency(src, args.latency_ms)
+        print(f'{len(dates)} prefixes, {len(keys)} objects, {args.latency_ms} ms simulated latency per request')
+        serial = None
+        for workers in args.workers:
+            with patch.object(MetaProcess, 'return_date_list', return_value=[dates[1], dates]):
+                etl = XetraETL(src, trg, 'meta_file.csv', source_config(), target_config(),
+                               XetraETLConfig(max_workers=workers))
+            seconds, manifest = timed(etl.list_source_files)
+            assert manifest == keys, 'key manifest differs from the expected listing'
+            serial = serial or seconds
+            print(f'max_workers={workers:3d}: {seconds:8.3f} s  (speedup {serial / seconds:5.1f}x)')
+    finally:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Memory report of the source ingestion: inferred dtypes vs. the compact source schema
+of configs/xetra_report1_config.yaml
+
+Usage:
+    python -m benchmarks.bench_memory --rows 1000000
+"""
+import argparse
+import logging
+import os
+import yaml
+from benchmarks.common import start_mock_s3, create_bucket, synthetic_source_df, SRC_COLUMNS
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'configs', 'xetra_report1_config.yaml')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    src_dtypes = yaml.safe_load(open(CONFIG_PATH))['source_config']['src_dtypes']
+
+    mock = start_mock_s3()
+    try:
+        src = create_bucket('bench-src')
+        src.write_df_to_s3(synthetic_source_df(args.rows), 'bench.csv', 'csv')
+        df_default = src.read_s3_to_df('bench.csv', 'csv')
+        df_compact = src.read_s3_to_df('bench.csv', 'csv', columns=SRC_COLUMNS, dtypes=src_dtypes)
+    finally:
+        mock.stop()
+    bytes_default = df_default.memory_usage(deep=True)
+    bytes_compact = df_compact.memory_usage(deep=True)
+    print(f'{"column":14s} {"default B/row":>14s} {"compact B/row":>14s}')
+    for col in SRC_COLUMNS:
+        print(f'{col:14s} {bytes_default[col] / args.rows:14.1f} {bytes_compact[col] / args.rows:14.1f}')
+    total_default = bytes_default.sum() / args.rows
+    total_compact = bytes_compact.sum() / args.rows
+    print(f'{"total":14s} {total_default:14.1f} {total_compact:14.1f}  ({total_default / total_compact:.1f}x smaller)')
+
+
+if __name__ == '__main__':
+    main()
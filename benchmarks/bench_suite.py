@@ -0,0 +1,167 @@
+"""
+Benchmark suite of the report1 pipeline: times extract, transform_report1, load and the
+full etl_report1 on realistic Xetra hourly csv files in a moto bucket at several scales,
+with the source, target & etl settings of configs/xetra_report1_config.yaml.
+The results are written as json and compared against a saved baseline, stages slower
+than the baseline by more than the tolerance are flagged and fail the run.
+
+Usage:
+    python -m benchmarks.bench_suite --scales small medium --save-baseline
+    python -m benchmarks.bench_suite --scales small medium --tolerance 0.2
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from unittest.mock import patch
+import pandas as pd
+import yaml
+from benchmarks.common import start_mock_s3, create_bucket, put_xetra_files, timed
+from xetra.common.instrumentation import run_metrics
+from xetra.common.meta_process import MetaProcess
+from xetra.transformers.xetra_transformer import XetraETL, XetraSourceConfig, XetraTargetConfig, \
+    XetraETLConfig, XetraReportConfig
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'configs', 'xetra_report1_config.yaml')
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+STAGES = ['extract', 'transform_report1', 'load', 'etl_report1']
+# number of ISINs, trading days & traded minutes per ISIN and hour (10 trading hours per day)
+SCALES = {'small': {'isins': 100, 'days': 3, 'trades_per_hour': 2},
+          'medium': {'isins': 1000, 'days': 5, 'trades_per_hour': 4},
+          'large': {'isins': 3000, 'days': 10, 'trades_per_hour': 6}}
+
+
+def environment():
+    """
+    Describes the machine & versions the benchmark ran with
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'timestamp': datetime.now().isoformat(timespec='seconds'), 'commit': commit,
+            'python': platform.python_version(), 'pandas': pd.__version__,
+            'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+
+def run_scale(config: dict, scale: dict, repeat: int):
+    """
+    Generates the source files of a scale and times every stage, the best of repeat runs
+
+    :param config: parsed pipeline configuration
+    :param scale: number of isins, days & trades_per_hour
+    :param repeat: number of runs per stage
+    returns:
+    dictionary of source size & seconds per stage
+    """
+    source = XetraSourceConfig(**config['source_config'])
+    target = XetraTargetConfig(**config['target_config'])
+    etl_config = dict(config.get('etl_config', {}))
+    etl_config['reports'] = [XetraReportConfig(**report) for report in etl_config.get('reports') or []]
+    csv_engine = config['s3'].get('s3_csv_engine', 'pandas')
+    mock = start_mock_s3()
+    try:
+        src = create_bucket('bench-src', csv_engine=csv_engine)
+        trg = create_bucket('bench-trg', csv_engine=csv_engine)
+        dates = [date.strftime('%Y-%m-%d') for date in pd.bdate_range('2022-01-03', periods=scale['days'])]
+        keys, rows = put_xetra_files(src, dates, scale['isins'], scale['trades_per_hour'])
+
+        def xetra_etl():
+            with patch.object(MetaProcess, 'return_date_list', return_value=[dates[1], dates]):
+                return XetraETL(src, trg, config['s3']['meta_key'], source, target, XetraETLConfig(**etl_config))
+        seconds = {stage: [] for stage in STAGES}
+        for _ in range(repeat):
+            etl = xetra_etl()
+            elapsed, df = timed(etl.extract)
+            seconds['extract'].append(elapsed)
+            elapsed, df = timed(etl.transform_report1, df)
+            seconds['transform_report1'].append(elapsed)
+            elapsed, _ = timed(etl.load, df)
+            seconds['load'].append(elapsed)
+            run_metrics.reset()
+            elapsed, _ = timed(xetra_etl().etl_report1)
+            seconds['etl_report1'].append(elapsed)
+        peak_rss = max(stage.get('peak_rss_bytes', 0) for stage in run_metrics.summary()['stages'].values())
+    finally:
+        mock.stop()
+    return {'objects': len(keys), 'rows': rows, 'report_rows': len(df), 'peak_rss_bytes': peak_rss,
+            'seconds': {stage: min(runs) for stage, runs in seconds.items()}}
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """
+    Compares the stage timings of two benchmark runs
+
+    :param results: results of the current run
+    :param baseline: results of the baseline run
+    :param tolerance: relative slowdown still accepted, e.g. 0.1 for 10%
+    returns:
+    list of tuples (scale, stage, baseline seconds, seconds, ratio, regression)
+    """
+    rows = []
+    for scale, result in results['scales'].items():
+        if scale not in baseline['scales']:
+            continue
+        for stage, seconds in result['seconds'].items():
+            baseline_seconds = baseline['scales'][scale]['seconds'].get(stage)
+            if baseline_seconds:
+                ratio = seconds / baseline_seconds
+                rows.append((scale, stage, baseline_seconds, seconds, ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def write_json(data: dict, path: str):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as json_file:
+        json.dump(data, json_file, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small', 'medium'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--config', default=CONFIG_PATH)
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, 'latest.json'))
+    parser.add_argument('--baseline', default=os.path.join(RESULTS_DIR, 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    config = yaml.safe_load(open(args.config))
+
+    results = {'environment': environment(), 'repeat': args.repeat, 'scales': {}}
+    for name in args.scales:
+        result = run_scale(config, SCALES[name], args.repeat)
+        results['scales'][name] = dict(SCALES[name], **result)
+        print(f'{name}: {result["objects"]} objects, {result["rows"]} rows, '
+              f'peak RSS {result["peak_rss_bytes"] / 2 ** 20:.0f} MiB')
+        for stage, seconds in result['seconds'].items():
+            print(f'  {stage:18s} {seconds:8.3f} s')
+    write_json(results, args.output)
+    print(f'results written to {args.output}')
+    if args.save_baseline:
+        write_json(results, args.baseline)
+        print(f'baseline written to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'no baseline at {args.baseline}, run with --save-baseline to create one')
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    print(f'compared to baseline of {baseline["environment"]["timestamp"]} '
+          f'(commit {baseline["environment"]["commit"]}), tolerance {args.tolerance:.0%}:')
+    regressions = 0
+    for scale, stage, baseline_seconds, seconds, ratio, regression in compare(results, baseline, args.tolerance):
+        regressions += regression
+        print(f'  {scale:6s} {stage:18s} {baseline_seconds:8.3f} s -> {seconds:8.3f} s  ({ratio:5.2f}x)'
+              f'{"  REGRESSION" if regression else ""}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
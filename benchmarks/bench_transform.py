@@ -0,0 +1,75 @@
+"""
+Benchmark of the report1 daily aggregation: previous double sort + transform
+implementation vs. the single pass kernel in xetra.transformers.kernels,
+and of the full report1 transformation sharded by ISIN in a pool of processes
+and as polars query plan (if polars is installed)
+
+Usage:
+    python -m benchmarks.bench_transform --rows 10000000 --processes 2 4 8
+"""
+import argparse
+import pandas as pd
+from benchmarks.common import synthetic_source_df, timed
+from benchmarks.bench_extract import source_config, target_config
+from xetra.transformers.kernels import aggregate_ohlcv, prev_closing_change
+from xetra.transformers.sharding import transform_report1_sharded
+from xetra.transformers import polars_kernels
+
+
+def aggregate_legacy(df: pd.DataFrame, src_args, target_args):
+    """
+    Daily aggregation as implemented before the single pass kernel, kept as reference
+    """
+    df = df.loc[:, src_args.src_columns]
+    df.dropna(inplace=True)
+    df[target_args.trg_col_op_price] = df.sort_values(by=[src_args.src_col_time])\
+                                         .groupby([src_args.src_col_isin, src_args.src_col_date]
+                                                  )[src_args.src_col_start_price].transform('first')
+    df[target_args.trg_col_clos_price] = df.sort_values(by=[src_args.src_col_time])\
+                                           .groupby([src_args.src_col_isin, src_args.src_col_date]
+                                                    )[src_args.src_col_start_price].transform('last')
+    return df.groupby([src_args.src_col_isin, src_args.src_col_date],
+                      as_index=False).agg(opening_price_eur=(target_args.trg_col_op_price, 'min'),
+                                          closing_price_eur=(target_args.trg_col_clos_price, 'min'),
+                                          minimum_price_eur=(src_args.src_col_min_price, 'min'),
+                                          maximum_price_eur=(src_args.src_col_max_price, 'max'),
+                                          daily_traded_volume=(src_args.src_col_traded_vol, 'sum'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--isins', type=int, default=3000)
+    parser.add_argument('--days', type=int, default=20)
+    parser.add_argument('--processes', type=int, nargs='*', default=[2, 4])
+    args = parser.parse_args()
+
+    src_args, target_args = source_config(), target_config()
+    df = synthetic_source_df(args.rows, args.isins, args.days)
+    # unique times per ISIN & Date, as in the Xetra data, so first/last are well defined
+    df = df.drop_duplicates(subset=['ISIN', 'Date', 'Time'], ignore_index=True)
+    print(f'{len(df)} rows, {args.isins} ISINs, {args.days} days')
+    seconds_legacy, df_legacy = timed(aggregate_legacy, df, src_args, target_args)
+    print(f'legacy double sort + transform: {seconds_legacy:8.3f} s')
+    seconds_kernel, df_kernel = timed(aggregate_ohlcv, df, src_args, target_args)
+    speedup = seconds_legacy / seconds_kernel
+    print(f'single pass kernel:             {seconds_kernel:8.3f} s  (speedup {speedup:4.1f}x)')
+    assert df_kernel.equals(df_legacy), 'kernel output differs from the legacy implementation'
+
+    min_date = sorted(df['Date'].unique())[1]
+    seconds_single, df_single = timed(lambda: prev_closing_change(aggregate_ohlcv(df, src_args, target_args),
+                                                                  src_args, target_args, min_date))
+    print(f'report1 single process:         {seconds_single:8.3f} s')
+    for processes in args.processes:
+        seconds, df_sharded = timed(transform_report1_sharded, df, src_args, target_args, min_date, processes)
+        print(f'report1 {processes:3d} processes:          {seconds:8.3f} s  '
+              f'(speedup {seconds_single / seconds:4.1f}x)')
+        assert df_sharded.equals(df_single), 'sharded output differs from the single process transformation'
+    if polars_kernels.pl is not None:
+        seconds, df_polars = timed(polars_kernels.transform_report1, df, src_args, target_args, min_date)
+        print(f'report1 polars query plan:      {seconds:8.3f} s  (speedup {seconds_single / seconds:4.1f}x)')
+        assert df_polars.equals(df_single), 'polars output differs from the pandas transformation'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Shared helpers for the benchmark scripts: mocked s3 buckets and source data
+"""
+import os
+import time
+import boto3
+import numpy as np
+import pandas as pd
+from moto import mock_s3
+from xetra.common.s3 import S3BucketConnector
+
+ACCESS_KEY = 'AWS_ACCESS_KEY_ID'
+SECRET_KEY = 'AWS_SECRET_ACCESS_KEY'
+ENDPOINT_URL = 'https://s3.eu-central-1.amazonaws.com'
+SRC_COLUMNS = ['ISIN', 'Mnemonic', 'Date', 'Time', 'StartPrice',
+               'EndPrice', 'MinPrice', 'MaxPrice', 'TradedVolume']
+
+
+def start_mock_s3():
+    """
+    Starts a moto s3 mock and sets dummy credentials
+
+    returns:
+    the started mock, to be stopped by the caller
+    """
+    mock = mock_s3()
+    mock.start()
+    os.environ[ACCESS_KEY] = 'KEY1'
+    os.environ[SECRET_KEY] = 'KEY2'
+    return mock
+
+
+def create_bucket(name: str, **connector_args):
+    """
+    Creates a bucket on the (mocked) s3 and returns a connector to it
+
+    :param name: bucket name
+    :param connector_args: further arguments of S3BucketConnector, e.g. csv_engine
+    """
+    s3 = boto3.resource(service_name='s3', endpoint_url=ENDPOINT_URL)
+    s3.create_bucket(Bucket=name,
+                     CreateBucketConfiguration={'LocationConstraint': 'eu-central-1'})
+    return S3BucketConnector(bucket=name, secret_key=SECRET_KEY,
+                             access_key=ACCESS_KEY, endpoint_url=ENDPOINT_URL, **connector_args)
+
+
+def add_latency(s3_bucket: S3BucketConnector, latency_ms: float):
+    """
+    Simulates a network round trip on every api call made by the connector.
+    moto answers in-process, without this a mocked bucket hides all waiting time.
+
+    :param s3_bucket: connector whose client should be slowed down
+    :param latency_ms: added latency per api call in milliseconds
+    """
+    if latency_ms > 0:
+        s3_bucket._s3.meta.client.meta.events.register(
+            'before-call.s3', lambda **kwargs: time.sleep(latency_ms / 1000))
+
+
+def put_source_files(s3_bucket: S3BucketConnector, dates: list, files_per_day: int, rows_per_file: int):
+    """
+    Writes Xetra like hourly csv files for every date to the bucket
+
+    :param s3_bucket: connector of the source bucket
+    :param dates: list of dates with format "%Y-%m-%d"
+    :param files_per_day: number of hourly files per date
+    :param rows_per_file: number of rows in every file
+    returns:
+    list of keys written
+    """
+    keys = []
+    for date in dates:
+        for hour in range(files_per_day):
+            df = pd.DataFrame({
+                'ISIN': [f'DE{idx:010d}' for idx in range(rows_per_file)],
+                'Mnemonic': [f'M{idx}' for idx in range(rows_per_file)],
+                'Date': date,
+                'Time': f'{hour:02d}:00',
+                'StartPrice': 10.0 + hour,
+                'EndPrice': 10.5 + hour,
+                'MinPrice': 9.5 + hour,
+                'MaxPrice': 11.0 + hour,
+                'TradedVolume': 100 * (hour + 1)}, columns=SRC_COLUMNS)
+            key = f'{date}/{date}_BINS_XETR{hour:02d}.csv'
+            s3_bucket.write_df_to_s3(df, key, 'csv')
+            keys.append(key)
+    return keys
+
+
+def put_xetra_files(s3_bucket: S3BucketConnector, dates: list, isins: int, trades_per_hour: int,
+                    hours: range = range(8, 18), seed: int = 42):
+    """
+    Writes realistic Xetra hourly csv files to the bucket: every ISIN trades in
+    trades_per_hour distinct minutes of every hour, one row per traded minute, with
+    prices following a random walk per ISIN that carries over hours and dates
+
+    :param s3_bucket: connector of the source bucket
+    :param dates: list of dates with format "%Y-%m-%d"
+    :param isins: number of distinct ISINs
+    :param trades_per_hour: number of traded minutes per ISIN and hour, at most 60
+    :param hours: trading hours, one file per hour
+    :param seed: seed of the random generator
+    returns:
+    tuple of (list of keys written, number of rows written)
+    """
+    rng = np.random.default_rng(seed)
+    isin_values = np.array([f'DE{idx:010d}' for idx in range(isins)], dtype=object)
+    mnemonic_values = np.array([f'X{idx:05d}' for idx in range(isins)], dtype=object)
+    price = np.round(rng.uniform(1, 500, isins), 2)
+    keys, rows = [], 0
+    for date in dates:
+        for hour in hours:
+            minutes = np.sort(np.argsort(rng.random((isins, 60)), axis=1)[:, :trades_per_hour], axis=1)
+            steps = rng.normal(0, 0.002, (isins, trades_per_hour + 1))
+            path = price[:, None] * np.exp(np.cumsum(steps, axis=1))
+            start_price, end_price = path[:, :-1], path[:, 1:]
+            spread = np.abs(rng.normal(0, 0.001, (isins, trades_per_hour))) * start_price
+            price = path[:, -1]
+            df = pd.DataFrame({
+                'ISIN': np.repeat(isin_values, trades_per_hour),
+                'Mnemonic': np.repeat(mnemonic_values, trades_per_hour),
+                'Date': date,
+                'Time': [f'{hour:02d}:{minute:02d}' for minute in minutes.ravel()],
+                'StartPrice': np.round(start_price.ravel(), 2),
+                'EndPrice': np.round(end_price.ravel(), 2),
+                'MinPrice': np.round((np.minimum(start_price, end_price) - spread).ravel(), 2),
+                'MaxPrice': np.round((np.maximum(start_price, end_price) + spread).ravel(), 2),
+                'TradedVolume': rng.integers(1, 5000, isins * trades_per_hour)}, columns=SRC_COLUMNS)
+            key = f'{date}/{date}_BINS_XETR{hour:02d}.csv'
+            s3_bucket.write_df_to_s3(df, key, 'csv')
+            keys.append(key)
+            rows += len(df)
+    return keys, rows
+
+
+def timed(func, *args, **kwargs):
+    """
+    Calls func and measures its wall time
+
+    returns:
+    tuple of (seconds, result)
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def synthetic_source_df(rows: int, isins: int = 3000, days: int = 20, seed: int = 42):
+    """
+    Creates a Xetra like source dataframe in memory
+
+    :param rows: number of rows
+    :param isins: number of distinct ISINs
+    :param days: number of distinct trading dates, starting 2022-01-03
+    :param seed: seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    isin_values = np.array([f'DE{idx:010d}' for idx in range(isins)], dtype=object)
+    date_values = np.array(pd.date_range('2022-01-03', periods=days).strftime('%Y-%m-%d'), dtype=object)
+    time_values = np.array([f'{hour:02d}:{minute:02d}' for hour in range(8, 17) for minute in range(60)],
+                           dtype=object)
+    isin_idx = rng.integers(0, isins, rows)
+    start_price = np.round(rng.uniform(1, 500, rows), 2)
+    return pd.DataFrame({
+        'ISIN': isin_values[isin_idx],
+        'Mnemonic': isin_values[isin_idx],
+        'Date': date_values[rng.integers(0, days, rows)],
+        'Time': time_values[rng.integers(0, len(time_values), rows)],
+        'StartPrice': start_price,
+        'EndPrice': np.round(start_price * rng.uniform(0.98, 1.02, rows), 2),
+        'MinPrice': np.round(start_price * 0.98, 2),
+        'MaxPrice': np.round(start_price * 1.02, 2),
+        'TradedVolume': rng.integers(1, 10000, rows)}, columns=SRC_COLUMNS)
@@ -1,48 +1,105 @@
 """ Run the xetra application"""
+import functools
 import logging
 import logging.config
 import yaml
 import os
-from xetra.common.s3 import S3BucketConnector
-from xetra.transformers.xetra_transformer import XetraETL, XetraSourceConfig, XetraTargetConfig
+from xetra.common.constants import DataParams
+from xetra.common.s3 import S3BucketConnector, S3ClientConfig
+from xetra.common.async_s3 import AsyncS3BucketConnector
+from xetra.common.instrumentation import run_metrics
+from xetra.transformers.backfill import XetraBackfill
+from xetra.transformers.xetra_transformer import XetraETL, XetraSourceConfig, XetraTargetConfig, \
+    XetraETLConfig, XetraReportConfig
 
 
-def main():
+def create_etl(config: dict, shard: tuple = None):
     """
-    Entry point to run xetra ETL job
+    Creates the bucket connectors & the xetra ETL job from the parsed configuration
+
+    :param config: parsed yaml configuration
+    :param shard: optional (extract_date, extract_date_list) of a backfill shard
     """
-    # Parse yaml file
-    path = os.getcwd() + '/configs/xetra_report1_config.yaml'
-    config = yaml.safe_load(open(path))
-    log_config = config['logging']
     s3_config = config['s3']
-    logging.config.dictConfig(log_config)
-    logger = logging.getLogger(__name__)
-
     # Initialize the source and target args
     source = XetraSourceConfig(**config['source_config'])
     target = XetraTargetConfig(**config['target_config'])
+    etl_config = dict(config.get('etl_config', {}))
+    etl_config['reports'] = [XetraReportConfig(**report) for report in etl_config.get('reports') or []]
+    etl = XetraETLConfig(**etl_config)
+    client_config = S3ClientConfig(**s3_config.get('s3_client', {}))
 
     # # Instantiate the bucket connectors
     s3_bucket_src = S3BucketConnector(bucket=s3_config['s3_bucket_name_src'],
                                       secret_key=s3_config['s3_secret_key'],
                                       access_key=s3_config['s3_access_key'],
-                                      endpoint_url=s3_config['s3_endpoint_url_src'])
+                                      endpoint_url=s3_config['s3_endpoint_url_src'],
+                                      csv_engine=s3_config.get('s3_csv_engine', 'pandas'),
+                                      cache_dir=s3_config.get('s3_cache_dir'),
+                                      cache_max_bytes=s3_config.get('s3_cache_max_bytes',
+                                                                    DataParams.CACHE_MAX_BYTES.value),
+                                      client_config=client_config)
 
     s3_bucket_trg = S3BucketConnector(bucket=s3_config['s3_bucket_name_trg'],
                                       secret_key=s3_config['s3_secret_key'],
                                       access_key=s3_config['s3_access_key'],
-                                      endpoint_url=s3_config['s3_endpoint_url_trg'])
+                                      endpoint_url=s3_config['s3_endpoint_url_trg'],
+                                      csv_engine=s3_config.get('s3_csv_engine', 'pandas'),
+                                      multipart_part_size=s3_config.get('s3_multipart_part_size'),
+                                      multipart_concurrency=s3_config.get('s3_multipart_concurrency',
+                                                                          DataParams.MULTIPART_CONCURRENCY.value),
+                                      client_config=client_config)
+
+    s3_bucket_src_async = None
+    if etl.async_extract:
+        s3_bucket_src_async = AsyncS3BucketConnector(bucket=s3_config['s3_bucket_name_src'],
+                                                     secret_key=s3_config['s3_secret_key'],
+                                                     access_key=s3_config['s3_access_key'],
+                                                     endpoint_url=s3_config['s3_endpoint_url_src'],
+                                                     csv_engine=s3_config.get('s3_csv_engine', 'pandas'),
+                                                     client_config=client_config,
+                                                     max_in_flight=s3_config.get('s3_async_max_in_flight',
+                                                                                 DataParams.ASYNC_MAX_IN_FLIGHT.value))
+
+    return XetraETL(s3_bucket_src,
+                    s3_bucket_trg,
+                    s3_config['meta_key'],
+                    source,
+                    target,
+                    etl,
+                    s3_bucket_src_async,
+                    shard)
+
+
+def main():
+    """
+    Entry point to run xetra ETL job
+    """
+    # Parse yaml file
+    path = os.getcwd() + '/configs/xetra_report1_config.yaml'
+    config = yaml.safe_load(open(path))
+    log_config = config['logging']
+    logging.config.dictConfig(log_config)
+    logger = logging.getLogger(__name__)
+    etl_config = config.get('etl_config') or {}
 
     # Run etl job
-    xetra_etl = XetraETL(s3_bucket_src,
-                         s3_bucket_trg,
-                         s3_config['meta_key'],
-                         source,
-                         target)
-    xetra_etl.etl_report1()
+    run_metrics.reset()
+    if etl_config.get('backfill_shard_days'):
+        backfill = XetraBackfill(functools.partial(create_etl, config), etl_config['backfill_shard_days'],
+                                 etl_config.get('backfill_processes', 1))
+        if not backfill.run():
+            logger.info("Shards of other invocations are still running, the last one updates the meta file.")
+    else:
+        create_etl(config).etl_report1()
     logger.info("Xetra job has finished processing.")
 
+    # Emit the run summary
+    instrumentation = config.get('instrumentation') or {}
+    run_metrics.write_json(instrumentation.get('summary_path'))
+    if instrumentation.get('prometheus_textfile'):
+        run_metrics.write_prometheus(instrumentation['prometheus_textfile'])
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,150 @@
+"""
+Test the asynchronous S3BucketConnector methods against a local moto server
+"""
+import os
+import asyncio
+import unittest
+import boto3
+import pandas as pd
+from io import BytesIO, StringIO
+from xetra.common.async_s3 import AsyncS3BucketConnector, get_session
+from xetra.common.custom_exceptions import WrongFormatException
+
+try:
+    from moto.server import ThreadedMotoServer
+except ImportError:
+    ThreadedMotoServer = None
+
+
+@unittest.skipIf(get_session is None or ThreadedMotoServer is None, 'requires aiobotocore and moto[server]')
+class TestAsyncS3BucketConnections(unittest.TestCase):
+    """
+    Testing the AsyncS3BucketConnector class.
+    aiobotocore does not work with mock_s3, the requests go to a moto server instead.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Starts the moto server shared by all tests
+        """
+        cls.server = ThreadedMotoServer(port=5056, verbose=False)
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        """
+        Initialize the s3 connection needed for testing
+        """
+        self.s3_access_key = "AWS_ACCESS_KEY_ID"
+        self.s3_secret_key = "AWS_SECRET_ACCESS_KEY"
+        self.s3_endpoint_url = 'http://127.0.0.1:5056'
+        self.s3_bucket_name = f'test-bucket-{self._testMethodName.replace("_", "-")}'
+
+        # create aws access keys as environment variables
+        os.environ[self.s3_access_key] = 'KEY1'
+        os.environ[self.s3_secret_key] = 'KEY2'
+
+        # create s3 bucket on the moto server
+        self.s3 = boto3.resource(service_name='s3', endpoint_url=self.s3_endpoint_url,
+                                 region_name='eu-central-1')
+        self.s3.create_bucket(Bucket=self.s3_bucket_name,
+                              CreateBucketConfiguration={
+                                  'LocationConstraint': 'eu-central-1'})
+        self.s3_bucket = self.s3.Bucket(self.s3_bucket_name)
+        self.s3_bucket_conn = AsyncS3BucketConnector(bucket=self.s3_bucket_name,
+                                                     secret_key=self.s3_secret_key,
+                                                     access_key=self.s3_access_key,
+                                                     endpoint_url=self.s3_endpoint_url,
+                                                     max_in_flight=4)
+
+    def tearDown(self):
+        """
+        Removes the bucket of the test
+        """
+        self.s3_bucket.objects.all().delete()
+        self.s3_bucket.delete()
+
+    def run_connector(self, method, *args, **kwargs):
+        """
+        Runs a method of the connector in a fresh event loop
+        """
+        async def run():
+            async with self.s3_bucket_conn:
+                return await getattr(self.s3_bucket_conn, method)(*args, **kwargs)
+        return asyncio.run(run())
+
+    def test_list_files_in_prefix_ok(self):
+        """
+        Tests the list_files_in_prefix method for getting 2 file keys
+        as list on the moto server
+        """
+        prefix_exp = 'prefix/'
+        key1_exp = f'{prefix_exp}test1.csv'
+        key2_exp = f'{prefix_exp}test2.csv'
+        csv_content = 'col1,col2\nvalA,valB'
+        self.s3_bucket.put_object(Body=csv_content, Key=key1_exp)
+        self.s3_bucket.put_object(Body=csv_content, Key=key2_exp)
+        self.s3_bucket.put_object(Body=csv_content, Key='other/test3.csv')
+        list_result = self.run_connector('list_files_in_prefix', prefix_exp)
+        list_after = self.run_connector('list_files_in_prefix', prefix_exp, start_after=key1_exp)
+        self.assertListEqual([key1_exp, key2_exp], list_result)
+        self.assertListEqual([key2_exp], list_after)
+
+    def test_read_csv(self):
+        """
+        Tests the read_s3_to_df method for a csv file, with a subset of columns and dtypes
+        """
+        key_exp = 'test.csv'
+        self.s3_bucket.put_object(Body='col1,col2,col3\nvalA,valB,1.5\nvalC,valD,2.5', Key=key_exp)
+        df_result = self.run_connector('read_s3_to_df', key_exp, 'csv',
+                                       columns=['col1', 'col3'], dtypes={'col1': 'category', 'col3': 'float32'})
+        self.assertListEqual(['col1', 'col3'], list(df_result.columns))
+        self.assertEqual('category', df_result['col1'].dtype)
+        self.assertEqual('float32', df_result['col3'].dtype)
+        self.assertListEqual(['valA', 'valC'], list(df_result['col1']))
+
+    def test_read_parquet(self):
+        """
+        Tests the read_s3_to_df method for a parquet file
+        """
+        key_exp = 'test.parquet'
+        df_exp = pd.DataFrame([['A', 'B'], ['C', 'D']], columns=['col1', 'col2'])
+        out_buffer = BytesIO()
+        df_exp.to_parquet(out_buffer, index=False)
+        self.s3_bucket.put_object(Body=out_buffer.getvalue(), Key=key_exp)
+        df_result = self.run_connector('read_s3_to_df', key_exp, 'parquet')
+        self.assertTrue(df_exp.equals(df_result))
+
+    def test_read_wrong_format(self):
+        """
+        Tests an unsupported file format is rejected
+        """
+        with self.assertRaises(WrongFormatException):
+            self.run_connector('read_s3_to_df', 'test.json', 'json')
+
+    def test_write_df_to_s3_csv(self):
+        """
+        Tests the write_df_to_s3 method with a csv file
+        """
+        key_exp = 'test.csv'
+        df_exp = pd.DataFrame([['A', 'B'], ['C', 'D']], columns=['col1', 'col2'])
+        result = self.run_connector('write_df_to_s3', df_exp, key_exp, 'csv')
+        data = self.s3_bucket.Object(key=key_exp).get().get('Body').read().decode('utf-8')
+        self.assertTrue(result)
+        self.assertTrue(df_exp.equals(pd.read_csv(StringIO(data))))
+
+    def test_write_df_to_s3_empty(self):
+        """
+        Tests the write_df_to_s3 method writes nothing for an empty dataframe
+        """
+        result = self.run_connector('write_df_to_s3', pd.DataFrame(), 'test.csv', 'csv')
+        self.assertTrue(result)
+        self.assertListEqual([], list(self.s3_bucket.objects.all()))
+
+
+if __name__ == "__main__":
+    unittest.main()
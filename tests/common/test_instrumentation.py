@@ -0,0 +1,93 @@
+"""
+Test the run metrics of the pipeline stages
+"""
+import os
+import json
+import tempfile
+import unittest
+from prometheus_client import generate_latest
+from xetra.common.instrumentation import RunMetrics
+
+
+class TestRunMetrics(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Fresh metrics for every test
+        """
+        self.metrics = RunMetrics()
+
+    def test_stage_counters(self):
+        """
+        Tests that a stage records calls, wall time, counters & peak RSS
+        """
+        with self.metrics.stage('extract') as counters:
+            counters['objects'] = 2
+        self.metrics.add('extract', rows_out=10)
+        self.metrics.add('extract', rows_out=5)
+        stage = self.metrics.summary()['stages']['extract']
+        self.assertEqual(stage['calls'], 1)
+        self.assertEqual(stage['objects'], 2)
+        self.assertEqual(stage['rows_out'], 15)
+        self.assertGreaterEqual(stage['wall_time_s'], 0)
+        self.assertGreater(stage['peak_rss_bytes'], 0)
+
+    def test_nested_stage_peak(self):
+        """
+        Tests that the peak RSS of a stage includes its nested stages
+        """
+        with self.metrics.stage('transform'):
+            with self.metrics.stage('transform.aggregate'):
+                buffer = bytearray(64 * 1024 * 1024)
+                buffer[::4096] = b'x' * len(buffer[::4096])
+            del buffer
+        stages = self.metrics.summary()['stages']
+        self.assertGreaterEqual(stages['transform']['peak_rss_bytes'],
+                                stages['transform.aggregate']['peak_rss_bytes'])
+
+    def test_staged_decorator(self):
+        """
+        Tests that every call of a decorated function is recorded as stage
+        """
+        @self.metrics.staged('load')
+        def load(value):
+            return value * 2
+        self.assertEqual(load(2), 4)
+        self.assertEqual(load(3), 6)
+        self.assertEqual(self.metrics.summary()['stages']['load']['calls'], 2)
+
+    def test_reset(self):
+        """
+        Tests that reset discards all recorded stages
+        """
+        self.metrics.add('extract', objects=1)
+        self.metrics.reset()
+        self.assertEqual(self.metrics.summary()['stages'], {})
+
+    def test_write_json(self):
+        """
+        Tests the json run summary written to a file
+        """
+        with self.metrics.call('s3.read_s3_to_df') as counters:
+            counters.update(objects=1, bytes_in=100)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'metrics', 'run.json')
+            summary = self.metrics.write_json(path)
+            with open(path) as summary_file:
+                self.assertEqual(summary_file.read(), summary)
+        stage = json.loads(summary)['stages']['s3.read_s3_to_df']
+        self.assertEqual(stage['bytes_in'], 100)
+        self.assertNotIn('peak_rss_bytes', stage)
+
+    def test_prometheus(self):
+        """
+        Tests the run summary as prometheus gauges
+        """
+        self.metrics.add('load', rows_in=7)
+        metrics = generate_latest(self.metrics.to_prometheus()).decode()
+        self.assertIn('xetra_stage_rows_in{stage="load"} 7.0', metrics)
+        self.assertIn('xetra_run_wall_time_s', metrics)
+
+
+if __name__ == "__main__":
+    unittest.main()
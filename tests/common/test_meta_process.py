@@ -8,10 +8,12 @@ from io import StringIO
 import pandas as pd
 from moto import mock_s3
 from datetime import datetime, timedelta
+from unittest.mock import patch
+from botocore.exceptions import ClientError
 from xetra.common.s3 import S3BucketConnector
 from xetra.common.meta_process import MetaProcess
 from xetra.common.constants import MetaProcessFormat
-from xetra.common.custom_exceptions import BadDateRange, WrongMetaFile
+from xetra.common.custom_exceptions import BadDateRange, WrongFormatException, WrongMetaFile
 
 
 class TestMetaFileProcessing(unittest.TestCase):
@@ -232,6 +234,156 @@ class TestMetaFileProcessing(unittest.TestCase):
         self.assertEqual(min_date_exp, min_date_result)
         self.fixture_teardown(key)
 
+    def test_return_date_list_all_processed(self):
+        """
+        Tests an empty datelist is returned if all dates are processed already
+        """
+        date_list = [(datetime.today().date() - timedelta(days=x))
+                     .strftime(MetaProcessFormat.META_DATE_FORMAT.value) for x in range(3)]
+        self.meta.update_meta_file(self.s3_bucket_conn, date_list)
+        self.assertEqual((date_list[-1], []), self.meta.return_date_list(self.s3_bucket_conn, date_list[-1]))
+
+    def test_return_date_list_trading_days(self):
+        """
+        Tests weekends & holidays are neither gaps nor dates to be processed with the trading calendar
+        """
+        meta = MetaProcess(trading_days_only=True)
+        meta.update_meta_file(self.s3_bucket_conn, ['2022-04-13', '2022-04-14', '2022-04-19'])
+        dates = meta.calendar.date_range('2022-04-13', '2022-04-21')
+        with patch.object(MetaProcess, '_date_range', return_value=dates):
+            min_date_result, date_list_result = meta.return_date_list(self.s3_bucket_conn, '2022-04-13')
+        self.assertEqual('2022-04-13', min_date_result)
+        self.assertEqual(['2022-04-19', '2022-04-20', '2022-04-21'], date_list_result)
+
+    def test_unrecorded_dates(self):
+        """
+        Tests the unrecorded dates are read from the bucket again, for both meta stores
+        """
+        date_list = ['2022-02-12', '2022-02-13', '2022-02-14']
+        for meta in [self.meta, MetaProcess('marker')]:
+            self.assertEqual(date_list, meta.unrecorded_dates(self.s3_bucket_conn, date_list))
+            MetaProcess(meta.meta_store).update_meta_file(self.s3_bucket_conn, date_list[:2])
+            self.assertEqual(date_list[2:], meta.unrecorded_dates(self.s3_bucket_conn, date_list))
+
+    def test_wrong_meta_store(self):
+        """
+        Tests an unsupported meta store is rejected
+        """
+        with self.assertRaises(WrongFormatException):
+            MetaProcess('narquet')
+
+    def test_update_meta_markers(self):
+        """
+        Tests the marker meta store writes one marker per date
+        and reads back only the dates after the given one
+        """
+        meta = MetaProcess('marker')
+        date_list = ['2022-02-12', '2022-02-13', '2022-02-14']
+        meta.update_meta_file(self.s3_bucket_conn, date_list)
+        keys_result = self.s3_bucket_conn.list_files_in_prefix('meta/')
+        set_result = meta.read_meta_markers(self.s3_bucket_conn, '2022-02-12')
+        self.assertListEqual([f'meta/source_data={date}' for date in date_list], keys_result)
+        self.assertEqual({datetime(2022, 2, 13).date(), datetime(2022, 2, 14).date()}, set_result)
+
+    def test_return_date_list_with_meta_markers(self):
+        """
+        Tests if the datelist returns correctly with the marker meta store,
+        same expectations as with the csv meta file
+        """
+        self.fixture_setup(False)
+        meta = MetaProcess('marker')
+        meta.update_meta_file(self.s3_bucket_conn, self.datelist_old)
+        min_date_exp = '2022-04-12'
+        date_list_expected = [(datetime.today().date() - timedelta(days=x))
+                              .strftime(MetaProcessFormat.META_DATE_FORMAT.value)
+                              for x in range(self.date_delta_2)]
+        min_date_result, date_list_result = meta.return_date_list(self.s3_bucket_conn,
+                                                                  self.date_str_1)
+        self.assertEqual(set(date_list_expected), set(date_list_result))
+        self.assertEqual(min_date_exp, min_date_result)
+
+    def test_meta_file_read_once_per_run(self):
+        """
+        Tests the meta file is downloaded once for return_date_list and update_meta_file
+        and written back with a single conditional put
+        """
+        self.fixture_setup(False)
+        calls = []
+
+        def count_call(model, **kwargs):
+            calls.append(model.name)
+        self.s3_bucket_conn.client.meta.events.register('before-call.s3', count_call)
+        self.meta.return_date_list(self.s3_bucket_conn, self.date_str_1)
+        self.meta.update_meta_file(self.s3_bucket_conn, ['2022-04-14'])
+        self.s3_bucket_conn.client.meta.events.unregister('before-call.s3', count_call)
+        self.assertListEqual(['GetObject', 'PutObject'], calls)
+
+    def test_update_meta_file_concurrent_change(self):
+        """
+        Tests the meta file is read again and the write retried
+        when it has been changed since it was read
+        """
+        self.fixture_setup(False)
+        self.meta.read_meta_csv(self.s3_bucket_conn,
+                                MetaProcessFormat.META_FILE_NAME.value,
+                                MetaProcessFormat.META_FILE_FORMAT.value)
+        # another run appends a date after the meta file has been read
+        MetaProcess().update_meta_file(self.s3_bucket_conn, ['2022-04-14'])
+        write = self.s3_bucket_conn.write_df_to_s3
+        responses = [ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'PutObject'), write]
+
+        def write_once_conflicting(*args, **kwargs):
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response(*args, **kwargs)
+        with patch.object(self.s3_bucket_conn, 'write_df_to_s3', side_effect=write_once_conflicting) as write_mock:
+            self.meta.update_meta_file(self.s3_bucket_conn, ['2022-04-15'])
+        df_result, _ = MetaProcess().read_meta_csv(self.s3_bucket_conn,
+                                                   MetaProcessFormat.META_FILE_NAME.value,
+                                                   MetaProcessFormat.META_FILE_FORMAT.value)
+        self.assertEqual(2, write_mock.call_count)
+        self.assertListEqual(self.datelist_old + ['2022-04-14', '2022-04-15'], list(df_result['source_data']))
+
+    def test_source_record_changed_dates(self):
+        """
+        Tests recorded dates with added, republished or removed source objects are detected
+        """
+        # Test init
+        for key in ['2022-04-12/a.csv', '2022-04-13/a.csv', '2022-04-14/a.csv', '2022-04-14/b.csv']:
+            self.s3_bucket_conn.write_bytes_to_s3(b'trades', key)
+        df_listing = self.meta.list_source_objects(self.s3_bucket_conn, '2022-04-12')
+        self.meta.update_source_record(self.s3_bucket_conn, df_listing)
+        df_record = MetaProcess().read_source_record(self.s3_bucket_conn)
+        self.assertEqual([], self.meta.changed_dates(df_listing, df_record))
+        # Method execution
+        self.s3_bucket_conn.write_bytes_to_s3(b'trades republished', '2022-04-12/a.csv')
+        self.s3_bucket_conn.write_bytes_to_s3(b'trades', '2022-04-13/b.csv')
+        self.s3_bucket_conn.delete_files(['2022-04-14/b.csv'])
+        self.s3_bucket_conn.write_bytes_to_s3(b'trades', '2022-04-15/a.csv')
+        df_listing = self.meta.list_source_objects(self.s3_bucket_conn, '2022-04-12')
+        df_record = MetaProcess().read_source_record(self.s3_bucket_conn)
+        # Test after method execution
+        self.assertEqual(['2022-04-12', '2022-04-13', '2022-04-14'], self.meta.changed_dates(df_listing, df_record))
+
+    def test_update_source_record(self):
+        """
+        Tests the recorded objects of the updated dates are replaced, others are kept
+        """
+        # Test init
+        for key in ['2022-04-12/a.csv', '2022-04-13/a.csv', '2022-04-13/b.csv']:
+            self.s3_bucket_conn.write_bytes_to_s3(b'trades', key)
+        self.meta.update_source_record(self.s3_bucket_conn,
+                                       self.meta.list_source_objects(self.s3_bucket_conn, '2022-04-12'))
+        self.s3_bucket_conn.delete_files(['2022-04-13/b.csv'])
+        df_listing = self.meta.list_source_objects(self.s3_bucket_conn, '2022-04-12')
+        # Method execution
+        self.meta.update_source_record(self.s3_bucket_conn, df_listing[df_listing['source_data'] == '2022-04-13'])
+        # Test after method execution
+        df_record = MetaProcess().read_source_record(self.s3_bucket_conn)
+        self.assertListEqual(['2022-04-12/a.csv', '2022-04-13/a.csv'], list(df_record['source_key']))
+        self.assertEqual([], self.meta.changed_dates(df_listing, df_record))
+
 
 if __name__ == "__main__":
     unittest.main()
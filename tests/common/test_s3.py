@@ -2,12 +2,15 @@
 Test s3 connections and associated functions
 """
 import os
+import tempfile
 import unittest
 import boto3
 from io import BytesIO
+import numpy as np
 import pandas as pd
 from moto import mock_s3
-from xetra.common.s3 import S3BucketConnector
+from unittest.mock import patch
+from xetra.common.s3 import S3BucketConnector, S3ClientConfig
 from xetra.common.constants import S3FileTypes
 from xetra.common.custom_exceptions import WrongFormatException
 
@@ -187,6 +190,167 @@ class TestS3BucketConnections(unittest.TestCase):
         # Cleanup / Tear down
         self.fixture_teardown(key1_exp, key2_exp)
 
+    def test_read_csv_columns_dtypes(self):
+        """
+        Test reading a subset of the columns with declared dtypes
+        """
+        # Expected Results
+        prefix_exp, key1_exp, key2_exp = self.fixture_setup()
+        columns = ['col1', 'col3']
+        dtypes = {'col1': 'category', 'col3': 'float32'}
+        # Method Execution
+        df2 = self.s3_bucket_conn.read_s3_to_df(key2_exp, 'csv', columns=columns, dtypes=dtypes)
+        # Tests after method execution
+        self.assertListEqual(columns, list(df2.columns))
+        self.assertEqual('category', df2['col1'].dtype)
+        self.assertEqual('float32', df2['col3'].dtype)
+        self.assertEqual(7, df2.iloc[2, 1])
+        # Cleanup / Tear down
+        self.fixture_teardown(key1_exp, key2_exp)
+
+    def test_read_csv_pyarrow(self):
+        """
+        Test the pyarrow csv engine parses like the pandas engine
+        """
+        # Expected Results
+        csv_content = """ISIN,Date,Time,StartPrice,TradedVolume
+AT0000A0E9W5,2021-04-15,12:00,20.19,877
+DE000A0DJ6J9,2021-04-15,13:00,18.27,987
+,2021-04-15,"",18.31,12"""
+        key_exp = 'prefix/xetra.csv'
+        self.s3_bucket.put_object(Body=csv_content, Key=key_exp)
+        dtypes = {'ISIN': 'category', 'StartPrice': 'float32'}
+        s3_bucket_conn_pa = S3BucketConnector(bucket=self.s3_bucket_name,
+                                              secret_key=self.s3_secret_key,
+                                              access_key=self.s3_access_key,
+                                              endpoint_url=self.s3_endpoint_url,
+                                              csv_engine='pyarrow')
+        # Method Execution
+        df_exp = self.s3_bucket_conn.read_s3_to_df(key_exp, 'csv')
+        df_result = s3_bucket_conn_pa.read_s3_to_df(key_exp, 'csv')
+        df_result_dtypes = s3_bucket_conn_pa.read_s3_to_df(key_exp, 'csv', columns=['ISIN', 'StartPrice'],
+                                                           dtypes=dtypes)
+        # Tests after method execution
+        pd.testing.assert_frame_equal(df_exp, df_result)
+        self.assertListEqual(['ISIN', 'StartPrice'], list(df_result_dtypes.columns))
+        self.assertEqual('category', df_result_dtypes['ISIN'].dtype)
+        self.assertEqual('float32', df_result_dtypes['StartPrice'].dtype)
+        self.assertEqual(2, len(df_result.dropna()))
+        # Cleanup / Tear down
+        self.s3_bucket.delete_objects(Delete={'Objects': [{'Key': key_exp}]})
+
+    def test_wrong_csv_engine(self):
+        """
+        Test an unsupported csv engine is rejected
+        """
+        with self.assertRaises(WrongFormatException):
+            S3BucketConnector(bucket=self.s3_bucket_name,
+                              secret_key=self.s3_secret_key,
+                              access_key=self.s3_access_key,
+                              endpoint_url=self.s3_endpoint_url,
+                              csv_engine='narcsv')
+
+    def test_shared_client(self):
+        """
+        Tests connectors on the same endpoint share the client and its connection pool,
+        connectors with a different client configuration do not
+        """
+        client_config = S3ClientConfig(max_pool_connections=64, retry_mode='standard', max_attempts=3)
+        conn_src = S3BucketConnector(bucket='src-bucket', secret_key=self.s3_secret_key,
+                                     access_key=self.s3_access_key, endpoint_url=self.s3_endpoint_url,
+                                     client_config=client_config)
+        conn_trg = S3BucketConnector(bucket='trg-bucket', secret_key=self.s3_secret_key,
+                                     access_key=self.s3_access_key, endpoint_url=self.s3_endpoint_url,
+                                     client_config=client_config)
+        self.assertIs(conn_src.client, conn_trg.client)
+        self.assertIs(conn_src.session, conn_trg.session)
+        self.assertIsNot(conn_src.client, self.s3_bucket_conn.client)
+        self.assertEqual(64, conn_src.client.meta.config.max_pool_connections)
+        self.assertEqual({'mode': 'standard', 'total_max_attempts': 3}, conn_src.client.meta.config.retries)
+        self.assertTrue(conn_src.client.meta.config.tcp_keepalive)
+
+    def test_read_csv_chunks(self):
+        """
+        Test streaming a csv file chunk by chunk
+        """
+        # Expected Results
+        prefix_exp, key1_exp, key2_exp = self.fixture_setup()
+        df_exp = self.s3_bucket_conn.read_s3_to_df(key2_exp, 'csv')
+        # Method Execution
+        chunks = list(self.s3_bucket_conn.read_s3_to_df(key2_exp, 'csv', chunksize=3))
+        # Tests after method execution
+        self.assertListEqual([3, 1], [len(chunk) for chunk in chunks])
+        self.assertTrue(df_exp.equals(pd.concat(chunks, ignore_index=True)))
+        # Cleanup / Tear down
+        self.fixture_teardown(key1_exp, key2_exp)
+
+    def test_read_parquet_chunks(self):
+        """
+        Test streaming a parquet file with several row groups via ranged reads
+        """
+        # Expected Results
+        key_exp = 'prefix/row_groups.parquet'
+        df_exp = pd.DataFrame({'col1': range(1000), 'col2': [f'val{idx}' for idx in range(1000)]})
+        out_buffer = BytesIO()
+        df_exp.to_parquet(out_buffer, index=False, row_group_size=100)
+        self.s3_bucket.put_object(Body=out_buffer.getvalue(), Key=key_exp)
+        # Method Execution
+        chunks = list(self.s3_bucket_conn.read_s3_to_df(key_exp, 'parquet', columns=['col1'], chunksize=250))
+        # Tests after method execution
+        self.assertEqual(4, len(chunks))
+        self.assertListEqual(['col1'], list(chunks[0].columns))
+        self.assertTrue(df_exp[['col1']].equals(pd.concat(chunks, ignore_index=True)))
+        # Cleanup / Tear down
+        self.s3_bucket.delete_objects(Delete={'Objects': [{'Key': key_exp}]})
+
+    def test_read_csv_cached(self):
+        """
+        Test reading csv files through the local ETag keyed cache
+        """
+        # Expected Results
+        prefix_exp, key1_exp, key2_exp = self.fixture_setup()
+        log_expression = f'Cache hit for {self.s3_bucket_name}/{key1_exp}'
+        with tempfile.TemporaryDirectory() as cache_dir:
+            s3_bucket_conn = S3BucketConnector(bucket=self.s3_bucket_name,
+                                               secret_key=self.s3_secret_key,
+                                               access_key=self.s3_access_key,
+                                               endpoint_url=self.s3_endpoint_url,
+                                               cache_dir=cache_dir)
+            # Method Execution
+            df_miss = s3_bucket_conn.read_s3_to_df(key1_exp, 'csv')
+            with self.assertLogs() as logm:
+                df_hit = s3_bucket_conn.read_s3_to_df(key1_exp, 'csv')
+                self.assertIn(log_expression, logm.output[1])
+            self.s3_bucket.put_object(Body='col1\nvalZ', Key=key1_exp)
+            df_changed = s3_bucket_conn.read_s3_to_df(key1_exp, 'csv')
+            # Tests after method execution
+            self.assertTrue(df_miss.equals(df_hit))
+            self.assertEqual('valZ', df_changed.iloc[0, 0])
+            self.assertEqual(2, len(os.listdir(cache_dir)))
+        # Cleanup / Tear down
+        self.fixture_teardown(key1_exp, key2_exp)
+
+    def test_read_cached_eviction(self):
+        """
+        Test the least recently used cache entry is evicted above the size cap
+        """
+        # Expected Results
+        prefix_exp, key1_exp, key2_exp = self.fixture_setup()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            s3_bucket_conn = S3BucketConnector(bucket=self.s3_bucket_name,
+                                               secret_key=self.s3_secret_key,
+                                               access_key=self.s3_access_key,
+                                               endpoint_url=self.s3_endpoint_url,
+                                               cache_dir=cache_dir,
+                                               cache_max_bytes=1)
+            # Method Execution
+            s3_bucket_conn.read_s3_to_df(key1_exp, 'csv')
+            s3_bucket_conn.read_s3_to_df(key2_exp, 'csv')
+            # Tests after method execution
+            self.assertEqual(0, len(os.listdir(cache_dir)))
+        # Cleanup / Tear down
+        self.fixture_teardown(key1_exp, key2_exp)
+
     def test_write_df_to_s3_empty(self):
         """
         Test Writing data to an s3 bucket, using an empty dataframe
@@ -239,6 +403,70 @@ class TestS3BucketConnections(unittest.TestCase):
         # clean Up
         self.fixture_teardown(key1_exp, key2_exp)
 
+    def test_write_df_to_s3_parquet_multipart(self):
+        """
+        Test writing a parquet file to a s3 bucket in a multipart upload
+        """
+        # Expected Results
+        key_exp = 'prefix/multipart.parquet'
+        df_exp = pd.DataFrame({'col1': np.random.default_rng(0).random(1500000)})
+        s3_bucket_conn = S3BucketConnector(bucket=self.s3_bucket_name,
+                                           secret_key=self.s3_secret_key,
+                                           access_key=self.s3_access_key,
+                                           endpoint_url=self.s3_endpoint_url,
+                                           multipart_part_size=1,
+                                           multipart_concurrency=2)
+        # Test Init
+        s3_bucket_conn.write_df_to_s3(df_exp, key_exp, 'parquet')
+        # Assert Results
+        s3_object = self.s3_bucket.Object(key_exp)
+        self.assertEqual(5 * 1024 * 1024, s3_bucket_conn.multipart_part_size)
+        self.assertTrue(s3_object.e_tag.endswith('-3"'))
+        self.assertTrue(df_exp.equals(s3_bucket_conn.read_s3_to_df(key_exp, 'parquet')))
+        # clean Up
+        self.s3_bucket.delete_objects(Delete={'Objects': [{'Key': key_exp}]})
+
+    def test_write_df_to_s3_parquet_multipart_small(self):
+        """
+        Test writing a parquet file smaller than one part with the multipart upload enabled
+        """
+        # Expected Results
+        prefix_exp, key1_exp, key2_exp = self.fixture_setup(df=True)
+        s3_bucket_conn = S3BucketConnector(bucket=self.s3_bucket_name,
+                                           secret_key=self.s3_secret_key,
+                                           access_key=self.s3_access_key,
+                                           endpoint_url=self.s3_endpoint_url,
+                                           multipart_part_size=5 * 1024 * 1024)
+        # Test Init
+        s3_bucket_conn.write_df_to_s3(self.df, key1_exp, 'parquet')
+        # Assert Results
+        self.assertTrue(self.df.equals(s3_bucket_conn.read_s3_to_df(key1_exp, 'parquet')))
+        # clean Up
+        self.fixture_teardown(key1_exp, key2_exp)
+
+    def test_write_df_to_s3_parquet_multipart_conditional(self):
+        """
+        Test a conditional parquet write with the multipart upload enabled is a single conditional put
+        """
+        # Expected Results
+        key_exp = 'prefix/conditional.parquet'
+        df_exp = pd.DataFrame({'col1': np.random.default_rng(0).random(1500000)})
+        s3_bucket_conn = S3BucketConnector(bucket=self.s3_bucket_name,
+                                           secret_key=self.s3_secret_key,
+                                           access_key=self.s3_access_key,
+                                           endpoint_url=self.s3_endpoint_url,
+                                           multipart_part_size=1)
+        # Test Init
+        with patch.object(s3_bucket_conn._bucket, 'put_object',
+                          wraps=s3_bucket_conn._bucket.put_object) as put_mock:
+            s3_bucket_conn.write_df_to_s3(df_exp, key_exp, 'parquet', if_none_match='*')
+        # Assert Results
+        self.assertEqual('*', put_mock.call_args.kwargs['IfNoneMatch'])
+        self.assertFalse(self.s3_bucket.Object(key_exp).e_tag.endswith('-3"'))
+        self.assertTrue(df_exp.equals(s3_bucket_conn.read_s3_to_df(key_exp, 'parquet')))
+        # clean Up
+        self.s3_bucket.delete_objects(Delete={'Objects': [{'Key': key_exp}]})
+
     def test_write_df_to_s3_wrong_format(self):
         """
         Test Writing data to an s3 bucket as parquet format
@@ -0,0 +1,44 @@
+"""
+Test the calendar of the dates to be processed
+"""
+import unittest
+from xetra.common.trading_calendar import TradingCalendar
+
+
+class TestTradingCalendar(unittest.TestCase):
+
+    def test_date_range(self):
+        """
+        Tests the range starts with the look-back date, with all days or trading days only
+        """
+        dates = TradingCalendar().date_range('2022-04-18', '2022-04-20')
+        self.assertEqual(['2022-04-17', '2022-04-18', '2022-04-19', '2022-04-20'],
+                         list(dates.strftime('%Y-%m-%d')))
+        # Good Friday, the weekend & Easter Monday are skipped
+        dates = TradingCalendar(True).date_range('2022-04-19', '2022-04-20')
+        self.assertEqual(['2022-04-14', '2022-04-19', '2022-04-20'], list(dates.strftime('%Y-%m-%d')))
+        # Christmas Eve & Day, Boxing Day, New Year Eve & New Year
+        dates = TradingCalendar(True).date_range('2020-12-23', '2021-01-04')
+        self.assertEqual(['2020-12-22', '2020-12-23', '2020-12-28', '2020-12-29', '2020-12-30', '2021-01-04'],
+                         list(dates.strftime('%Y-%m-%d')))
+
+    def test_processing_dates(self):
+        """
+        Tests the dates to be processed start the day before the first gap
+        """
+        calendar = TradingCalendar(True)
+        processed = ['2022-04-13', '2022-04-14', '2022-04-20']
+        date_list, gaps = calendar.processing_dates(calendar.date_range('2022-04-13', '2022-04-22'), processed)
+        self.assertEqual(['2022-04-14', '2022-04-19', '2022-04-20', '2022-04-21', '2022-04-22'], date_list)
+        self.assertEqual(['2022-04-19', '2022-04-21', '2022-04-22'], gaps)
+        # all dates processed, the look-back date is no gap
+        dates = calendar.date_range('2022-04-13', '2022-04-14')
+        self.assertEqual(([], []), calendar.processing_dates(dates, processed[:2]))
+        calendar = TradingCalendar()
+        date_list, gaps = calendar.processing_dates(calendar.date_range('2022-04-13', '2022-04-16'), processed)
+        self.assertEqual(['2022-04-14', '2022-04-15', '2022-04-16'], date_list)
+        self.assertEqual(['2022-04-15', '2022-04-16'], gaps)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,231 @@
+"""
+Test the sharded backfill of report 1
+"""
+
+import os
+import unittest
+import boto3
+import pandas as pd
+from functools import partial
+from unittest.mock import patch
+from botocore.exceptions import ClientError
+from xetra.common.s3 import S3BucketConnector
+from xetra.common.meta_process import MetaProcess
+from xetra.transformers.backfill import XetraBackfill, shard_date_range
+from xetra.transformers.xetra_transformer import XetraETL, XetraETLConfig
+from tests.transformers import test_transformers
+
+try:
+    from moto.server import ThreadedMotoServer
+except ImportError:
+    ThreadedMotoServer = None
+
+
+def shard_etl(endpoint_url: str, source_config, target_config, etl_config, shard: tuple = None):
+    """
+    Factory of the XetraETL of a shard, picklable for the process pool
+    """
+    s3_buckets = [S3BucketConnector(bucket=bucket, secret_key='AWS_SECRET_ACCESS_KEY',
+                                    access_key='AWS_ACCESS_KEY_ID', endpoint_url=endpoint_url)
+                  for bucket in ['src-bucket', 'trg-bucket']]
+    return XetraETL(*s3_buckets, 'meta_file', source_config, target_config, etl_config, shard=shard)
+
+
+class TestShardDateRange(unittest.TestCase):
+    """
+    Testing the split of a date range into shards
+    """
+
+    def test_shard_date_range(self):
+        """
+        Tests every shard gets the date before its first report date as look-back date
+        """
+        dates = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19', '2021-04-20']
+        shards_exp = [('2021-04-17', ['2021-04-16', '2021-04-17', '2021-04-18']),
+                      ('2021-04-19', ['2021-04-18', '2021-04-19', '2021-04-20'])]
+        self.assertEqual(shards_exp, shard_date_range('2021-04-17', dates, 2))
+        self.assertEqual([('2021-04-16', dates)], shard_date_range('2021-04-16', dates, 10))
+
+
+class TestXetraBackfill(unittest.TestCase):
+    """
+    Testing the XetraBackfill class.
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment, with the source files of TestXetraETLMethods
+        """
+        test_transformers.TestXetraETLMethods.setUp(self)
+        test_transformers.TestXetraETLMethods.fixture_setup(self)
+        self.extract_date = '2021-04-17'
+        self.extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19']
+        self.etl_factory = partial(shard_etl, self.s3_endpoint_url, self.source_config,
+                                   self.target_config, XetraETLConfig())
+        self.shard_keys = [self.target_config.trg_key + '2021-04-17_2021-04-18.parquet',
+                           self.target_config.trg_key + '2021-04-19_2021-04-19.parquet']
+
+    def tearDown(self):
+        test_transformers.TestXetraETLMethods.tearDown(self)
+
+    def backfill(self, processes: int = 1):
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[self.extract_date, self.extract_date_list]):
+            return XetraBackfill(self.etl_factory, 2, processes)
+
+    def read_report(self):
+        return pd.concat([self.s3_bucket_trg.read_s3_to_df(key, 'parquet') for key in self.shard_keys],
+                         ignore_index=True)
+
+    def read_meta_dates(self):
+        meta_file = self.s3_bucket_trg.list_files_in_prefix(self.meta_key)
+        return list(self.s3_bucket_trg.read_s3_to_df(meta_file[0], 'csv')['source_data']) if meta_file else []
+
+    def test_run(self):
+        """
+        Tests every shard writes its own output and the meta file is updated once at the end
+        """
+        # Test init
+        backfill = self.backfill()
+        # Method execution
+        with patch.object(MetaProcess, 'update_meta_file', wraps=backfill.meta.update_meta_file) as update_mock:
+            self.assertTrue(backfill.run())
+            # Test after method execution
+            self.assertEqual(1, update_mock.call_count)
+            self.assertTrue(self.df_report.equals(self.read_report()))
+            self.assertEqual(['2021-04-17', '2021-04-18', '2021-04-19'], self.read_meta_dates())
+            # a second run finds all shards done & committed
+            self.assertTrue(self.backfill().run())
+            self.assertEqual(1, update_mock.call_count)
+
+    def test_run_claimed_shard(self):
+        """
+        Tests a shard claimed by another invocation is skipped, the meta file is
+        only updated by the invocation completing the last shard
+        """
+        # Test init
+        backfill = self.backfill()
+        self.s3_bucket_trg.write_bytes_to_s3(b'other', backfill.prefix + 'claim/2021-04-19_2021-04-19')
+        # Method execution
+        self.assertFalse(backfill.run())
+        # Test after method execution
+        self.assertEqual([self.shard_keys[0]], self.s3_bucket_trg.list_files_in_prefix(self.target_config.trg_key))
+        self.assertEqual([], self.read_meta_dates())
+        # the claim goes stale, the next invocation takes it over and commits
+        with patch.object(XetraBackfill, '_is_stale', return_value=True):
+            self.assertTrue(self.backfill().run())
+        self.assertTrue(self.df_report.equals(self.read_report()))
+        self.assertEqual(['2021-04-17', '2021-04-18', '2021-04-19'], self.read_meta_dates())
+
+    def test_run_nothing_to_process(self):
+        """
+        Tests a backfill of an up to date bucket has no shards and nothing to commit
+        """
+        # Test init
+        self.extract_date_list = []
+        backfill = self.backfill()
+        # Method execution
+        self.assertTrue(backfill.run())
+        # Test after method execution
+        self.assertEqual([], backfill.shards)
+        self.assertEqual([], self.s3_bucket_trg.list_files_in_prefix(''))
+
+    def test_commit_conflict(self):
+        """
+        Tests an invocation losing the conditional write of the commit marker
+        does not update the meta file
+        """
+        # Test init
+        backfill = self.backfill()
+        error = ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'PutObject')
+        for shard in backfill.shards:
+            self.s3_bucket_trg.write_bytes_to_s3(b'other', backfill.shard_key(shard, 'done/'))
+        # Method execution
+        with patch.object(backfill.s3_bucket_target, "write_bytes_to_s3", side_effect=error) as write_mock:
+            with patch.object(MetaProcess, 'update_meta_file') as update_mock:
+                self.assertFalse(backfill.commit())
+        # Test after method execution
+        self.assertEqual({'if_none_match': '*'}, write_mock.call_args.kwargs)
+        update_mock.assert_not_called()
+
+    def test_commit_failed_meta_update(self):
+        """
+        Tests the dates of a backfill failing between the commit marker and the meta file
+        update are recorded by a rerun, once the commit marker is stale
+        """
+        # Test init
+        backfill = self.backfill()
+        # Method execution
+        with patch.object(MetaProcess, 'update_meta_file', side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                backfill.run()
+        # Test after method execution
+        self.assertTrue(backfill.pending()[1])
+        self.assertEqual([], self.read_meta_dates())
+        self.assertFalse(self.backfill().run())
+        with patch.object(XetraBackfill, '_is_stale', return_value=True):
+            self.assertTrue(self.backfill().run())
+        self.assertEqual(['2021-04-17', '2021-04-18', '2021-04-19'], self.read_meta_dates())
+        self.assertTrue(self.backfill().run())
+        self.assertEqual(['2021-04-17', '2021-04-18', '2021-04-19'], self.read_meta_dates())
+
+    def test_claim_conflict(self):
+        """
+        Tests a claim losing the conditional write against another invocation
+        """
+        # Test init
+        backfill = self.backfill()
+        error = ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'PutObject')
+        # Method execution
+        with patch.object(backfill.s3_bucket_target, "write_bytes_to_s3", side_effect=error):
+            self.assertFalse(backfill.claim(backfill.shards[0], set()))
+
+
+@unittest.skipIf(ThreadedMotoServer is None, 'requires moto[server]')
+class TestXetraBackfillProcesses(unittest.TestCase):
+    """
+    Testing the backfill in a pool of processes,
+    against a moto server as the processes do not share a mock_s3.
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment, with the source files of TestXetraETLMethods
+        """
+        self.server = ThreadedMotoServer(port=5058, verbose=False)
+        self.server.start()
+        self.s3_endpoint_url = 'http://127.0.0.1:5058'
+        self.meta_key = 'meta_file'
+        os.environ['AWS_ACCESS_KEY_ID'] = 'KEY1'
+        os.environ['AWS_SECRET_ACCESS_KEY'] = 'KEY2'
+        s3 = boto3.resource(service_name='s3', endpoint_url=self.s3_endpoint_url, region_name='eu-central-1')
+        for bucket in ['src-bucket', 'trg-bucket']:
+            s3.create_bucket(Bucket=bucket, CreateBucketConfiguration={'LocationConstraint': 'eu-central-1'})
+        self.s3_bucket_src, self.s3_bucket_trg = [
+            S3BucketConnector(bucket=bucket, secret_key='AWS_SECRET_ACCESS_KEY',
+                              access_key='AWS_ACCESS_KEY_ID', endpoint_url=self.s3_endpoint_url)
+            for bucket in ['src-bucket', 'trg-bucket']]
+        test_transformers.TestXetraETLMethods.fixture_setup(self)
+        self.extract_date = '2021-04-17'
+        self.extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19']
+        self.etl_factory = partial(shard_etl, self.s3_endpoint_url, self.source_config,
+                                   self.target_config, XetraETLConfig())
+        self.shard_keys = [self.target_config.trg_key + '2021-04-17_2021-04-18.parquet',
+                           self.target_config.trg_key + '2021-04-19_2021-04-19.parquet']
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_run_processes(self):
+        """
+        Tests the shards run in a pool of processes give the report of a single run
+        """
+        # Method execution
+        self.assertTrue(TestXetraBackfill.backfill(self, processes=2).run())
+        # Test after method execution
+        self.assertTrue(self.df_report.equals(TestXetraBackfill.read_report(self)))
+        self.assertEqual(['2021-04-17', '2021-04-18', '2021-04-19'], TestXetraBackfill.read_meta_dates(self))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,7 @@ Test ETL pipeline
 """
 
 import os
+import asyncio
 import unittest
 import boto3
 import pandas as pd
@@ -10,8 +11,22 @@ from moto import mock_s3
 from unittest.mock import patch
 from io import BytesIO
 from xetra.common.s3 import S3BucketConnector
+from xetra.common.async_s3 import AsyncS3BucketConnector, get_session
 from xetra.common.meta_process import MetaProcess
-from xetra.transformers.xetra_transformer import XetraETL, XetraSourceConfig, XetraTargetConfig
+from xetra.common.instrumentation import run_metrics
+from xetra.common.custom_exceptions import UnknownReport, WrongFormatException
+from xetra.transformers.xetra_transformer import XetraETL, XetraSourceConfig, XetraTargetConfig, \
+    XetraETLConfig, XetraReportConfig
+
+try:
+    from moto.server import ThreadedMotoServer
+except ImportError:
+    ThreadedMotoServer = None
+
+try:
+    import polars
+except ImportError:
+    polars = None
 
 
 class TestXetraETLMethods(unittest.TestCase):
@@ -185,6 +200,230 @@ class TestXetraETLMethods(unittest.TestCase):
         # Test after method execution
         self.assertTrue(df_exp.equals(df_result))
 
+    def test_extract_files_parallel(self):
+        """
+        Tests the extract method when
+        files are fetched concurrently
+        """
+        # Expected results
+        self.fixture_setup()
+        df_exp = self.df_src.loc[1:8].reset_index(drop=True)
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19', '2021-04-20']
+        etl_config = XetraETLConfig(max_workers=4)
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[extract_date, extract_date_list]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                 self.meta_key, self.source_config, self.target_config,
+                                 etl_config)
+            df_result = xetra_etl.extract()
+        # Test after method execution
+        self.assertTrue(df_exp.equals(df_result))
+
+    def test_extract_lookback_pushdown(self):
+        """
+        Tests only the first & last trade of every ISIN are extracted for the
+        look-back date, the report is the same as without the pushdown
+        """
+        # Expected results
+        self.fixture_setup()
+        columns_src = ['ISIN', 'Mnemonic', 'Date', 'Time', 'StartPrice',
+                       'EndPrice', 'MinPrice', 'MaxPrice', 'TradedVolume']
+        df_lookback = pd.DataFrame([['AT0000A0E9W5', 'SANT', '2021-04-16', '16:00', 18.11, 18.1, 18.0, 18.2, 10],
+                                    ['DE0005772206', 'FIE', '2021-04-16', '09:00', 40.12, 40.2, 40.0, 40.3, 20],
+                                    ['AT0000A0E9W5', 'SANT', '2021-04-16', '14:00', 18.57, 18.5, 18.4, 18.6, 30],
+                                    ['DE0005772206', 'FIE', '2021-04-16', '10:00', 41.34, 41.2, 41.0, 41.3, 40],
+                                    ['DE0005772206', 'FIE', '2021-04-16', '11:00', 42.43, 42.2, 42.0, 42.3, 50]],
+                                   columns=columns_src)
+        self.s3_bucket_src.write_df_to_s3(df_lookback, '2021-04-16/2021-04-16_BINS_XETR16.csv', 'csv')
+        lookback_exp = [('AT0000A0E9W5', '14:00'), ('AT0000A0E9W5', '15:00'), ('AT0000A0E9W5', '16:00'),
+                        ('DE0005772206', '09:00'), ('DE0005772206', '11:00')]
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19']
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[extract_date, extract_date_list]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                 self.meta_key, self.source_config, self.target_config)
+            xetra_etl_full = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                      self.meta_key, self.source_config, self.target_config,
+                                      XetraETLConfig(lookback_pushdown=False))
+            df_extract = xetra_etl.extract()
+            df_extract_full = xetra_etl_full.extract()
+            df_result = xetra_etl.transform_report1(df_extract)
+            df_result_full = xetra_etl_full.transform_report1(df_extract_full)
+        # Test after method execution
+        df_result_lookback = df_extract[df_extract['Date'] == '2021-04-16']
+        self.assertEqual(6, len(df_extract_full[df_extract_full['Date'] == '2021-04-16']))
+        self.assertListEqual(lookback_exp, sorted(zip(df_result_lookback['ISIN'], df_result_lookback['Time'])))
+        self.assertTrue(df_extract[df_extract['Date'] > '2021-04-16'].reset_index(drop=True).equals(
+            df_extract_full[df_extract_full['Date'] > '2021-04-16'].reset_index(drop=True)))
+        self.assertTrue(df_result_full.equals(df_result))
+
+    def test_extract_lookback_pushdown_later_run(self):
+        """
+        Tests the look-back date of a later run, whose extract date returned from the meta
+        file is still the first extract date, is reduced & neither reported nor recorded again
+        """
+        # Expected results
+        self.fixture_setup()
+        df_exp = self.df_report.loc[2:2].reset_index(drop=True)
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=['2021-04-01', ['2021-04-18', '2021-04-19']]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                 self.meta_key, self.source_config, self.target_config)
+            xetra_etl.etl_report1()
+        # Test after method execution
+        self.assertEqual('2021-04-19', xetra_etl.extract_date)
+        self.assertEqual(('2021-04-18',), xetra_etl.lookback_dates)
+        self.assertEqual(['2021-04-19'], xetra_etl.meta_update_list)
+        trg_file = self.s3_bucket_trg.list_files_in_prefix(self.target_config.trg_key)[0]
+        self.assertTrue(df_exp.equals(self.s3_bucket_trg.read_s3_to_df(trg_file, 'parquet')))
+
+    def test_extract_lookback_pushdown_unsorted_categories(self):
+        """
+        Tests the first & last trade of the look-back date are selected by time with the pyarrow
+        engine, whose categories are in order of appearance instead of sorted
+        """
+        # Expected results
+        self.fixture_setup()
+        columns_src = ['ISIN', 'Mnemonic', 'Date', 'Time', 'StartPrice',
+                       'EndPrice', 'MinPrice', 'MaxPrice', 'TradedVolume']
+        df_lookback = pd.DataFrame([['AT0000A0E9W5', 'SANT', '2021-04-16', '16:05', 18.11, 18.1, 18.0, 18.2, 10],
+                                    ['DE0005772206', 'FIE', '2021-04-16', '16:05', 40.12, 40.2, 40.0, 40.3, 20],
+                                    ['DE0005772206', 'FIE', '2021-04-16', '16:01', 41.34, 41.2, 41.0, 41.3, 40],
+                                    ['DE0005772206', 'FIE', '2021-04-16', '16:03', 42.43, 42.2, 42.0, 42.3, 50]],
+                                   columns=columns_src)
+        self.s3_bucket_src.write_df_to_s3(df_lookback, '2021-04-16/2021-04-16_BINS_XETR16.csv', 'csv')
+        self.s3_bucket_src.write_df_to_s3(pd.DataFrame([['DE0005772206', 'FIE', '2021-04-17', '13:00', 40.0, 40.1,
+                                                         39.9, 40.2, 60]], columns=columns_src),
+                                          '2021-04-17/2021-04-17_BINS_XETR13_FIE.csv', 'csv')
+        source_config = self.source_config._replace(src_dtypes={'ISIN': 'category', 'Date': 'category',
+                                                                'Time': 'category'})
+        s3_bucket_src = S3BucketConnector(bucket=self.s3_bucket_name_src, secret_key=self.s3_secret_key,
+                                          access_key=self.s3_access_key, endpoint_url=self.s3_endpoint_url,
+                                          csv_engine='pyarrow')
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17']
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[extract_date, extract_date_list]):
+            xetra_etls = [XetraETL(s3_bucket_src, self.s3_bucket_trg, self.meta_key, source_config,
+                                   self.target_config, XetraETLConfig(lookback_pushdown=pushdown))
+                          for pushdown in [True, False]]
+            df_results = [xetra_etl.transform_report1(xetra_etl.extract()) for xetra_etl in xetra_etls]
+        # Test after method execution
+        df_fie = df_results[0][df_results[0]['ISIN'] == 'DE0005772206']
+        # change to the price of the first trade at 16:01, not of the first category 16:05
+        self.assertEqual(-3.24, df_fie['change_prev_closing_%'].iloc[0])
+        self.assertTrue(df_results[1].equals(df_results[0]))
+
+    def test_list_source_files(self):
+        """
+        Tests the merged key manifest is identical
+        for serial and concurrent listing
+        """
+        # Expected results
+        self.fixture_setup()
+        keys_exp = ['2021-04-16/2021-04-16_BINS_XETR15.csv',
+                    '2021-04-17/2021-04-17_BINS_XETR13.csv',
+                    '2021-04-17/2021-04-17_BINS_XETR14.csv',
+                    '2021-04-18/2021-04-18_BINS_XETR07.csv',
+                    '2021-04-18/2021-04-18_BINS_XETR08.csv',
+                    '2021-04-19/2021-04-19_BINS_XETR07.csv',
+                    '2021-04-19/2021-04-19_BINS_XETR08.csv',
+                    '2021-04-19/2021-04-19_BINS_XETR09.csv']
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19', '2021-04-20']
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[extract_date, extract_date_list]):
+            keys_serial = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                   self.meta_key, self.source_config, self.target_config
+                                   ).list_source_files()
+            keys_parallel = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                     self.meta_key, self.source_config, self.target_config,
+                                     XetraETLConfig(max_workers=4)).list_source_files()
+        # Test after method execution
+        self.assertListEqual(keys_exp, keys_serial)
+        self.assertListEqual(keys_exp, keys_parallel)
+
+    def test_extract_transform_compact_dtypes(self):
+        """
+        Tests extract & transform_report1 with a compact
+        source schema give the same report
+        """
+        # Expected results
+        self.fixture_setup()
+        df_exp = self.df_report
+        src_dtypes = {'ISIN': 'category', 'Mnemonic': 'category', 'Date': 'category', 'Time': 'category',
+                      'StartPrice': 'float32', 'EndPrice': 'float32', 'MinPrice': 'float32',
+                      'MaxPrice': 'float32'}
+        source_config = self.source_config._replace(src_dtypes=src_dtypes)
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19']
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[extract_date, extract_date_list]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                 self.meta_key, source_config, self.target_config)
+            df_extract = xetra_etl.extract()
+            df_result = xetra_etl.transform_report1(df_extract)
+        # Test after method execution
+        self.assertEqual('category', df_extract['ISIN'].dtype)
+        self.assertEqual('float32', df_extract['StartPrice'].dtype)
+        self.assertListEqual(sorted(df_extract['Time'].unique()), list(df_extract['Time'].cat.categories))
+        self.assertTrue(df_exp.equals(df_result))
+
+    @unittest.skipIf(polars is None, 'requires polars')
+    def test_transform_report1_polars(self):
+        """
+        Tests the polars transform backend gives the same report as the pandas one,
+        for the default & the compact source schema and in the batch & streaming modes
+        """
+        # Expected results
+        self.fixture_setup()
+        src_dtypes = {'ISIN': 'category', 'Mnemonic': 'category', 'Date': 'category', 'Time': 'category',
+                      'StartPrice': 'float32', 'EndPrice': 'float32', 'MinPrice': 'float32',
+                      'MaxPrice': 'float32'}
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19']
+        for source_config in [self.source_config, self.source_config._replace(src_dtypes=src_dtypes)]:
+            # Method execution
+            with patch.object(MetaProcess, "return_date_list",
+                              return_value=[extract_date, extract_date_list]):
+                xetra_etl_pandas = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                            self.meta_key, source_config, self.target_config)
+                xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                     self.meta_key, source_config, self.target_config,
+                                     XetraETLConfig(transform_backend='polars'))
+                df_extract = xetra_etl.extract()
+                df_exp = xetra_etl_pandas.transform_report1(df_extract.copy())
+                df_result = xetra_etl.transform_report1(df_extract)
+                df_result_stream = xetra_etl.transform_report1_stream(xetra_etl.extract_stream())
+            # Test after method execution
+            self.assertTrue(self.df_report.equals(df_exp))
+            self.assertTrue(df_exp.equals(df_result))
+            self.assertTrue(df_exp.equals(df_result_stream))
+
+    def test_wrong_transform_backend(self):
+        """
+        Tests an unsupported transform backend is rejected
+        """
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=['2021-04-17', ['2021-04-16', '2021-04-17']]):
+            with self.assertRaises(WrongFormatException):
+                XetraETL(self.s3_bucket_src, self.s3_bucket_trg, self.meta_key, None, None,
+                         XetraETLConfig(transform_backend='narwhal'))
+
     def test_transform_report1_emptydf(self):
         """
         Tests the transform_report1 method with
@@ -236,6 +475,196 @@ class TestXetraETLMethods(unittest.TestCase):
         # Test after method execution
         self.assertTrue(df_exp.equals(df_result))
 
+    def test_transform_report1_sharded(self):
+        """
+        Tests the transform_report1 method sharded by ISIN in a pool of processes
+        gives the same report as the single process transformation
+        """
+        # Expected results
+        self.fixture_setup()
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19']
+        frames = []
+        for idx, isin in enumerate(['AT0000A0E9W5', 'DE0005772206', 'DE000A1EWWW0', 'US0378331005']):
+            df_isin = self.df_src.loc[1:8].copy()
+            df_isin['ISIN'] = isin
+            df_isin[['StartPrice', 'EndPrice', 'MinPrice', 'MaxPrice']] += idx
+            frames.append(df_isin)
+        df_input = pd.concat(frames[::-1], ignore_index=True)
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[extract_date, extract_date_list]):
+            df_exp = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                              self.meta_key, self.source_config, self.target_config
+                              ).transform_report1(df_input.copy())
+            df_result = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                 self.meta_key, self.source_config, self.target_config,
+                                 XetraETLConfig(transform_processes=3)).transform_report1(df_input.copy())
+        # Test after method execution
+        self.assertEqual(12, len(df_result))
+        self.assertTrue(df_exp.equals(df_result))
+
+    def test_transform_report1_stream_ok(self):
+        """
+        Tests the transform_report1_stream method with
+        the output of extract_stream as input argument
+        """
+        # Expected results
+        self.fixture_setup()
+        df_exp = self.df_report
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19', '2021-04-20']
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[extract_date, extract_date_list]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                 self.meta_key, self.source_config, self.target_config,
+                                 XetraETLConfig(stream=True))
+            stream = xetra_etl.extract_stream()
+            self.assertEqual(1, len(next(stream)))
+            df_result = xetra_etl.transform_report1_stream(xetra_etl.extract_stream())
+        # Test after method execution
+        self.assertTrue(df_exp.equals(df_result))
+
+    def test_transform_report1_stream_empty(self):
+        """
+        Tests the transform_report1_stream method with
+        an empty stream as input argument
+        """
+        # Expected results
+        self.fixture_setup()
+        log_exp = 'Dataframe is empty, no transformation will be applied'
+        # Test init
+        extract_date = '2200-01-02'
+        extract_date_list = []
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[extract_date, extract_date_list]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                 self.meta_key, self.source_config, self.target_config,
+                                 XetraETLConfig(stream=True))
+            with self.assertLogs() as logm:
+                df_result = xetra_etl.transform_report1_stream(xetra_etl.extract_stream())
+                self.assertIn(log_exp, logm.output[-1])
+        # Test after method execution
+        self.assertTrue(df_result.empty)
+
+    def test_transform_report1_incremental_no_state(self):
+        """
+        Tests the transform_report1_incremental method
+        when no state has been written yet
+        """
+        # Expected results
+        self.fixture_setup()
+        df_exp = self.df_report
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19']
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[extract_date, extract_date_list]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                 self.meta_key, self.source_config, self.target_config,
+                                 XetraETLConfig(incremental=True))
+            df_result, df_state = xetra_etl.transform_report1_incremental()
+        # Test after method execution
+        self.assertTrue(df_exp.equals(df_result))
+        self.assertEqual(['2021-04-19'], list(df_state['Date']))
+
+    def test_etl_report1_incremental(self):
+        """
+        Tests two consecutive incremental runs, the second one
+        takes the previous closing price from the state
+        """
+        # Expected results
+        self.fixture_setup()
+        df_exp = self.df_report.loc[2:2].reset_index(drop=True)
+        log_exp = 'Previous closing prices taken from state, skipping look-back date 2021-04-18'
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=['2021-04-17', ['2021-04-16', '2021-04-17', '2021-04-18']]):
+            XetraETL(self.s3_bucket_src, self.s3_bucket_trg, self.meta_key, self.source_config,
+                     self.target_config, XetraETLConfig(incremental=True)).etl_report1()
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=['2021-04-19', ['2021-04-18', '2021-04-19']]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg, self.meta_key,
+                                 self.source_config, self.target_config,
+                                 XetraETLConfig(incremental=True))
+            with self.assertLogs() as logm:
+                df_result, df_state = xetra_etl.transform_report1_incremental()
+                self.assertIn(log_exp, logm.output[1])
+                self.assertFalse([log for log in logm.output if '2021-04-18/' in log])
+        # Test after method execution
+        self.assertTrue(df_exp.equals(df_result))
+        self.assertEqual(['2021-04-19'], list(df_state['Date']))
+        self.assertEqual(['2021-04-18'], list(xetra_etl.read_state()['Date']))
+
+    def test_transform_report1_incremental_same_rows(self):
+        """
+        Tests the report rows are the same whether the previous closing prices are taken
+        from the state or from the extracted look-back date
+        """
+        # Expected results
+        self.fixture_setup()
+        df_exp = self.df_report.loc[2:2].reset_index(drop=True)
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=['2021-04-01', ['2021-04-16', '2021-04-17', '2021-04-18']]):
+            XetraETL(self.s3_bucket_src, self.s3_bucket_trg, self.meta_key, self.source_config,
+                     self.target_config, XetraETLConfig(incremental=True)).etl_report1()
+        # Method execution
+        df_results = []
+        for read_state in [XetraETL.read_state, lambda etl: None]:
+            with patch.object(MetaProcess, "return_date_list",
+                              return_value=['2021-04-01', ['2021-04-18', '2021-04-19']]):
+                xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg, self.meta_key,
+                                     self.source_config, self.target_config, XetraETLConfig(incremental=True))
+                with patch.object(XetraETL, 'read_state', autospec=True, side_effect=read_state):
+                    df_results.append(xetra_etl.transform_report1_incremental()[0])
+        # Test after method execution
+        for df_result in df_results:
+            self.assertTrue(df_exp.equals(df_result))
+
+    def test_etl_report1_incremental_stale_state(self):
+        """
+        Tests the look-back date is extracted if the state does not hold it, e.g. after
+        a non-incremental run, and state rows before the look-back date are not used
+        """
+        # Expected results
+        self.fixture_setup()
+        df_exp = self.df_report.loc[2:2].reset_index(drop=True)
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=['2021-04-17', ['2021-04-16', '2021-04-17']]):
+            XetraETL(self.s3_bucket_src, self.s3_bucket_trg, self.meta_key, self.source_config,
+                     self.target_config, XetraETLConfig(incremental=True)).etl_report1()
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=['2021-04-19', ['2021-04-18', '2021-04-19']]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg, self.meta_key,
+                                 self.source_config, self.target_config,
+                                 XetraETLConfig(incremental=True))
+            df_result, df_state = xetra_etl.transform_report1_incremental()
+        # Test after method execution
+        self.assertTrue(df_exp.equals(df_result))
+        # an ISIN of the state not traded on the look-back date has no previous closing price
+        df_state = pd.concat([df_state, df_state.assign(ISIN='DE0005772206', Date='2021-04-15')],
+                             ignore_index=True)
+        self.s3_bucket_trg.write_df_to_s3(df_state.assign(Date=['2021-04-18', '2021-04-15']),
+                                          self.target_config.trg_state_key, 'parquet')
+        self.s3_bucket_src.write_df_to_s3(self.df_src.loc[8:8].assign(ISIN='DE0005772206'),
+                                          '2021-04-19/2021-04-19_BINS_XETR09_FIE.csv', 'csv')
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=['2021-04-19', ['2021-04-18', '2021-04-19']]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg, self.meta_key,
+                                 self.source_config, self.target_config,
+                                 XetraETLConfig(incremental=True))
+            with patch.object(XetraETL, 'extract_stream', autospec=True,
+                              side_effect=XetraETL.extract_stream) as stream_mock:
+                df_result, _ = xetra_etl.transform_report1_incremental()
+        self.assertEqual(['2021-04-19'], stream_mock.call_args.args[1])
+        self.assertTrue(pd.isna(df_result.loc[df_result['ISIN'] == 'DE0005772206', 'change_prev_closing_%']).all())
+
     def test_load(self):
         """
         Tests the load method
@@ -272,6 +701,41 @@ class TestXetraETLMethods(unittest.TestCase):
         # Cleanup after test
         self.fixture_teardown(trg_file, trg_file)
 
+    def test_load_partitioned(self):
+        """
+        Tests the load method writing a date partitioned
+        dataset, a rerun overwrites the same keys
+        """
+        # Expected results
+        self.fixture_setup()
+        target_config = self.target_config._replace(
+            trg_partition_key='report1/date={date}/xetra_daily_report1.parquet')
+        keys_exp = ['report1/date=2021-04-17/xetra_daily_report1.parquet',
+                    'report1/date=2021-04-18/xetra_daily_report1.parquet',
+                    'report1/date=2021-04-19/xetra_daily_report1.parquet']
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19']
+        df_input = self.df_report
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[extract_date, extract_date_list]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                 self.meta_key, self.source_config, target_config)
+            xetra_etl.load(df_input)
+            xetra_etl.load(df_input)
+        # Test after method execution
+        self.assertListEqual(keys_exp, self.s3_bucket_trg.list_files_in_prefix('report1/'))
+        df_result = self.s3_bucket_trg.read_s3_to_df(keys_exp[1], 'parquet')
+        self.assertTrue(self.df_report.loc[1:1].reset_index(drop=True).equals(df_result))
+        # an empty report, e.g. once all dates are processed, writes no partition
+        with patch.object(MetaProcess, "return_date_list", return_value=[extract_date, []]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                 self.meta_key, self.source_config, target_config)
+            self.assertEqual([], xetra_etl.load_partitioned(pd.DataFrame()))
+            xetra_etl.etl_report1()
+        self.assertListEqual(keys_exp, self.s3_bucket_trg.list_files_in_prefix('report1/'))
+
     def test_etl_report1(self):
         """
         Tests the etl_report1 method
@@ -301,6 +765,271 @@ class TestXetraETLMethods(unittest.TestCase):
         # Cleanup after test
         self.fixture_teardown(trg_file, trg_file)
 
+    def test_etl_report1_checkpoint_resume(self):
+        """
+        Tests a run failing after some days resumes at the first day without checkpoint,
+        and the checkpoints are removed after a successful load
+        """
+        # Expected results
+        self.fixture_setup()
+        staged_exp = ['staging/report1/2021-04-16.lookback.manifest.csv',
+                      'staging/report1/2021-04-16.lookback.parquet',
+                      'staging/report1/2021-04-17.manifest.csv', 'staging/report1/2021-04-17.parquet',
+                      'staging/report1/2021-04-18.manifest.csv', 'staging/report1/2021-04-18.parquet']
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19']
+        aggregate = XetraETL._aggregate_daily
+
+        def fail_on_last_day(etl, df):
+            if (df['Date'] == '2021-04-19').any():
+                raise ConnectionError('network blip')
+            return aggregate(etl, df)
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[extract_date, extract_date_list]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg, self.meta_key, self.source_config,
+                                 self.target_config, XetraETLConfig(checkpoint=True))
+            with patch.object(XetraETL, '_aggregate_daily', autospec=True, side_effect=fail_on_last_day):
+                with self.assertRaises(ConnectionError):
+                    xetra_etl.etl_report1()
+            self.assertEqual(staged_exp, self.s3_bucket_trg.list_files_in_prefix('staging/'))
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg, self.meta_key, self.source_config,
+                                 self.target_config, XetraETLConfig(checkpoint=True))
+            run_metrics.reset()
+            with patch.object(XetraETL, '_read_source_file', autospec=True,
+                              side_effect=XetraETL._read_source_file) as read_mock:
+                xetra_etl.etl_report1()
+        # Test after method execution
+        self.assertEqual(['2021-04-19/2021-04-19_BINS_XETR07.csv', '2021-04-19/2021-04-19_BINS_XETR08.csv',
+                          '2021-04-19/2021-04-19_BINS_XETR09.csv'],
+                         [call.args[1] for call in read_mock.call_args_list])
+        trg_file = self.s3_bucket_trg.list_files_in_prefix(self.target_config.trg_key)[0]
+        self.assertTrue(self.df_report.equals(self.s3_bucket_trg.read_s3_to_df(trg_file, 'parquet')))
+        self.assertEqual([], self.s3_bucket_trg.list_files_in_prefix('staging/'))
+        # the checkpoint key lookups are no stages of their own
+        self.assertNotIn('transform_reports', run_metrics.summary()['stages'])
+
+    def test_checkpoint_source_changed(self):
+        """
+        Tests the checkpoint of a day is not used once its source files have changed
+        """
+        # Expected results
+        self.fixture_setup()
+        df_exp = self.df_src.loc[4:6].reset_index(drop=True)
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18']
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[extract_date, extract_date_list]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg, self.meta_key, self.source_config,
+                                 self.target_config, XetraETLConfig(checkpoint=True))
+        xetra_etl.aggregate_daily_checkpointed()
+        self.s3_bucket_src.write_df_to_s3(self.df_src.loc[6:6].assign(Date='2021-04-18'),
+                                          '2021-04-18/2021-04-18_BINS_XETR09.csv', 'csv')
+        # Method execution
+        with patch.object(XetraETL, '_read_source_file', autospec=True,
+                          side_effect=XetraETL._read_source_file) as read_mock:
+            df_daily = xetra_etl.aggregate_daily_checkpointed()
+        # Test after method execution
+        self.assertEqual(3, read_mock.call_count)
+        self.assertEqual(df_exp['TradedVolume'].sum(), df_daily[-1]['daily_traded_volume'].sum())
+        xetra_etl.remove_checkpoints()
+
+    def test_etl_report1_change_detection(self):
+        """
+        Tests a processed date whose source file has been republished is reported again,
+        with the following date and its look-back date, other processed dates are not read
+        """
+        # Expected results
+        self.fixture_setup()
+        df_exp = self.df_report.copy()
+        df_exp.loc[0, ['opening_price_eur', 'minimum_price_eur', 'change_prev_closing_%']] = [19.21, 18.21, 5.15]
+        df_exp.loc[1, 'change_prev_closing_%'] = 7.13
+        # Test init
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=['2021-04-17', ['2021-04-16', '2021-04-17', '2021-04-18']]):
+            XetraETL(self.s3_bucket_src, self.s3_bucket_trg, self.meta_key, self.source_config,
+                     self.target_config, XetraETLConfig(change_detection=True)).etl_report1()
+        trg_file = self.s3_bucket_trg.list_files_in_prefix(self.target_config.trg_key)[0]
+        self.trg_bucket.Object(trg_file).delete()
+        self.s3_bucket_src.write_df_to_s3(self.df_src.loc[2:2].assign(StartPrice=19.21),
+                                          '2021-04-17/2021-04-17_BINS_XETR13.csv', 'csv')
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=['2021-04-19', ['2021-04-18', '2021-04-19']]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg, self.meta_key, self.source_config,
+                                 self.target_config, XetraETLConfig(change_detection=True))
+            with patch.object(XetraETL, '_read_source_file', autospec=True,
+                              side_effect=XetraETL._read_source_file) as read_mock:
+                xetra_etl.etl_report1()
+        # Test after method execution
+        self.assertEqual(['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19'], xetra_etl.extract_date_list)
+        self.assertFalse([call for call in read_mock.call_args_list if call.args[1].startswith('2021-04-15')])
+        trg_file = self.s3_bucket_trg.list_files_in_prefix(self.target_config.trg_key)[0]
+        self.assertTrue(df_exp.equals(self.s3_bucket_trg.read_s3_to_df(trg_file, 'parquet')))
+        df_record = MetaProcess().read_source_record(self.s3_bucket_trg)
+        self.assertEqual([], MetaProcess().changed_dates(
+            MetaProcess().list_source_objects(self.s3_bucket_src, '2021-04-01'), df_record))
+        self.assertEqual(['2021-04-15', '2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19'],
+                         sorted(df_record['source_data'].unique()))
+
+    def test_etl_report1_run_metrics(self):
+        """
+        Tests the stages & s3 calls of a run are recorded in the run metrics
+        """
+        # Expected results
+        self.fixture_setup()
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19']
+        run_metrics.reset()
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[extract_date, extract_date_list]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                 self.meta_key, self.source_config, self.target_config)
+            xetra_etl.etl_report1()
+        # Test after method execution
+        stages = run_metrics.summary()['stages']
+        self.assertEqual(8, stages['extract']['objects'])
+        self.assertEqual(8, stages['s3.read_s3_to_df']['objects'])
+        self.assertGreater(stages['s3.read_s3_to_df']['bytes_in'], 0)
+        self.assertEqual(stages['extract']['rows_out'], stages['transform_report1']['rows_in'])
+        self.assertEqual(len(self.df_report), stages['transform_report1']['rows_out'])
+        self.assertEqual(len(self.df_report), stages['load']['rows_in'])
+        self.assertGreater(stages['s3.write_df_to_s3']['bytes_out'], 0)
+        self.assertEqual(1, stages['meta.update_meta_file']['calls'])
+        for stage in ['extract', 'transform_report1', 'load']:
+            self.assertGreater(stages[stage]['peak_rss_bytes'], 0)
+        # Cleanup after test
+        trg_file = self.s3_bucket_trg.list_files_in_prefix(self.target_config.trg_key)[0]
+        self.fixture_teardown(trg_file, trg_file)
+
+    def test_etl_report1_additional_reports(self):
+        """
+        Tests additional reports are computed from the same extracted data, the source
+        files are downloaded once, in the batch and in the streaming mode
+        """
+        # Expected results
+        self.fixture_setup()
+        df_volume_exp = pd.DataFrame([['2021-04-16', 987], ['2021-04-17', 1088],
+                                      ['2021-04-18', 10286], ['2021-04-19', 3586]],
+                                     columns=['Date', 'TradedVolume'])
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19']
+        XetraETL.register_report('daily_volume', lambda df, etl: df.groupby(
+            etl.src_args.src_col_date, as_index=False)[etl.src_args.src_col_traded_vol].sum())
+        reports = [XetraReportConfig(name='volume', transform='daily_volume', trg_key='volume/daily_volume_')]
+        calls = []
+
+        def count_get(params, **kwargs):
+            calls.append(params['Key'])
+        # the client is shared by all connectors of the endpoint, the handler is removed again below
+        self.s3_bucket_src.client.meta.events.register('before-parameter-build.s3.GetObject', count_get)
+        for stream in [False, True]:
+            calls.clear()
+            # Method execution
+            with patch.object(MetaProcess, "return_date_list",
+                              return_value=[extract_date, extract_date_list]):
+                xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                     self.meta_key, self.source_config, self.target_config,
+                                     XetraETLConfig(stream=stream, reports=reports))
+                xetra_etl.etl_report1()
+            # Test after method execution
+            volume_file = self.s3_bucket_trg.list_files_in_prefix('volume/daily_volume_')[0]
+            trg_file = self.s3_bucket_trg.list_files_in_prefix(self.target_config.trg_key)[0]
+            df_volume = self.s3_bucket_trg.read_s3_to_df(volume_file, 'parquet')
+            df_report = self.s3_bucket_trg.read_s3_to_df(trg_file, 'parquet')
+            self.assertTrue(df_volume_exp.equals(df_volume))
+            self.assertTrue(self.df_report.equals(df_report))
+            self.assertEqual(8, len([key for key in calls if key.startswith('2021-')]))
+            self.assertEqual(len(calls), len(set(calls)))
+            self.fixture_teardown(volume_file, trg_file)
+        self.s3_bucket_src.client.meta.events.unregister('before-parameter-build.s3.GetObject', count_get)
+
+    def test_unknown_report(self):
+        """
+        Tests a report transform that is neither registered nor importable is rejected
+        """
+        self.fixture_setup()
+        reports = [XetraReportConfig(name='volume', transform='no_such_module:volume', trg_key='volume/')]
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=['2021-04-17', ['2021-04-16', '2021-04-17']]):
+            with self.assertRaises(UnknownReport):
+                XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                         self.meta_key, self.source_config, self.target_config,
+                         XetraETLConfig(reports=reports))
+
+
+@unittest.skipIf(get_session is None or ThreadedMotoServer is None, 'requires aiobotocore and moto[server]')
+class TestXetraETLAsyncExtract(unittest.TestCase):
+    """
+    Testing the asynchronous extraction of the XetraETL class,
+    against a moto server as aiobotocore does not work with mock_s3.
+    """
+
+    def setUp(self):
+        """
+        Setting up the environment, with the same source files as TestXetraETLMethods
+        """
+        self.server = ThreadedMotoServer(port=5057, verbose=False)
+        self.server.start()
+        self.s3_access_key = 'AWS_ACCESS_KEY_ID'
+        self.s3_secret_key = 'AWS_SECRET_ACCESS_KEY'
+        self.s3_endpoint_url = 'http://127.0.0.1:5057'
+        self.s3_bucket_name_src = 'src-bucket'
+        self.s3_bucket_name_trg = 'trg-bucket'
+        self.meta_key = 'meta_file'
+        os.environ[self.s3_access_key] = 'KEY1'
+        os.environ[self.s3_secret_key] = 'KEY2'
+        self.s3 = boto3.resource(service_name='s3', endpoint_url=self.s3_endpoint_url,
+                                 region_name='eu-central-1')
+        for bucket in [self.s3_bucket_name_src, self.s3_bucket_name_trg]:
+            self.s3.create_bucket(Bucket=bucket,
+                                  CreateBucketConfiguration={'LocationConstraint': 'eu-central-1'})
+        self.s3_bucket_src = S3BucketConnector(bucket=self.s3_bucket_name_src,
+                                               secret_key=self.s3_secret_key,
+                                               access_key=self.s3_access_key,
+                                               endpoint_url=self.s3_endpoint_url)
+        self.s3_bucket_trg = S3BucketConnector(bucket=self.s3_bucket_name_trg,
+                                               secret_key=self.s3_secret_key,
+                                               access_key=self.s3_access_key,
+                                               endpoint_url=self.s3_endpoint_url)
+        self.s3_bucket_src_async = AsyncS3BucketConnector(bucket=self.s3_bucket_name_src,
+                                                          secret_key=self.s3_secret_key,
+                                                          access_key=self.s3_access_key,
+                                                          endpoint_url=self.s3_endpoint_url)
+        TestXetraETLMethods.fixture_setup(self)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_etl_report1_async_extract(self):
+        """
+        Tests the asynchronous extraction returns the same data as extract
+        and etl_report1 writes the same report with it
+        """
+        # Expected results
+        df_exp = self.df_src.loc[1:8].reset_index(drop=True)
+        # Test init
+        extract_date = '2021-04-17'
+        extract_date_list = ['2021-04-16', '2021-04-17', '2021-04-18', '2021-04-19', '2021-04-20']
+        # Method execution
+        with patch.object(MetaProcess, "return_date_list",
+                          return_value=[extract_date, extract_date_list]):
+            xetra_etl = XetraETL(self.s3_bucket_src, self.s3_bucket_trg,
+                                 self.meta_key, self.source_config, self.target_config,
+                                 XetraETLConfig(async_extract=True), self.s3_bucket_src_async)
+            df_result = asyncio.run(xetra_etl.extract_async())
+            xetra_etl.etl_report1()
+        # Test after method execution
+        self.assertTrue(df_exp.equals(df_result))
+        trg_file = self.s3_bucket_trg.list_files_in_prefix(self.target_config.trg_key)[0]
+        df_report = self.s3_bucket_trg.read_s3_to_df(trg_file, 'parquet')
+        self.assertTrue(self.df_report.equals(df_report))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,154 @@
+"""
+Asynchronous connector & methods accessing S3, for a high number of concurrent requests
+"""
+
+import os
+import asyncio
+import logging
+import pandas as pd
+from contextlib import AsyncExitStack
+from io import StringIO, BytesIO
+from xetra.common.constants import CsvEngines, DataParams, S3FileTypes
+from xetra.common.custom_exceptions import WrongFormatException
+from xetra.common.instrumentation import run_metrics
+from xetra.common.s3 import S3ClientConfig, parse_body
+
+try:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session
+except ImportError:
+    get_session = None
+
+
+class AsyncS3BucketConnector():
+    """
+    Class to interact with S3 Buckets from asyncio code, with the same methods as
+    S3BucketConnector as coroutines. The http client is opened when entering the
+    connector as async context manager and closed when leaving it:
+
+        async with AsyncS3BucketConnector(...) as s3_bucket:
+            df = await s3_bucket.read_s3_to_df(key, 'csv')
+
+    Responses are downloaded on the event loop, parsing runs in the default thread pool.
+    """
+
+    def __init__(self, bucket: str, secret_key: str, access_key: str, endpoint_url: str,
+                 csv_engine: str = CsvEngines.PANDAS.value,
+                 client_config: S3ClientConfig = S3ClientConfig(),
+                 max_in_flight: int = DataParams.ASYNC_MAX_IN_FLIGHT.value):
+        """
+        Constructor for AsyncS3BucketConnector
+
+        :param bucket: S3 bucket name for source data
+        :param secret_key: secret key for accessing aws s3
+        :param access_key: access key for accessing aws s3
+        :param endpoint_url: endpoint url to s3
+        :param csv_engine: parser backend for csv files, pandas or pyarrow
+        :param client_config: retry and timeout settings of the client, the connection
+                              pool is sized to max_in_flight
+        :param max_in_flight: maximum number of concurrent requests
+        """
+        if get_session is None:
+            raise ImportError('AsyncS3BucketConnector requires aiobotocore, pip install aiobotocore')
+        self._logger = logging.getLogger(__name__)
+        if csv_engine not in [engine.value for engine in CsvEngines]:
+            raise WrongFormatException(f'Unsupported csv engine {csv_engine}')
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.csv_engine = csv_engine
+        self.max_in_flight = max_in_flight
+        self._credentials = {'aws_access_key_id': os.environ[access_key],
+                             'aws_secret_access_key': os.environ[secret_key]}
+        self._config = AioConfig(max_pool_connections=max_in_flight,
+                                 retries={'mode': client_config.retry_mode,
+                                          'total_max_attempts': client_config.max_attempts},
+                                 connect_timeout=client_config.connect_timeout,
+                                 read_timeout=client_config.read_timeout,
+                                 tcp_keepalive=client_config.tcp_keepalive)
+        self._exit_stack = None
+        self._semaphore = None
+        self.client = None
+
+    async def __aenter__(self):
+        self._exit_stack = AsyncExitStack()
+        self.client = await self._exit_stack.enter_async_context(
+            get_session().create_client('s3', endpoint_url=self.endpoint_url, config=self._config,
+                                        **self._credentials))
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._exit_stack.aclose()
+        self.client = None
+        self._exit_stack = None
+
+    async def list_files_in_prefix(self, prefix: str, start_after: str = None):
+        """
+        listing of files with a prefix on the s3 bucket
+        :param prefix: prefix on the s3 bucket that should be filterd
+        :param start_after: optional key, only keys sorting after it are listed
+        returns:
+        all files with prefix key
+        """
+        params = {'Bucket': self.bucket, 'Prefix': prefix}
+        if start_after is not None:
+            params['Marker'] = start_after
+        files = []
+        async with self._semaphore:
+            with run_metrics.call('s3.list_files_in_prefix') as counters:
+                async for page in self.client.get_paginator('list_objects').paginate(**params):
+                    files.extend(obj['Key'] for obj in page.get('Contents', []))
+                counters['objects'] = len(files)
+        return files
+
+    async def read_s3_to_df(self, key: str, format: str, columns: list = None, dtypes: dict = None):
+        """
+        Reading a csv from s3 bucket and parsing it to a pandas dataframe
+        :params key: Filename that is to be read to dataframe
+        :params format: format of the file (csv or parquet)
+        :params columns: optional list of columns to be parsed, all others are skipped
+        :params dtypes: optional mapping of column to dtype, e.g. {'ISIN': 'category'}
+        returns:
+        pandas dataframe of the csv
+        """
+        self._logger.info('Reading file %s/%s/%s', self.endpoint_url, self.bucket, key)
+        if format not in [file_type.value for file_type in S3FileTypes]:
+            raise WrongFormatException
+        with run_metrics.call('s3.read_s3_to_df') as counters:
+            async with self._semaphore:
+                response = await self.client.get_object(Bucket=self.bucket, Key=key)
+                async with response['Body'] as body:
+                    data = await body.read()
+            df = await asyncio.get_running_loop().run_in_executor(
+                None, parse_body, BytesIO(data), format, self.csv_engine, columns, dtypes)
+            counters.update(objects=1, bytes_in=len(data), rows_out=len(df))
+        return df
+
+    async def write_df_to_s3(self, df: pd.DataFrame, key: str, format: str):
+        """
+        Uploading a data file to a s3 bucket.
+        Currently supports .csv & .parquet, always as a single put request
+
+        :params df: dataframe to be uploaded
+        :params key: name of file to be uploaded
+        :params format: format of file to be uploaded (csv or parquet)
+        """
+        if df.empty:
+            self._logger.info("Dataframe is empty. No files will be written to s3")
+            return True
+        if format == S3FileTypes.CSV.value:
+            out_buffer = StringIO()
+            df.to_csv(out_buffer, index=False)
+        elif format == S3FileTypes.PARQUET.value:
+            out_buffer = BytesIO()
+            df.to_parquet(out_buffer, index=False)
+        else:
+            self._logger.info("File format does not exist. No files will be writen to s3")
+            raise WrongFormatException
+        body = out_buffer.getvalue()
+        body = body.encode(DataParams.CSV_ENCODING.value) if isinstance(body, str) else body
+        with run_metrics.call('s3.write_df_to_s3') as counters:
+            async with self._semaphore:
+                await self.client.put_object(Bucket=self.bucket, Key=key, Body=body)
+            counters.update(objects=1, rows_in=len(df), bytes_out=len(body))
+        return True
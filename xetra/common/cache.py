@@ -0,0 +1,83 @@
+"""
+Local on-disk cache of parsed s3 objects
+"""
+import os
+import hashlib
+import logging
+import threading
+import pandas as pd
+
+
+class LocalObjectCache():
+    """
+    Stores parsed s3 objects as parquet files on local disk. Entries are keyed by
+    bucket, key and ETag of the object, a changed object therefore never hits a stale
+    entry. The total size is capped, least recently used entries are evicted first.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """
+        Constructor for LocalObjectCache
+
+        :param cache_dir: directory of the cache files, created if missing
+        :param max_bytes: maximum total size of the cache files in bytes
+        """
+        self._logger = logging.getLogger(__name__)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, bucket: str, key: str, etag: str, variant: str):
+        """
+        Returns the cache file path of an object
+
+        :param variant: description of the parse options, the same object parsed
+                        with different columns or dtypes is cached separately
+        """
+        digest = hashlib.sha256('\0'.join([bucket, key, etag, variant]).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f'{digest}.parquet')
+
+    def get(self, bucket: str, key: str, etag: str, variant: str):
+        """
+        Returns the cached dataframe of an object, None on a cache miss
+        """
+        path = self._path(bucket, key, etag, variant)
+        try:
+            df = pd.read_parquet(path)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        self._logger.info('Cache hit for %s/%s', bucket, key)
+        return df
+
+    def put(self, bucket: str, key: str, etag: str, variant: str, df: pd.DataFrame):
+        """
+        Adds the dataframe of an object to the cache and evicts
+        least recently used entries above the size cap
+        """
+        path = self._path(bucket, key, etag, variant)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        """
+        Removes the least recently used cache files until the cache fits max_bytes
+        """
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.parquet'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
@@ -13,6 +13,14 @@ class S3FileTypes(Enum):
     PARQUET = 'parquet'
 
 
+class CsvEngines(Enum):
+    """
+    Supported csv parser backends for s3 bucket connector
+    """
+    PANDAS = 'pandas'
+    PYARROW = 'pyarrow'
+
+
 class MetaProcessFormat(Enum):
     """
     Supported filetypes for s3 bucket connector
@@ -24,6 +32,49 @@ class MetaProcessFormat(Enum):
     META_FILE_FORMAT = 'csv'
     META_FILE_NAME = 'meta_file.csv'
     META_DATE_DELTA = 1
+    META_WRITE_ATTEMPTS = 3
+    META_MARKER_PREFIX = 'meta/source_data='
+    META_SOURCE_RECORD_FILE_NAME = 'meta_source_objects.csv'
+    META_SOURCE_KEY_COLUMN = 'source_key'
+    META_SOURCE_ETAG_COLUMN = 'etag'
+    META_SOURCE_SIZE_COLUMN = 'size'
+
+
+class BackfillFormat(Enum):
+    """
+    Layout of the coordination objects of a backfill on the target bucket
+    """
+    BACKFILL_PREFIX = 'backfill/'
+    BACKFILL_CLAIM_PREFIX = 'claim/'
+    BACKFILL_DONE_PREFIX = 'done/'
+    BACKFILL_COMMIT_KEY = 'commit'
+    BACKFILL_CLAIM_TIMEOUT = 3600
+
+
+class CheckpointFormat(Enum):
+    """
+    Layout of the daily checkpoints in the staging prefix of the target bucket
+    """
+    CHECKPOINT_AGGREGATE_SUFFIX = '.parquet'
+    CHECKPOINT_MANIFEST_SUFFIX = '.manifest.csv'
+    CHECKPOINT_LOOKBACK_SUFFIX = '.lookback'
+    CHECKPOINT_SOURCE_KEY_COLUMN = 'source_key'
+
+
+class MetaStores(Enum):
+    """
+    Supported layouts of the meta information on the s3 bucket
+    """
+    CSV = 'csv'
+    MARKER = 'marker'
+
+
+class TransformBackends(Enum):
+    """
+    Supported execution backends of the report transformations
+    """
+    PANDAS = 'pandas'
+    POLARS = 'polars'
 
 
 class DataParams(Enum):
@@ -32,3 +83,10 @@ class DataParams(Enum):
     """
     CSV_SEPARATOR = ','
     CSV_ENCODING = 'utf-8'
+    STREAM_BUFFER_SIZE = 8 * 1024 * 1024
+    CACHE_MAX_BYTES = 10 * 1024 * 1024 * 1024
+    MULTIPART_MIN_PART_SIZE = 5 * 1024 * 1024
+    MULTIPART_CONCURRENCY = 4
+    ASYNC_MAX_IN_FLIGHT = 256
+    SHARED_MEMORY_DIR = '/dev/shm'
+    PARQUET_ROW_GROUP_SIZE = 100000
@@ -36,3 +36,12 @@ class WrongMetaFile(Exception):
 
     Exception for wrong meta file being read in
     """
+
+
+class UnknownReport(Exception):
+    """
+    UnknownReport Class
+
+    Exception for a report transform that has
+    neither been registered nor can be imported
+    """
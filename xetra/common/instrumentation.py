@@ -0,0 +1,213 @@
+"""
+Timing & memory instrumentation of the pipeline stages and s3 calls
+"""
+import os
+import json
+import functools
+import time
+import logging
+import resource
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    from prometheus_client import CollectorRegistry, Gauge, write_to_textfile
+except ImportError:
+    CollectorRegistry = None
+
+COUNTERS = ['calls', 'wall_time_s', 'bytes_in', 'bytes_out', 'objects', 'rows_in', 'rows_out']
+
+
+def _read_peak_rss():
+    """
+    Returns the peak resident set size of the process in bytes. On linux this is the
+    peak since the last _reset_peak_rss, elsewhere the peak since the process started.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _reset_peak_rss():
+    """
+    Resets the peak resident set size of the process to the current one (linux only)
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+class RunMetrics():
+    """
+    Collects wall time, bytes transferred, object counts, rows in/out and
+    peak RSS per stage of a pipeline run.
+
+    Stages (stage()) are entered by the thread driving the pipeline and may be nested,
+    the peak RSS of a stage includes its nested stages. Calls (call() & add()) may be
+    recorded from any thread, e.g. s3 requests of a thread pool, their wall time is the
+    sum over all calls.
+    """
+
+    def __init__(self):
+        """
+        Constructor for RunMetrics
+        """
+        self._logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._stack = []
+        self.reset()
+
+    def reset(self):
+        """
+        Discards all recorded metrics, e.g. at the start of a run
+        """
+        with self._lock:
+            self.started = datetime.now()
+            self._start = time.perf_counter()
+            self.stages = {}
+            self._stack = []
+
+    def _stage(self, name: str):
+        if name not in self.stages:
+            self.stages[name] = dict.fromkeys(COUNTERS, 0)
+        return self.stages[name]
+
+    def add(self, name: str, **counters):
+        """
+        Adds to the counters of a stage or call, e.g. add('extract', rows_out=len(df))
+
+        @params name: name of the stage or call
+        @params counters: values to be added, keys from COUNTERS
+        """
+        with self._lock:
+            stage = self._stage(name)
+            for counter, value in counters.items():
+                stage[counter] += value
+
+    @contextmanager
+    def call(self, name: str):
+        """
+        Context manager measuring the wall time of a call, thread safe.
+        Yields a dictionary, counters set in it are added when the call ends:
+
+            with run_metrics.call('s3.list_files_in_prefix') as counters:
+                counters['objects'] = len(files)
+
+        @params name: name of the call, e.g. 's3.read_s3_to_df'
+        """
+        counters = {}
+        start = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            self.add(name, calls=1, wall_time_s=time.perf_counter() - start, **counters)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Context manager measuring the wall time & peak RSS of a pipeline stage,
+        yields a dictionary of counters like call
+
+        @params name: name of the stage, e.g. 'extract'
+        """
+        if self._stack:
+            # the peak of the enclosing stage so far, the counter is reset for this stage
+            self._stack[-1][1] = max(self._stack[-1][1], _read_peak_rss())
+        _reset_peak_rss()
+        self._stack.append([name, 0])
+        try:
+            with self.call(name) as counters:
+                yield counters
+        finally:
+            _, peak = self._stack.pop()
+            peak = max(peak, _read_peak_rss())
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            with self._lock:
+                stage = self._stage(name)
+                stage['peak_rss_bytes'] = max(stage.get('peak_rss_bytes', 0), peak)
+
+    def staged(self, name: str):
+        """
+        Decorator running every call of the decorated function as stage
+
+        @params name: name of the stage
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """
+        Returns the run summary as json serializable dictionary
+        """
+        with self._lock:
+            return {'started': self.started.isoformat(timespec='seconds'),
+                    'wall_time_s': round(time.perf_counter() - self._start, 6),
+                    'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                    'stages': {name: {counter: round(value, 6) if isinstance(value, float) else value
+                                      for counter, value in stage.items()}
+                               for name, stage in self.stages.items()}}
+
+    def write_json(self, path: str = None):
+        """
+        Emits the run summary as json, logged and written to path if given
+
+        @params path: optional file the summary is written to
+        returns:
+        the summary as json string
+        """
+        summary = json.dumps(self.summary(), indent=2)
+        self._logger.info('Run summary: %s', summary)
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'w') as summary_file:
+                summary_file.write(summary)
+        return summary
+
+    def to_prometheus(self, registry=None):
+        """
+        Exposes the run summary as prometheus gauges xetra_stage_<counter>{stage="..."}
+
+        @params registry: prometheus_client CollectorRegistry, a new one if None
+        returns:
+        the registry
+        """
+        if CollectorRegistry is None:
+            raise ImportError('Prometheus metrics require prometheus_client, pip install prometheus_client')
+        registry = CollectorRegistry() if registry is None else registry
+        summary = self.summary()
+        for counter in COUNTERS + ['peak_rss_bytes']:
+            gauge = Gauge(f'xetra_stage_{counter}', f'{counter} per stage of the last xetra run',
+                          ['stage'], registry=registry)
+            for name, stage in summary['stages'].items():
+                if counter in stage:
+                    gauge.labels(stage=name).set(stage[counter])
+        Gauge('xetra_run_wall_time_s', 'wall time of the last xetra run', registry=registry)\
+            .set(summary['wall_time_s'])
+        return registry
+
+    def write_prometheus(self, path: str):
+        """
+        Writes the run summary in the prometheus text format, e.g. for the
+        textfile collector of the node exporter
+
+        @params path: file the metrics are written to
+        """
+        write_to_textfile(path, self.to_prometheus())
+
+
+# metrics of the current run, recorded by the connectors, MetaProcess & XetraETL
+run_metrics = RunMetrics()
@@ -3,19 +3,31 @@ Helper class to update meta-file and extract information from meta-file
 """
 import logging
 import pandas as pd
-from datetime import datetime, timedelta
-from xetra.common.constants import MetaProcessFormat
+from datetime import datetime
+from xetra.common.constants import MetaProcessFormat, MetaStores
 from xetra.common.s3 import S3BucketConnector
-from xetra.common.custom_exceptions import BadDateRange, WrongMetaFile
+from xetra.common.trading_calendar import TradingCalendar
+from xetra.common.instrumentation import run_metrics
+from xetra.common.custom_exceptions import BadDateRange, WrongFormatException, WrongMetaFile
 
 
 class MetaProcess():
 
     """
     Helper class to update meta-file and extract information from meta-file
+
+    @params meta_store: layout of the meta information on the bucket,
+                        'csv' for a single meta file or 'marker' for one marker object per date
+    @params trading_days_only: only process Xetra trading days, weekends & exchange holidays are skipped
     """
-    def __init__(self):
+    def __init__(self, meta_store: str = MetaStores.CSV.value, trading_days_only: bool = False):
         self._logger = logging.getLogger(__name__)
+        if meta_store not in [store.value for store in MetaStores]:
+            raise WrongFormatException(f'Unsupported meta store {meta_store}')
+        self.meta_store = meta_store
+        self.calendar = TradingCalendar(trading_days_only)
+        # (bucket, file) -> (dataframe, ETag) of the meta files read, or the NoSuchKey error
+        self._meta_cache = {}
 
     def dt2str(self, arg_date):
         """
@@ -32,28 +44,40 @@ class MetaProcess():
 
         @params arg_date: Desired first date of the list with format "%YYYY-%M-%D"
         """
-        min_date = (datetime.strptime(arg_date,
-                    MetaProcessFormat.META_DATE_FORMAT.value).date() -
-                    timedelta(days=MetaProcessFormat.META_DATE_DELTA.value))
-        today_date = datetime.today().date()
-        if today_date - min_date <= timedelta(days=0):
+        return list(self._date_range(arg_date).date)
+
+    def _date_range(self, arg_date):
+        """
+        Dates of the calendar from the date before the argument date till today, as DatetimeIndex
+
+        @params arg_date: Desired first date of the range with format "%YYYY-%M-%D"
+        """
+        if datetime.strptime(arg_date, MetaProcessFormat.META_DATE_FORMAT.value).date() > datetime.today().date():
             self._logger.info("Argument date must be less than todays date")
             raise BadDateRange
-        else:
-            date_list = [(min_date + timedelta(days=x))
-                         for x in range(0, (today_date - min_date).days + 1)]
-        return date_list
+        return self.calendar.date_range(arg_date, datetime.today().date())
 
     def read_meta_csv(self, s3_bucket_meta: S3BucketConnector, file: str, format: str):
         """
-        Reads a csv file from the s3 bucket instance
+        Reads a csv file from the s3 bucket instance. The file is downloaded once per
+        MetaProcess instance, later calls (and a missing file) are served from memory.
 
         @params s3_bucket_meta: S3BucketConnector object, initialized
         @params file: file to be read
         """
-        self._logger.info('Reading file %s/%s/%s', s3_bucket_meta.endpoint_url,
-                          s3_bucket_meta._bucket.name, file)
-        df_meta = s3_bucket_meta.read_s3_to_df(file, format)
+        cache_key = (s3_bucket_meta._bucket.name, file)
+        if cache_key not in self._meta_cache:
+            self._logger.info('Reading file %s/%s/%s', s3_bucket_meta.endpoint_url,
+                              s3_bucket_meta._bucket.name, file)
+            try:
+                df_meta, etag = s3_bucket_meta.read_s3_to_df_with_etag(file, format)
+            except s3_bucket_meta.exceptions.NoSuchKey as error:
+                self._meta_cache[cache_key] = error
+                raise
+            self._meta_cache[cache_key] = (df_meta, etag)
+        if isinstance(self._meta_cache[cache_key], Exception):
+            raise self._meta_cache[cache_key]
+        df_meta, _ = self._meta_cache[cache_key]
         try:
             set_meta = set(pd.to_datetime(
                            df_meta[MetaProcessFormat.META_SOURCE_DATE_COLUMN.value]).dt.date)
@@ -62,6 +86,56 @@ class MetaProcess():
             self._logger.info('Metafile might be corrupted or does not exist')
         return df_meta, set_meta
 
+    def read_meta_markers(self, s3_bucket_meta: S3BucketConnector, start_after: str):
+        """
+        Returns the processed dates recorded as marker objects. The markers sort by date,
+        only the range after start_after is listed.
+
+        @params s3_bucket_meta: S3BucketConnector object, initialized
+        @params start_after: date with format "%YYYY-%M-%D", only later dates are returned
+        """
+        prefix = MetaProcessFormat.META_MARKER_PREFIX.value
+        keys = s3_bucket_meta.list_files_in_prefix(prefix, start_after=prefix + start_after)
+        return set(datetime.strptime(key[len(prefix):], MetaProcessFormat.META_DATE_FORMAT.value).date()
+                   for key in keys)
+
+    def update_meta_markers(self, s3_bucket_meta: S3BucketConnector, extract_date_list: list):
+        """
+        Records the processed dates as one marker object per date, holding the time of processing.
+        Only the markers of the new dates are written.
+
+        @params s3_bucket_meta: S3BucketConnector object, initialized
+        @params extract_date_list: list of dates to be recorded
+        """
+        processing_time = datetime.today().strftime(MetaProcessFormat.META_PROCESS_DATE_FORMAT.value)
+        for date in extract_date_list:
+            s3_bucket_meta.write_bytes_to_s3(processing_time.encode(),
+                                             MetaProcessFormat.META_MARKER_PREFIX.value + date)
+        return True
+
+    def unrecorded_dates(self, s3_bucket_meta: S3BucketConnector, date_list: list):
+        """
+        Returns the dates of date_list not recorded as processed. The meta information
+        is read from the bucket again, it may have been updated by another run.
+
+        @params s3_bucket_meta: S3BucketConnector object, initialized
+        @params date_list: list of dates with format "%YYYY-%M-%D"
+        """
+        if not date_list:
+            return []
+        if self.meta_store == MetaStores.MARKER.value:
+            src_dates = self.read_meta_markers(s3_bucket_meta, '')
+        else:
+            self._meta_cache.pop((s3_bucket_meta._bucket.name, MetaProcessFormat.META_FILE_NAME.value), None)
+            try:
+                _, src_dates = self.read_meta_csv(s3_bucket_meta, MetaProcessFormat.META_FILE_NAME.value,
+                                                  MetaProcessFormat.META_FILE_FORMAT.value)
+            except s3_bucket_meta.exceptions.NoSuchKey:
+                src_dates = set()
+        return [date for date in date_list
+                if datetime.strptime(date, MetaProcessFormat.META_DATE_FORMAT.value).date() not in src_dates]
+
+    @run_metrics.staged('meta.update_meta_file')
     def update_meta_file(self, s3_bucket_meta: S3BucketConnector,
                          extract_date_list: list):
         """
@@ -70,47 +144,143 @@ class MetaProcess():
         @params s3_bucket_meta: S3BucketConnector object, initialized
         @params extract_date_list: list of dates to be updated in the meta file
         """
+        if self.meta_store == MetaStores.MARKER.value:
+            return self.update_meta_markers(s3_bucket_meta, extract_date_list)
         df_new = pd.DataFrame(columns=[MetaProcessFormat.META_SOURCE_DATE_COLUMN.value,
                               MetaProcessFormat.META_PROCESS_COLUMN.value])
         df_new[MetaProcessFormat.META_SOURCE_DATE_COLUMN.value] = extract_date_list
         df_new[MetaProcessFormat.META_PROCESS_COLUMN.value] = \
             datetime.today().strftime(MetaProcessFormat.META_PROCESS_DATE_FORMAT.value)
+        return self._update_meta_csv(s3_bucket_meta, MetaProcessFormat.META_FILE_NAME.value,
+                                     lambda df_old: df_new if df_old is None else pd.concat([df_old, df_new]))
+
+    def _update_meta_csv(self, s3_bucket_meta: S3BucketConnector, file: str, update):
+        """
+        Read-modify-write of a meta csv file as conditional write: the write fails if the
+        file has been changed by another run since it was read, it is then read & updated again.
+
+        @params s3_bucket_meta: S3BucketConnector object, initialized
+        @params file: meta csv file to be updated
+        @params update: callable returning the new content from the current one (None if missing)
+        """
+        cache_key = (s3_bucket_meta._bucket.name, file)
+        for _ in range(MetaProcessFormat.META_WRITE_ATTEMPTS.value):
+            if isinstance(self._meta_cache.get(cache_key), tuple) and self._meta_cache[cache_key][1] is None:
+                # written by this instance before, the ETag of that write is unknown
+                del self._meta_cache[cache_key]
+            try:
+                df_old, _ = self.read_meta_csv(s3_bucket_meta, file, MetaProcessFormat.META_FILE_FORMAT.value)
+                self._logger.info('Updating meta file %s with %s rows', file, len(df_old))
+                df_all = update(df_old)
+                conditions = {'if_match': self._meta_cache[cache_key][1]}
+            except s3_bucket_meta.exceptions.NoSuchKey:
+                df_all = update(None)
+                conditions = {'if_none_match': '*'}
+            try:
+                s3_bucket_meta.write_df_to_s3(df_all, file, MetaProcessFormat.META_FILE_FORMAT.value, **conditions)
+            except s3_bucket_meta.exceptions.ClientError as error:
+                if error.response['Error']['Code'] not in ['PreconditionFailed', 'ConditionalRequestConflict']:
+                    raise
+                self._logger.info('Meta file %s has been changed concurrently, reading it again', file)
+                del self._meta_cache[cache_key]
+                conflict = error
+                continue
+            self._meta_cache[cache_key] = (df_all, None)
+            return True
+        raise conflict
+
+    def list_source_objects(self, s3_bucket_source: S3BucketConnector, first_date: str):
+        """
+        Lists key, ETag & size of all source objects from first_date on in a single listing,
+        the source keys start with their date
+
+        @params s3_bucket_source: S3BucketConnector of the source bucket
+        @params first_date: first date with format "%YYYY-%M-%D"
+        returns:
+        dataframe with the columns of the source record
+        """
+        objects = s3_bucket_source.list_objects_with_meta('', start_after=first_date)
+        df = pd.DataFrame(objects, columns=[MetaProcessFormat.META_SOURCE_KEY_COLUMN.value,
+                                            MetaProcessFormat.META_SOURCE_ETAG_COLUMN.value,
+                                            MetaProcessFormat.META_SOURCE_SIZE_COLUMN.value])
+        df.insert(0, MetaProcessFormat.META_SOURCE_DATE_COLUMN.value,
+                  df[MetaProcessFormat.META_SOURCE_KEY_COLUMN.value].str.split('/').str[0])
+        return df
+
+    def read_source_record(self, s3_bucket_meta: S3BucketConnector):
+        """
+        Reads the record of the source objects consumed by previous runs,
+        an empty record if none has been written yet
+
+        @params s3_bucket_meta: S3BucketConnector object, initialized
+        """
         try:
-            df_old, set_meta = self.read_meta_csv(s3_bucket_meta,
-                                                  MetaProcessFormat.META_FILE_NAME.value,
-                                                  MetaProcessFormat.META_FILE_FORMAT.value)
-            self._logger.info(df_old)
-            df_all = pd.concat([df_old, df_new])
-        except s3_bucket_meta.session.client('s3').exceptions.NoSuchKey:
-            df_all = df_new
-        s3_bucket_meta.write_df_to_s3(df_all,
-                                      MetaProcessFormat.META_FILE_NAME.value,
-                                      MetaProcessFormat.META_FILE_FORMAT.value)
-        return True
+            df_record, _ = self.read_meta_csv(s3_bucket_meta, MetaProcessFormat.META_SOURCE_RECORD_FILE_NAME.value,
+                                              MetaProcessFormat.META_FILE_FORMAT.value)
+        except s3_bucket_meta.exceptions.NoSuchKey:
+            return pd.DataFrame(columns=[MetaProcessFormat.META_SOURCE_DATE_COLUMN.value,
+                                         MetaProcessFormat.META_SOURCE_KEY_COLUMN.value,
+                                         MetaProcessFormat.META_SOURCE_ETAG_COLUMN.value,
+                                         MetaProcessFormat.META_SOURCE_SIZE_COLUMN.value])
+        return df_record.astype({MetaProcessFormat.META_SOURCE_DATE_COLUMN.value: str})
+
+    def changed_dates(self, df_listing: pd.DataFrame, df_record: pd.DataFrame):
+        """
+        Diffs the current listing of the source objects against the record. A recorded date
+        has changed if one of its objects has been added, removed, or has another ETag or size.
+
+        @params df_listing: current source objects (list_source_objects)
+        @params df_record: recorded source objects (read_source_record)
+        returns:
+        sorted list of changed dates
+        """
+        date_col = MetaProcessFormat.META_SOURCE_DATE_COLUMN.value
+        df_listing = df_listing[df_listing[date_col].isin(df_record[date_col])]
+        df = df_listing.merge(df_record, how='outer', indicator=True,
+                              on=[date_col, MetaProcessFormat.META_SOURCE_KEY_COLUMN.value,
+                                  MetaProcessFormat.META_SOURCE_ETAG_COLUMN.value,
+                                  MetaProcessFormat.META_SOURCE_SIZE_COLUMN.value])
+        return sorted(df.loc[df['_merge'] != 'both', date_col].unique())
+
+    def update_source_record(self, s3_bucket_meta: S3BucketConnector, df_objects: pd.DataFrame):
+        """
+        Replaces the recorded source objects of the dates in df_objects
+
+        @params s3_bucket_meta: S3BucketConnector object, initialized
+        @params df_objects: source objects consumed, columns of the source record
+        """
+        date_col = MetaProcessFormat.META_SOURCE_DATE_COLUMN.value
+
+        def update(df_old):
+            if df_old is None:
+                return df_objects
+            df_old = df_old[~df_old[date_col].astype(str).isin(df_objects[date_col])]
+            return pd.concat([df_old, df_objects]).sort_values(
+                by=[date_col, MetaProcessFormat.META_SOURCE_KEY_COLUMN.value])
+        return self._update_meta_csv(s3_bucket_meta, MetaProcessFormat.META_SOURCE_RECORD_FILE_NAME.value, update)
 
+    @run_metrics.staged('meta.return_date_list')
     def return_date_list(self, s3_bucket_meta: S3BucketConnector, arg_date: str):
         """
-        Returns a list of files to be processed. This happens in 4 steps:
-            1. Comprehensive List: Generate a list of dates from the argument input date till today
-            2. Metafile List: Read in metafile, generate a list of dates already processed.
-            3. Pruned List: Prune the Comprehensive list by calculating intersection of 2 lists (sets)
-            4. Find the earliest date in the Pruned list, return all dates since this date as a list.
+        Returns a list of dates to be processed. The processed dates are read from the metafile
+        (or the markers) and compared to the calendar from the date before the argument date till
+        today in a single pass, all dates from the date before the first unprocessed date on are returned.
 
         @params s3_bucket_meta: S3BucketConnector object, initialized
         @params arg_date: Desired first date of the list.
+        returns:
+        tuple of (arg_date, list of dates with format "%YYYY-%M-%D"), the list is empty if all dates are processed
         """
-        full_date_list = self.calculate_datelist(arg_date)
+        dates = self._date_range(arg_date)
         try:
-            df_meta, src_dates = self.read_meta_csv(s3_bucket_meta,
-                                                    MetaProcessFormat.META_FILE_NAME.value,
-                                                    MetaProcessFormat.META_FILE_FORMAT.value)
-            dates_missing = set(full_date_list[1:]) - src_dates
-            if dates_missing:
-                min_date_pruned = min(set(full_date_list[1:]) - src_dates)
-                date_list = self.calculate_datelist(self.dt2str(min_date_pruned))
-        except s3_bucket_meta.session.client('s3').exceptions.NoSuchKey:
-            date_list = full_date_list
-            min_date_pruned = arg_date
-        min_date_pruned = str(arg_date)
-        date_list = [self.dt2str(date) for date in date_list]
-        return min_date_pruned, date_list
+            if self.meta_store == MetaStores.MARKER.value:
+                src_dates = self.read_meta_markers(s3_bucket_meta, self.dt2str(dates[0]))
+            else:
+                df_meta, src_dates = self.read_meta_csv(s3_bucket_meta,
+                                                        MetaProcessFormat.META_FILE_NAME.value,
+                                                        MetaProcessFormat.META_FILE_FORMAT.value)
+        except s3_bucket_meta.exceptions.NoSuchKey:
+            src_dates = set()
+        date_list, gaps = self.calendar.processing_dates(dates, src_dates)
+        self._logger.info('%s dates not processed yet since %s', len(gaps), arg_date)
+        return str(arg_date), date_list
@@ -4,19 +4,297 @@ Connector & Methods accessing S3
 
 import os
 import logging
+import threading
 import boto3
 import pandas as pd
-from io import StringIO, BytesIO
-from xetra.common.constants import DataParams, S3FileTypes
+import pyarrow as pa
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+from pyarrow import csv as pa_csv
+from pyarrow import parquet as pq
+from io import BufferedReader, RawIOBase, SEEK_CUR, SEEK_END, SEEK_SET, StringIO, BytesIO
+from xetra.common.constants import CsvEngines, DataParams, S3FileTypes
+from xetra.common.cache import LocalObjectCache
+from xetra.common.instrumentation import run_metrics
 from xetra.common.custom_exceptions import WrongFormatException
 
 
+class S3ObjectReader(RawIOBase):
+    """
+    Read-only, seekable file object of an object on a s3 bucket.
+    Every read fetches only the requested byte range.
+    """
+
+    def __init__(self, s3_object):
+        """
+        Constructor for S3ObjectReader
+
+        :param s3_object: boto3 s3 Object resource
+        """
+        self._object = s3_object
+        self._size = s3_object.content_length
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset: int, whence: int = SEEK_SET):
+        if whence == SEEK_CUR:
+            offset += self._position
+        elif whence == SEEK_END:
+            offset += self._size
+        self._position = max(0, offset)
+        return self._position
+
+    def readinto(self, buffer):
+        if self._position >= self._size or not len(buffer):
+            return 0
+        end = min(self._position + len(buffer), self._size) - 1
+        data = self._object.get(Range=f'bytes={self._position}-{end}').get('Body').read()
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def buffered(self):
+        """
+        Returns the reader wrapped in a buffer of DataParams.STREAM_BUFFER_SIZE bytes
+        """
+        return BufferedReader(self, buffer_size=DataParams.STREAM_BUFFER_SIZE.value)
+
+
+class S3MultipartWriter(RawIOBase):
+    """
+    Write-only file object uploading to a s3 object via a multipart upload.
+    Every part_size bytes written are sent as one part in a bounded thread pool,
+    at most max_concurrency parts are buffered or in flight at any time.
+    Files smaller than one part are sent with a single put request.
+    """
+
+    def __init__(self, s3_object, part_size: int, max_concurrency: int):
+        """
+        Constructor for S3MultipartWriter
+
+        :param s3_object: boto3 s3 Object resource
+        :param part_size: size of every part but the last in bytes
+        :param max_concurrency: number of parts uploaded concurrently
+        """
+        self._object = s3_object
+        self._part_size = part_size
+        self._max_concurrency = max_concurrency
+        self._buffer = bytearray()
+        self._upload = None
+        self._executor = None
+        self._futures = []
+        self.bytes_written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self._part_size:
+            self._upload_part(bytes(self._buffer[:self._part_size]))
+            del self._buffer[:self._part_size]
+        return len(data)
+
+    def _upload_part(self, data: bytes):
+        """
+        Submits the next part, waits for the oldest running part if max_concurrency is reached
+        """
+        if self._upload is None:
+            self._upload = self._object.initiate_multipart_upload()
+            self._executor = ThreadPoolExecutor(max_workers=self._max_concurrency)
+        running = [future for future in self._futures if not future.done()]
+        if len(running) >= self._max_concurrency:
+            running[0].result()
+        part_number = len(self._futures) + 1
+        self._futures.append(self._executor.submit(self._upload.Part(part_number).upload, Body=data))
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._upload is None:
+                self._object.put(Body=bytes(self._buffer))
+            else:
+                if self._buffer:
+                    self._upload_part(bytes(self._buffer))
+                parts = [{'PartNumber': number, 'ETag': future.result()['ETag']}
+                         for number, future in enumerate(self._futures, start=1)]
+                self._upload.complete(MultipartUpload={'Parts': parts})
+        except Exception:
+            self.abort()
+            raise
+        self._release()
+
+    def abort(self):
+        """
+        Aborts the upload, already uploaded parts are discarded by s3
+        """
+        if self.closed:
+            return
+        try:
+            if self._upload is not None:
+                for future in self._futures:
+                    future.exception()
+                self._upload.abort()
+        finally:
+            self._release()
+
+    def _release(self):
+        self._buffer = bytearray()
+        if self._executor is not None:
+            self._executor.shutdown()
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # an incomplete file must never become visible on s3
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def parse_body(body, format: str, csv_engine: str = CsvEngines.PANDAS.value, columns: list = None,
+               dtypes: dict = None):
+    """
+    Parses the body of a s3 object to a pandas dataframe
+
+    :params body: botocore StreamingBody of the object, or any other binary file object
+    :params format: format of the object (csv or parquet)
+    :params csv_engine: parser backend for csv files, pandas or pyarrow
+    :params columns: optional list of columns to be parsed, all others are skipped
+    :params dtypes: optional mapping of column to dtype, e.g. {'ISIN': 'category'}
+    returns:
+    pandas dataframe of the object
+    """
+    if format == S3FileTypes.CSV.value and csv_engine == CsvEngines.PYARROW.value:
+        df = parse_csv_pyarrow(body.read(), columns, dtypes)
+    elif format == S3FileTypes.CSV.value:
+        # the pandas parser consumes the http stream directly, the body is never held in full
+        df = pd.read_csv(body, delimiter=DataParams.CSV_SEPARATOR.value,
+                         encoding=DataParams.CSV_ENCODING.value, usecols=columns, dtype=dtypes)
+    else:
+        data = BytesIO(body.read())
+        df = pd.read_parquet(data, columns=columns)
+        if dtypes:
+            df = df.astype(dtypes)
+    return df
+
+
+def parse_csv_pyarrow(data: bytes, columns: list = None, dtypes: dict = None):
+    """
+    Parses csv bytes with the multi-threaded pyarrow csv reader, without decoding
+    them to a python string first. Values are interpreted like the pandas parser does:
+    pyarrow would infer date & time columns, these are kept as strings instead.
+
+    :params data: raw csv bytes
+    :params columns: optional list of columns to be parsed, all others are skipped
+    :params dtypes: optional mapping of column to dtype, e.g. {'ISIN': 'category'}
+    returns:
+    pandas dataframe of the csv
+    """
+    buffer = pa.py_buffer(data)
+    parse_options = pa_csv.ParseOptions(delimiter=DataParams.CSV_SEPARATOR.value)
+    read_options = pa_csv.ReadOptions(encoding=DataParams.CSV_ENCODING.value)
+    schema = pa_csv.open_csv(pa.BufferReader(buffer), read_options=read_options,
+                             parse_options=parse_options).schema
+    column_types = {field.name: pa.string() for field in schema if pa.types.is_temporal(field.type)}
+    arrow_types = {'category': pa.dictionary(pa.int32(), pa.string()), 'float32': pa.float32()}
+    dtypes = dtypes or {}
+    column_types.update({col: arrow_types[dtype] for col, dtype in dtypes.items() if dtype in arrow_types})
+    if columns is not None:
+        columns = [name for name in schema.names if name in columns]
+    # empty fields are missing values, as with pandas
+    convert_options = pa_csv.ConvertOptions(include_columns=columns, column_types=column_types,
+                                            strings_can_be_null=True, quoted_strings_can_be_null=True)
+    df = pa_csv.read_csv(pa.BufferReader(buffer), read_options=read_options, parse_options=parse_options,
+                         convert_options=convert_options).to_pandas()
+    remaining = {col: dtype for col, dtype in dtypes.items() if dtype not in arrow_types and col in df}
+    return df.astype(remaining) if remaining else df
+
+
+class S3ClientConfig(NamedTuple):
+    """
+    Class for the botocore configuration of the s3 clients
+
+    max_pool_connections: size of the http connection pool, should cover the number of threads
+    retry_mode: botocore retry mode, 'legacy', 'standard' or 'adaptive'
+    max_attempts: maximum number of attempts of a request, including the first one
+    connect_timeout: timeout in seconds for establishing a connection
+    read_timeout: timeout in seconds for reading from a connection
+    tcp_keepalive: send tcp keepalive packets on idle pooled connections
+    """
+    max_pool_connections: int = 50
+    retry_mode: str = 'adaptive'
+    max_attempts: int = 5
+    connect_timeout: float = 10
+    read_timeout: float = 60
+    tcp_keepalive: bool = True
+
+
+_shared_resources = {}
+_shared_resources_lock = threading.Lock()
+
+
+def shared_s3_resource(access_key_id: str, secret_access_key: str, endpoint_url: str,
+                       client_config: S3ClientConfig):
+    """
+    Returns the boto3 session and s3 resource for the credentials, endpoint and client configuration.
+    The session, client and connection pool are created once per process and shared
+    by all connectors with the same arguments.
+
+    :param access_key_id: aws access key id
+    :param secret_access_key: aws secret access key
+    :param endpoint_url: endpoint url to s3
+    :param client_config: configuration of the client
+    """
+    resource_key = (access_key_id, secret_access_key, endpoint_url, client_config)
+    with _shared_resources_lock:
+        if resource_key not in _shared_resources:
+            session = boto3.Session(aws_access_key_id=access_key_id,
+                                    aws_secret_access_key=secret_access_key)
+            config = Config(max_pool_connections=client_config.max_pool_connections,
+                            retries={'mode': client_config.retry_mode,
+                                     'total_max_attempts': client_config.max_attempts},
+                            connect_timeout=client_config.connect_timeout,
+                            read_timeout=client_config.read_timeout,
+                            tcp_keepalive=client_config.tcp_keepalive)
+            _shared_resources[resource_key] = (session, session.resource(service_name='s3',
+                                                                         endpoint_url=endpoint_url,
+                                                                         config=config))
+        return _shared_resources[resource_key]
+
+
+def clear_shared_resources():
+    """
+    Drops the shared sessions & s3 resources of the process. To be called in a forked
+    child process, the sessions & connection pools inherited from the parent are not
+    safe to be used by both processes.
+    """
+    with _shared_resources_lock:
+        _shared_resources.clear()
+
+
 class S3BucketConnector():
     """
     Class to interact with S3 Buckets
     """
 
-    def __init__(self, bucket: str, secret_key: str, access_key: str, endpoint_url: str):
+    def __init__(self, bucket: str, secret_key: str, access_key: str, endpoint_url: str,
+                 csv_engine: str = CsvEngines.PANDAS.value, cache_dir: str = None,
+                 cache_max_bytes: int = DataParams.CACHE_MAX_BYTES.value,
+                 multipart_part_size: int = None,
+                 multipart_concurrency: int = DataParams.MULTIPART_CONCURRENCY.value,
+                 client_config: S3ClientConfig = S3ClientConfig()):
         """
         Constructor for S3BucketConnectorClass
 
@@ -24,45 +302,143 @@ class S3BucketConnector():
         :param secret_key: secret key for accessing aws s3
         :param access_key: access key for accessing aws s3
         :param endpoint_url: endpoint url to s3
+        :param csv_engine: parser backend for csv files, pandas or pyarrow
+        :param cache_dir: optional local directory caching parsed objects by ETag
+        :param cache_max_bytes: size cap of the local cache in bytes
+        :param multipart_part_size: if given, parquet files are streamed to s3 in a multipart
+                                    upload with parts of this size (at least 5 MiB)
+        :param multipart_concurrency: number of parts uploaded concurrently
+        :param client_config: connection pool, retry and timeout settings of the client,
+                              connectors with equal credentials, endpoint and client_config
+                              share one session and connection pool
         """
         self._logger = logging.getLogger(__name__)
+        if csv_engine not in [engine.value for engine in CsvEngines]:
+            raise WrongFormatException(f'Unsupported csv engine {csv_engine}')
         self.endpoint_url = endpoint_url
-        self.session = boto3.Session(aws_access_key_id=os.environ[access_key],
-                                     aws_secret_access_key=os.environ[secret_key])
-        self._s3 = self.session.resource(service_name='s3', endpoint_url=endpoint_url)
+        self.csv_engine = csv_engine
+        self.session, self._s3 = shared_s3_resource(os.environ[access_key], os.environ[secret_key],
+                                                    endpoint_url, client_config)
         self._bucket = self._s3.Bucket(bucket)
+        # low level client of the resource, shared by all connectors on the same endpoint
+        self.client = self._s3.meta.client
+        self.exceptions = self.client.exceptions
+        self._cache = LocalObjectCache(cache_dir, cache_max_bytes) if cache_dir else None
+        self.multipart_part_size = multipart_part_size
+        if multipart_part_size is not None:
+            self.multipart_part_size = max(multipart_part_size, DataParams.MULTIPART_MIN_PART_SIZE.value)
+        self.multipart_concurrency = multipart_concurrency
 
-    def list_files_in_prefix(self, prefix: str):
+    def list_files_in_prefix(self, prefix: str, start_after: str = None):
         """
         listing of files with a prefix on the s3 bucket
         :param prefix: prefix on the s3 bucket that should be filterd
+        :param start_after: optional key, only keys sorting after it are listed
         returns:
         all files with prefix key
         """
-        files = [obj.key for obj in self._bucket.objects.filter(Prefix=prefix)]
+        params = {'Prefix': prefix}
+        if start_after is not None:
+            params['Marker'] = start_after
+        with run_metrics.call('s3.list_files_in_prefix') as counters:
+            files = [obj.key for obj in self._bucket.objects.filter(**params)]
+            counters['objects'] = len(files)
         return files
 
-    def read_s3_to_df(self, key: str, format: str):
+    def list_objects_with_meta(self, prefix: str, start_after: str = None):
+        """
+        listing of files with a prefix on the s3 bucket, with their ETag & size
+        :param prefix: prefix on the s3 bucket that should be filterd
+        :param start_after: optional key, only keys sorting after it are listed
+        returns:
+        list of tuples (key, ETag, size in bytes)
+        """
+        params = {'Prefix': prefix}
+        if start_after is not None:
+            params['Marker'] = start_after
+        with run_metrics.call('s3.list_files_in_prefix') as counters:
+            objects = [(obj.key, obj.e_tag, obj.size) for obj in self._bucket.objects.filter(**params)]
+            counters['objects'] = len(objects)
+        return objects
+
+    def read_s3_to_df(self, key: str, format: str, columns: list = None, dtypes: dict = None,
+                      chunksize: int = None):
         """
         Reading a csv from s3 bucket and parsing it to a pandas dataframe
         :params key: Filename that is to be read to dataframe
+        :params format: format of the file (csv or parquet)
+        :params columns: optional list of columns to be parsed, all others are skipped
+        :params dtypes: optional mapping of column to dtype, e.g. {'ISIN': 'category'}
+        :params chunksize: if given, the file is streamed and an iterator of
+                           dataframes with at most chunksize rows is returned
         returns:
         pandas dataframe of the csv
         """
         self._logger.info('Reading file %s/%s/%s', self.endpoint_url, self._bucket.name, key)
-        if format == S3FileTypes.CSV.value:
-            csv_obj = self._bucket.Object(key=key).get().get('Body').read().decode(DataParams.CSV_ENCODING.value)
-            data = StringIO(csv_obj)
-            df = pd.read_csv(data, delimiter=DataParams.CSV_SEPARATOR.value)
-        elif format == S3FileTypes.PARQUET.value:
-            prq_obj = self._bucket.Object(key=key).get().get('Body').read()
-            data = BytesIO(prq_obj)
-            df = pd.read_parquet(data)
-        else:
+        if format not in [file_type.value for file_type in S3FileTypes]:
             raise WrongFormatException
+        if chunksize is not None:
+            return self._read_s3_chunks(key, format, columns, dtypes, chunksize)
+        with run_metrics.call('s3.read_s3_to_df') as counters:
+            s3_object = self._bucket.Object(key=key)
+            if self._cache is None:
+                response = s3_object.get()
+                df = parse_body(response.get('Body'), format, self.csv_engine, columns, dtypes)
+                counters.update(objects=1, bytes_in=response.get('ContentLength', 0), rows_out=len(df))
+                return df
+            # only the metadata is requested on a cache hit, the object itself is never downloaded
+            variant = repr((format, columns, dtypes, self.csv_engine))
+            df = self._cache.get(self._bucket.name, key, s3_object.e_tag, variant)
+            if df is None:
+                response = s3_object.get()
+                df = parse_body(response.get('Body'), format, self.csv_engine, columns, dtypes)
+                self._cache.put(self._bucket.name, key, response.get('ETag'), variant, df)
+                counters['bytes_in'] = response.get('ContentLength', 0)
+            counters.update(objects=1, rows_out=len(df))
         return df
 
-    def write_df_to_s3(self, df: pd.DataFrame, key: str, format: str):
+    def read_s3_to_df_with_etag(self, key: str, format: str, columns: list = None, dtypes: dict = None):
+        """
+        Reading a file from s3 bucket like read_s3_to_df, additionally returning its ETag,
+        e.g. for a later conditional write of the same key
+
+        returns:
+        tuple of (pandas dataframe, ETag of the object read)
+        """
+        self._logger.info('Reading file %s/%s/%s', self.endpoint_url, self._bucket.name, key)
+        if format not in [file_type.value for file_type in S3FileTypes]:
+            raise WrongFormatException
+        with run_metrics.call('s3.read_s3_to_df') as counters:
+            response = self._bucket.Object(key=key).get()
+            df = parse_body(response.get('Body'), format, self.csv_engine, columns, dtypes)
+            counters.update(objects=1, bytes_in=response.get('ContentLength', 0), rows_out=len(df))
+        return df, response.get('ETag')
+
+    def _read_s3_chunks(self, key: str, format: str, columns: list, dtypes: dict, chunksize: int):
+        """
+        Streams a file from the s3 bucket chunk by chunk. Csv files are parsed incrementally
+        from the http stream (always with the pandas parser), parquet files are read
+        row group by row group via ranged requests. Memory stays flat regardless of object size.
+
+        returns:
+        iterator of dataframes
+        """
+        if format == S3FileTypes.CSV.value:
+            response = self._bucket.Object(key=key).get()
+            run_metrics.add('s3.read_s3_to_df', calls=1, objects=1, bytes_in=response.get('ContentLength', 0))
+            csv_stream = response.get('Body')
+            yield from pd.read_csv(csv_stream, delimiter=DataParams.CSV_SEPARATOR.value,
+                                   encoding=DataParams.CSV_ENCODING.value, usecols=columns, dtype=dtypes,
+                                   chunksize=chunksize)
+        else:
+            run_metrics.add('s3.read_s3_to_df', calls=1, objects=1)
+            prq_file = pq.ParquetFile(S3ObjectReader(self._bucket.Object(key=key)).buffered())
+            for batch in prq_file.iter_batches(batch_size=chunksize, columns=columns):
+                df = batch.to_pandas()
+                yield df.astype(dtypes) if dtypes else df
+
+    def write_df_to_s3(self, df: pd.DataFrame, key: str, format: str,
+                       if_match: str = None, if_none_match: str = None):
         """
         Uploading a data file to a s3 bucket.
         Currently supports .csv & .parquet
@@ -75,22 +451,87 @@ class S3BucketConnector():
         :params df: dataframe to be uploaded
         :params key: name of file to be uploaded
         :params format: format of file to be uploaded (csv or parquet)
+        :params if_match: optional ETag, the write fails with PreconditionFailed
+                          if the object on s3 does not have this ETag anymore
+        :params if_none_match: optional '*', the write fails if the object already exists
+                              (conditional parquet writes are single puts, also with multipart_part_size)
         """
+        conditions = {}
+        if if_match is not None:
+            conditions['IfMatch'] = if_match
+        if if_none_match is not None:
+            conditions['IfNoneMatch'] = if_none_match
         if df.empty:
             self._logger.info("Dataframe is empty. No files will be written to s3")
-        elif format == S3FileTypes.CSV.value:
-            out_buffer = StringIO()
-            df.to_csv(out_buffer, index=False)
-            self._bucket.put_object(Body=out_buffer.getvalue(), Key=key)
-        elif format == S3FileTypes.PARQUET.value:
-            out_buffer = BytesIO()
-            df.to_parquet(out_buffer, index=False)
-            self._bucket.put_object(Body=out_buffer.getvalue(), Key=key)
-        else:
-            self._logger.info("File format does not exist. No files will be writen to s3")
-            raise WrongFormatException
+            return True
+        with run_metrics.call('s3.write_df_to_s3') as counters:
+            if format == S3FileTypes.CSV.value:
+                out_buffer = StringIO()
+                df.to_csv(out_buffer, index=False)
+                body = out_buffer.getvalue().encode(DataParams.CSV_ENCODING.value)
+                self._bucket.put_object(Body=body, Key=key, **conditions)
+            elif format == S3FileTypes.PARQUET.value and self.multipart_part_size and not conditions:
+                body = b''
+                counters['bytes_out'] = self._write_parquet_multipart(df, key)
+            elif format == S3FileTypes.PARQUET.value:
+                out_buffer = BytesIO()
+                df.to_parquet(out_buffer, index=False)
+                body = out_buffer.getvalue()
+                self._bucket.put_object(Body=body, Key=key, **conditions)
+            else:
+                self._logger.info("File format does not exist. No files will be writen to s3")
+                raise WrongFormatException
+            counters.update(objects=1, rows_in=len(df), bytes_out=counters.get('bytes_out', len(body)))
+        return True
+
+    def write_bytes_to_s3(self, data: bytes, key: str, if_none_match: str = None):
+        """
+        Uploading raw bytes (markers, manifests) to a s3 bucket
+
+        :params data: content of the file
+        :params key: name of file to be uploaded
+        :params if_none_match: optional '*', the write fails if the object already exists
+        """
+        conditions = {} if if_none_match is None else {'IfNoneMatch': if_none_match}
+        with run_metrics.call('s3.write_bytes_to_s3') as counters:
+            self._bucket.put_object(Body=data, Key=key, **conditions)
+            counters.update(objects=1, bytes_out=len(data))
         return True
 
+    def delete_files(self, keys: list):
+        """
+        Deleting files from the s3 bucket, in batches of up to 1000 keys per request
+
+        :params keys: names of the files to be deleted
+        """
+        with run_metrics.call('s3.delete_files') as counters:
+            for start in range(0, len(keys), 1000):
+                self._bucket.delete_objects(Delete={'Objects': [{'Key': key} for key in keys[start:start + 1000]],
+                                                    'Quiet': True})
+            counters['objects'] = len(keys)
+        return True
+
+    def _write_parquet_multipart(self, df: pd.DataFrame, key: str):
+        """
+        Streams a dataframe as parquet file to the s3 bucket. Row groups are encoded
+        one at a time and uploaded part by part as they are produced, the complete
+        file is never held in memory.
+
+        :params df: dataframe to be uploaded
+        :params key: name of file to be uploaded
+        returns:
+        size of the file in bytes
+        """
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        row_group_size = DataParams.PARQUET_ROW_GROUP_SIZE.value
+        with S3MultipartWriter(self._bucket.Object(key=key), self.multipart_part_size,
+                               self.multipart_concurrency) as out_file:
+            with pq.ParquetWriter(out_file, schema) as writer:
+                for start in range(0, len(df), row_group_size):
+                    writer.write_table(pa.Table.from_pandas(df.iloc[start:start + row_group_size],
+                                                            schema=schema, preserve_index=False))
+        return out_file.bytes_written
+
     # def return_objects(self, arg_date: str, date_format: str):
     #     """
     #     Returns a list of filename from a given date onwards, from an s3 bucket
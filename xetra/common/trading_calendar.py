@@ -0,0 +1,67 @@
+"""
+Calendar of the dates to be processed, with the Xetra trading calendar as optional filter
+"""
+import pandas as pd
+from pandas.tseries.holiday import AbstractHolidayCalendar, EasterMonday, GoodFriday, Holiday
+from pandas.tseries.offsets import CustomBusinessDay, Day
+from xetra.common.constants import MetaProcessFormat
+
+
+class XetraHolidayCalendar(AbstractHolidayCalendar):
+    """
+    Weekday holidays of the Xetra exchange, no trading takes place on these days
+    """
+    rules = [
+        Holiday('New Year', month=1, day=1),
+        GoodFriday,
+        EasterMonday,
+        Holiday('Labour Day', month=5, day=1),
+        Holiday('Christmas Eve', month=12, day=24),
+        Holiday('Christmas Day', month=12, day=25),
+        Holiday('Boxing Day', month=12, day=26),
+        Holiday('New Year Eve', month=12, day=31),
+    ]
+
+
+class TradingCalendar():
+    """
+    Vectorized date ranges of the dates to be processed. With trading_days_only the ranges
+    skip weekends & Xetra holidays, the previous date of a date is then the previous trading day.
+
+    @params trading_days_only: restrict the dates to the Xetra trading days
+    """
+    def __init__(self, trading_days_only: bool = False):
+        self.trading_days_only = trading_days_only
+        self.step = CustomBusinessDay(calendar=XetraHolidayCalendar()) if trading_days_only else Day()
+
+    def date_range(self, first_date, last_date):
+        """
+        Dates from the date before first_date till last_date, both with format "%YYYY-%M-%D"
+        or as date. The date before first_date is the look-back date of the range.
+
+        @params first_date: first date of the range
+        @params last_date: last date of the range
+        returns:
+        DatetimeIndex of the dates
+        """
+        return pd.date_range(pd.Timestamp(first_date) - self.step, pd.Timestamp(last_date), freq=self.step)
+
+    def processing_dates(self, dates: pd.DatetimeIndex, processed_dates):
+        """
+        Dates to be processed & gaps in a single pass over a range of date_range. The gaps are
+        the dates of the range after its look-back date not processed yet, the dates to be
+        processed are all dates from the date before the first gap on.
+
+        @params dates: DatetimeIndex returned by date_range
+        @params processed_dates: iterable of the dates processed already
+        returns:
+        tuple of (dates to be processed, gaps) as lists of strings with format "%YYYY-%M-%D"
+        """
+        is_gap = ~dates.isin(pd.to_datetime(list(processed_dates)))
+        # the look-back date is no gap
+        is_gap[0] = False
+        if not is_gap.any():
+            return [], []
+        date_format = MetaProcessFormat.META_DATE_FORMAT.value
+        return (dates[is_gap.argmax() - 1:].strftime(date_format).tolist(),
+                dates[is_gap].strftime(date_format).tolist())
@@ -0,0 +1,208 @@
+"""
+Backfill of report 1 over a long date range, split into date shards run in parallel
+"""
+import os
+import logging
+import socket
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from xetra.common.constants import BackfillFormat
+from xetra.common.instrumentation import run_metrics
+from xetra.common.s3 import clear_shared_resources
+
+
+def shard_date_range(extract_date: str, extract_date_list: list, shard_days: int):
+    """
+    Splits the dates of a run into shards of shard_days report dates. Every shard starts
+    with the date before its first report date as look-back date for the previous closing
+    price, the look-back date overlaps with the last date of the preceding shard.
+
+    @params extract_date: first report date of the run
+    @params extract_date_list: all dates of the run, look-back dates first
+    @params shard_days: number of report dates per shard
+    returns:
+    list of (extract_date, extract_date_list) per shard
+    """
+    first = len([date for date in extract_date_list if date < extract_date])
+    # the first shard keeps all look-back dates of the run
+    return [(extract_date_list[start], extract_date_list[start - 1 if start > first else 0:start + shard_days])
+            for start in range(first, len(extract_date_list), shard_days)]
+
+
+def _run_shard(etl_factory, shard: tuple, done_key: str):
+    """
+    Runs the ETL of a single shard and marks it as done
+
+    @params etl_factory: callable returning the XetraETL of a shard
+    @params shard: (extract_date, extract_date_list) of the shard
+    @params done_key: key of the marker written once the shard is loaded
+    """
+    xetra_etl = etl_factory(shard)
+    xetra_etl.etl_report1()
+    xetra_etl.s3_bucket_target.write_bytes_to_s3(datetime.now(timezone.utc).isoformat().encode(), done_key)
+    return shard
+
+
+class XetraBackfill():
+    """
+    Runs report 1 for the dates of a run in date shards, each shard with its own
+    XetraETL, its own look-back date and its own output files. The shards run in a
+    pool of etl_args.backfill_processes processes.
+
+    Several invocations of the same backfill (e.g. on different machines) share the work
+    through the target bucket: a shard is claimed by a conditional write of a claim object
+    before it runs and marked as done after its output has been written. The invocation
+    completing the last shard records all dates of the backfill in the meta file with a
+    single update. Claims of shards not done after BACKFILL_CLAIM_TIMEOUT seconds are
+    taken over, e.g. from a crashed invocation.
+
+    @params etl_factory: picklable callable returning a XetraETL: called with None it plans
+                         the run from the meta file, called with a shard it returns the
+                         XetraETL of the shard (XetraETL(..., shard=shard))
+    @params shard_days: number of report dates per shard
+    @params processes: number of shards run concurrently
+    """
+    def __init__(self, etl_factory, shard_days: int, processes: int = 1):
+        self._logger = logging.getLogger(__name__)
+        self.etl_factory = etl_factory
+        self.processes = processes
+        planner = etl_factory(None)
+        self.meta = planner.meta
+        self.meta_update_list = planner.meta_update_list
+        self.s3_bucket_target = planner.s3_bucket_target
+        self.shards = shard_date_range(planner.extract_date, planner.extract_date_list, shard_days)
+        # no prefix if all dates are processed already
+        self.prefix = (f'{BackfillFormat.BACKFILL_PREFIX.value}'
+                       f'{planner.extract_date}_{planner.extract_date_list[-1]}_{shard_days}/') \
+            if self.shards else None
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+
+    def shard_key(self, shard: tuple, kind: str):
+        """
+        Key of the claim or done marker of a shard
+
+        @params shard: (extract_date, extract_date_list) of the shard
+        @params kind: BACKFILL_CLAIM_PREFIX or BACKFILL_DONE_PREFIX
+        """
+        return f'{self.prefix}{kind}{shard[0]}_{shard[1][-1]}'
+
+    def _is_stale(self, key: str):
+        """
+        Whether a claim is older than the claim timeout
+        """
+        age = datetime.now(timezone.utc) - self.s3_bucket_target._bucket.Object(key).last_modified
+        return age > timedelta(seconds=BackfillFormat.BACKFILL_CLAIM_TIMEOUT.value)
+
+    def claim(self, shard: tuple, existing: set):
+        """
+        Claims a shard for this invocation
+
+        @params shard: (extract_date, extract_date_list) of the shard
+        @params existing: keys of the coordination objects found on the bucket
+        returns:
+        True if the shard is to be run by this invocation
+        """
+        claim_key = self.shard_key(shard, BackfillFormat.BACKFILL_CLAIM_PREFIX.value)
+        if self.shard_key(shard, BackfillFormat.BACKFILL_DONE_PREFIX.value) in existing:
+            return False
+        conditions = {'if_none_match': '*'}
+        if claim_key in existing:
+            if not self._is_stale(claim_key):
+                return False
+            self._logger.info('Taking over the stale claim of shard %s', claim_key)
+            # the write replaces the stale claim, if two invocations take it over both run the shard
+            conditions = {}
+        try:
+            self.s3_bucket_target.write_bytes_to_s3(self.owner.encode(), claim_key, **conditions)
+        except self.s3_bucket_target.exceptions.ClientError as error:
+            if error.response['Error']['Code'] not in ['PreconditionFailed', 'ConditionalRequestConflict']:
+                raise
+            return False
+        return True
+
+    def pending(self):
+        """
+        Lists the coordination objects of the backfill on the target bucket
+
+        returns:
+        tuple of (shards not done yet, whether the backfill is committed, set of keys found)
+        """
+        existing = set(self.s3_bucket_target.list_files_in_prefix(self.prefix))
+        pending = [shard for shard in self.shards
+                   if self.shard_key(shard, BackfillFormat.BACKFILL_DONE_PREFIX.value) not in existing]
+        return pending, self.prefix + BackfillFormat.BACKFILL_COMMIT_KEY.value in existing, existing
+
+    def commit(self):
+        """
+        Records all dates of the backfill in the meta file, once all shards are done. The commit
+        marker is written first as conditional write, only the invocation creating it updates
+        the meta file. If an invocation fails between both writes, the dates missing in the
+        meta file are recorded by the next invocation once the marker is older than
+        BACKFILL_CLAIM_TIMEOUT seconds.
+
+        returns:
+        True if the backfill is committed & recorded in the meta file
+        """
+        pending, committed, _ = self.pending()
+        if pending:
+            return False
+        commit_key = self.prefix + BackfillFormat.BACKFILL_COMMIT_KEY.value
+        if committed:
+            missing = self.meta.unrecorded_dates(self.s3_bucket_target, self.meta_update_list)
+            if not missing:
+                return True
+            if not self._is_stale(commit_key):
+                # the invocation holding the marker may still be updating the meta file
+                return False
+            self._logger.info("Recording %s dates of the stale commit of backfill %s", len(missing), self.prefix)
+            self.meta.update_meta_file(self.s3_bucket_target, missing)
+            return True
+        try:
+            self.s3_bucket_target.write_bytes_to_s3(self.owner.encode(), commit_key, if_none_match='*')
+        except self.s3_bucket_target.exceptions.ClientError as error:
+            if error.response['Error']['Code'] not in ['PreconditionFailed', 'ConditionalRequestConflict']:
+                raise
+            self._logger.info("Backfill %s is being committed by another invocation", self.prefix)
+            return False
+        self.meta.update_meta_file(self.s3_bucket_target, self.meta_update_list)
+        self._logger.info("All %s shards done, meta file has been updated", len(self.shards))
+        return True
+
+    def _claimed_shards(self, shards: list, existing: set):
+        for shard in shards:
+            if self.claim(shard, existing):
+                yield shard
+
+    @run_metrics.staged('backfill')
+    def run(self):
+        """
+        Runs all shards not done or claimed yet, then commits the backfill
+
+        returns:
+        True if the backfill is committed, False if shards of other invocations are still running
+        """
+        if not self.shards:
+            self._logger.info("No dates to backfill")
+            return True
+        pending, committed, existing = self.pending()
+        self._logger.info("Backfill %s: %s of %s shards pending", self.prefix, len(pending), len(self.shards))
+        claimed = self._claimed_shards(pending, existing)
+        if self.processes > 1 and len(pending) > 1:
+            # shards are claimed one at a time as processes become free,
+            # so concurrent invocations share the remaining shards
+            with ProcessPoolExecutor(max_workers=self.processes, initializer=clear_shared_resources) as executor:
+                running = set()
+                for shard in claimed:
+                    running.add(executor.submit(_run_shard, self.etl_factory, shard,
+                                                self.shard_key(shard, BackfillFormat.BACKFILL_DONE_PREFIX.value)))
+                    if len(running) >= self.processes:
+                        done, running = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self._logger.info("Shard %s done", future.result()[0])
+                for future in wait(running).done:
+                    self._logger.info("Shard %s done", future.result()[0])
+        else:
+            for shard in claimed:
+                _run_shard(self.etl_factory, shard, self.shard_key(shard, BackfillFormat.BACKFILL_DONE_PREFIX.value))
+                self._logger.info("Shard %s done", shard[0])
+        return self.commit()
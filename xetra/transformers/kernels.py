@@ -0,0 +1,107 @@
+"""
+Aggregation kernels of the Xetra reports
+"""
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+def concat_frames(frames: list):
+    """
+    Concatenates dataframes like pd.concat, but keeps categorical columns categorical.
+    The categories of every frame are unified & sorted, so sorting a categorical
+    column gives the same order as sorting its values.
+
+    @params frames: list of dataframes with the same columns
+    """
+    frames = list(frames)
+    for col, dtype in frames[0].dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            categories = union_categoricals([frame[col] for frame in frames], sort_categories=True).categories
+            for frame in frames:
+                frame[col] = frame[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _widen_dtypes(df: pd.DataFrame):
+    """
+    Casts compact dtypes of an aggregated dataframe back to the default ones:
+    categoricals to their values, float32 to float64
+    """
+    for col, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(dtype.categories.dtype)
+        elif dtype == 'float32':
+            df[col] = df[col].astype('float64')
+    return df
+
+
+def _sort_by_time(df: pd.DataFrame, col_time: str):
+    """
+    Stable sort by the time column. A categorical time column sorts by its categories,
+    which are sorted first if they are not already, e.g. in order of appearance as
+    parsed by the pyarrow engine.
+
+    @params df: source dataframe, not shared with the caller
+    @params col_time: time column
+    """
+    dtype = df[col_time].dtype
+    if isinstance(dtype, pd.CategoricalDtype) and not dtype.categories.is_monotonic_increasing:
+        df[col_time] = df[col_time].cat.reorder_categories(dtype.categories.sort_values())
+    return df.sort_values(by=[col_time], kind='stable')
+
+
+def first_last_rows(df: pd.DataFrame, src_args):
+    """
+    Reduces source data to the first & last trade (by time) of every ISIN & Date,
+    the only rows aggregate_ohlcv needs for the opening & closing price. Rows
+    aggregate_ohlcv would drop are dropped before, so the selected rows are the same.
+
+    @params df: source dataframe
+    @params src_args: XetraSourceConfig of the source columns
+    """
+    df = df.loc[:, src_args.src_columns].dropna()
+    df = _sort_by_time(df, src_args.src_col_time)
+    keys = [src_args.src_col_isin, src_args.src_col_date]
+    return df[~df.duplicated(subset=keys, keep='first') | ~df.duplicated(subset=keys, keep='last')]
+
+
+def aggregate_ohlcv(df: pd.DataFrame, src_args, target_args):
+    """
+    Reduces the source data to one row per ISIN & Date holding opening, closing,
+    minimum & maximum price and the traded volume of the day. The data is sorted
+    once by time and reduced in a single grouped aggregation. Compact source dtypes
+    (categoricals, float32) are widened again on the small aggregated result.
+
+    @params df: source dataframe
+    @params src_args: XetraSourceConfig of the source columns
+    @params target_args: XetraTargetConfig of the target columns
+    returns:
+    daily aggregates sorted by ISIN & Date
+    """
+    df = df.loc[:, src_args.src_columns].dropna()
+    df = _sort_by_time(df, src_args.src_col_time)
+    df = df.groupby([src_args.src_col_isin, src_args.src_col_date], as_index=False, sort=True, observed=True)\
+           .agg(**{target_args.trg_col_op_price: (src_args.src_col_start_price, 'first'),
+                   target_args.trg_col_clos_price: (src_args.src_col_start_price, 'last'),
+                   target_args.trg_col_min_price: (src_args.src_col_min_price, 'min'),
+                   target_args.trg_col_max_price: (src_args.src_col_max_price, 'max'),
+                   target_args.trg_col_daily_trad_vol: (src_args.src_col_traded_vol, 'sum')})
+    return _widen_dtypes(df)
+
+
+def prev_closing_change(df: pd.DataFrame, src_args, target_args, min_date: str):
+    """
+    Adds the change to the previous closing price to the daily aggregates
+    and drops the look-back dates before min_date
+
+    @params df: daily aggregates, one row per ISIN & Date
+    @params src_args: XetraSourceConfig of the source columns
+    @params target_args: XetraTargetConfig of the target columns
+    @params min_date: first date of the report
+    """
+    prev_closing_price = df.sort_values(by=[src_args.src_col_date])\
+                           .groupby([src_args.src_col_isin], observed=True)[target_args.trg_col_op_price].shift(1)
+    df[target_args.trg_col_ch_prev_clos] = ((df[target_args.trg_col_op_price] - prev_closing_price) /
+                                            prev_closing_price) * 100
+    df = df.round(decimals=2)
+    return df[df[src_args.src_col_date] >= min_date].reset_index(drop=True)
@@ -0,0 +1,111 @@
+"""
+Aggregation kernels of the Xetra reports as lazy, multi-threaded Polars query plans.
+Same signatures & results as xetra.transformers.kernels, requires polars.
+"""
+import pandas as pd
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+
+def _to_lazy(df: pd.DataFrame, columns: list):
+    """
+    Converts the columns of a pandas dataframe to a polars LazyFrame, categoricals
+    are passed on as strings. Only the given columns are converted at all.
+    """
+    if pl is None:
+        raise ImportError('The polars transform backend requires polars, pip install polars')
+    df = df.loc[:, columns] if list(df.columns) != list(columns) else df
+    return pl.from_pandas(df, nan_to_null=True).lazy()\
+             .with_columns(pl.col(pl.Categorical).cast(pl.String))
+
+
+def _to_pandas(lf, df_src: pd.DataFrame):
+    """
+    Collects a LazyFrame to pandas, string columns get the (widened) dtype
+    the pandas kernels would have given them
+    """
+    df = lf.collect().to_pandas()
+    for col in df.columns:
+        if col in df_src and df[col].dtype != df_src[col].dtype:
+            dtype = df_src[col].dtype
+            if isinstance(dtype, pd.CategoricalDtype):
+                dtype = dtype.categories.dtype
+            if not pd.api.types.is_numeric_dtype(dtype):
+                df[col] = df[col].astype(dtype)
+    return df
+
+
+def _aggregate_ohlcv_plan(lf, src_args, target_args):
+    """
+    Query plan of the daily aggregation, see aggregate_ohlcv
+    """
+    return lf.drop_nulls()\
+             .sort(src_args.src_col_time, maintain_order=True)\
+             .group_by([src_args.src_col_isin, src_args.src_col_date], maintain_order=False)\
+             .agg(pl.col(src_args.src_col_start_price).first().alias(target_args.trg_col_op_price),
+                  pl.col(src_args.src_col_start_price).last().alias(target_args.trg_col_clos_price),
+                  pl.col(src_args.src_col_min_price).min().alias(target_args.trg_col_min_price),
+                  pl.col(src_args.src_col_max_price).max().alias(target_args.trg_col_max_price),
+                  pl.col(src_args.src_col_traded_vol).sum().alias(target_args.trg_col_daily_trad_vol))\
+             .with_columns(pl.col(pl.Float32).cast(pl.Float64))\
+             .sort([src_args.src_col_isin, src_args.src_col_date])
+
+
+def _prev_closing_change_plan(lf, src_args, target_args, min_date: str):
+    """
+    Query plan of the change to the previous closing price, see prev_closing_change
+    """
+    prev_closing_price = pl.col(target_args.trg_col_op_price).shift(1)\
+                           .over(src_args.src_col_isin, order_by=src_args.src_col_date)
+    return lf.with_columns(((pl.col(target_args.trg_col_op_price) - prev_closing_price) /
+                            prev_closing_price * 100).alias(target_args.trg_col_ch_prev_clos))\
+             .with_columns(pl.col(pl.Float64).round(2))\
+             .filter(pl.col(src_args.src_col_date) >= min_date)
+
+
+def aggregate_ohlcv(df: pd.DataFrame, src_args, target_args):
+    """
+    Polars version of kernels.aggregate_ohlcv, only the source columns are converted
+
+    @params df: source dataframe
+    @params src_args: XetraSourceConfig of the source columns
+    @params target_args: XetraTargetConfig of the target columns
+    returns:
+    daily aggregates sorted by ISIN & Date
+    """
+    lf = _aggregate_ohlcv_plan(_to_lazy(df, src_args.src_columns), src_args, target_args)
+    return _to_pandas(lf, df)
+
+
+def prev_closing_change(df: pd.DataFrame, src_args, target_args, min_date: str):
+    """
+    Polars version of kernels.prev_closing_change
+
+    @params df: daily aggregates, one row per ISIN & Date
+    @params src_args: XetraSourceConfig of the source columns
+    @params target_args: XetraTargetConfig of the target columns
+    @params min_date: first date of the report
+    """
+    lf = _prev_closing_change_plan(_to_lazy(df, list(df.columns)), src_args, target_args, min_date)
+    return _to_pandas(lf, df)
+
+
+def transform_report1(df: pd.DataFrame, src_args, target_args, min_date: str):
+    """
+    Report 1 (daily aggregation & change to the previous closing price) as a single
+    lazy query plan. Only the source columns are converted to polars, the plan runs
+    multi-threaded without materializing intermediate sorted or filtered copies.
+    The date filter is applied to the daily aggregates: the look-back date before
+    min_date is needed for the previous closing price.
+
+    @params df: source dataframe (output of extract stage)
+    @params src_args: XetraSourceConfig of the source columns
+    @params target_args: XetraTargetConfig of the target columns
+    @params min_date: first date of the report
+    """
+    lf = _aggregate_ohlcv_plan(_to_lazy(df, src_args.src_columns), src_args, target_args)
+    lf = _prev_closing_change_plan(lf, src_args, target_args, min_date)
+    return _to_pandas(lf, df)
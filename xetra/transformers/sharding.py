@@ -0,0 +1,84 @@
+"""
+Multi-process execution of the report 1 transformation, sharded by ISIN
+"""
+import os
+import pandas as pd
+import pyarrow as pa
+from concurrent.futures import ProcessPoolExecutor
+from tempfile import TemporaryDirectory
+from xetra.common.constants import DataParams
+from xetra.transformers.kernels import aggregate_ohlcv, prev_closing_change
+
+
+def shard_by_isin(df: pd.DataFrame, col_isin: str, shards: int):
+    """
+    Hash partitions the rows by ISIN, all rows of an ISIN end up in the same shard.
+    The assignment only depends on the ISIN value, not on the dtype of the column.
+
+    @params df: source dataframe
+    @params col_isin: name of the ISIN column
+    @params shards: number of shards
+    returns:
+    list of non empty dataframes
+    """
+    isin = df[col_isin].astype(str) if isinstance(df[col_isin].dtype, pd.CategoricalDtype) else df[col_isin]
+    shard_ids = pd.util.hash_pandas_object(isin, index=False).to_numpy() % shards
+    return [df[shard_ids == shard_id] for shard_id in range(shards) if (shard_ids == shard_id).any()]
+
+
+def _write_ipc_file(df: pd.DataFrame, path: str):
+    """
+    Writes a dataframe as Arrow IPC file
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return path
+
+
+def _read_ipc_file(path: str):
+    """
+    Reads an Arrow IPC file memory mapped, without copying it to the heap first
+    """
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def _transform_shard(path: str, src_args, target_args, min_date: str):
+    """
+    Transforms one shard in a worker process. The shard is read from and its
+    (small) report is written to an Arrow IPC file next to it.
+
+    returns:
+    path of the report of the shard
+    """
+    df = _read_ipc_file(path)
+    df = prev_closing_change(aggregate_ohlcv(df, src_args, target_args), src_args, target_args, min_date)
+    return _write_ipc_file(df, f'{path}.report')
+
+
+def transform_report1_sharded(df: pd.DataFrame, src_args, target_args, min_date: str, processes: int):
+    """
+    Runs aggregate_ohlcv & prev_closing_change on ISIN shards of the source data in a
+    pool of processes. Every per-ISIN computation (including the previous closing price)
+    only depends on rows of the same ISIN, so the concatenated shard reports sorted
+    by ISIN & Date equal the report of the unsharded data.
+
+    @params df: source dataframe (output of extract stage)
+    @params src_args: XetraSourceConfig of the source columns
+    @params target_args: XetraTargetConfig of the target columns
+    @params min_date: first date of the report
+    @params processes: number of worker processes & shards
+    """
+    df = df.loc[:, src_args.src_columns]
+    # shards are exchanged as Arrow IPC files on the shared memory file system,
+    # dataframes are never pickled between the processes
+    shm_dir = DataParams.SHARED_MEMORY_DIR.value if os.path.isdir(DataParams.SHARED_MEMORY_DIR.value) else None
+    with TemporaryDirectory(dir=shm_dir) as tmp_dir:
+        paths = [_write_ipc_file(shard, os.path.join(tmp_dir, f'shard_{idx}.arrow'))
+                 for idx, shard in enumerate(shard_by_isin(df, src_args.src_col_isin, processes))]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            reports = list(executor.map(_transform_shard, paths, [src_args] * len(paths),
+                                        [target_args] * len(paths), [min_date] * len(paths)))
+        df = pd.concat([_read_ipc_file(report) for report in reports], ignore_index=True)
+    return df.sort_values(by=[src_args.src_col_isin, src_args.src_col_date], kind='stable').reset_index(drop=True)
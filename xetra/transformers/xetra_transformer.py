@@ -1,13 +1,22 @@
 """
 Xetra Data Core ETL Application layer
 """
+import asyncio
+import bisect
+import importlib
 import logging
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from typing import NamedTuple
 from xetra.common.s3 import S3BucketConnector
 from xetra.common.meta_process import MetaProcess
 from datetime import datetime
-from xetra.common.constants import S3FileTypes
+from xetra.common.constants import CheckpointFormat, MetaProcessFormat, S3FileTypes, TransformBackends
+from xetra.common.custom_exceptions import UnknownReport, WrongFormatException
+from xetra.common.instrumentation import run_metrics
+from xetra.transformers import polars_kernels
+from xetra.transformers.kernels import aggregate_ohlcv, concat_frames, first_last_rows, prev_closing_change
+from xetra.transformers.sharding import transform_report1_sharded
 
 
 class XetraSourceConfig(NamedTuple):
@@ -23,6 +32,7 @@ class XetraSourceConfig(NamedTuple):
     src_col_max_price: str
     src_col_min_price: str
     src_col_traded_vol: str
+    src_dtypes: dict = None
 
 
 class XetraTargetConfig(NamedTuple):
@@ -40,6 +50,45 @@ class XetraTargetConfig(NamedTuple):
     trg_key: str
     trg_key_date_format: str
     trg_format: str
+    trg_state_key: str = 'report1/state/xetra_report1_state.parquet'
+    trg_partition_key: str = None
+    trg_staging_prefix: str = 'staging/report1/'
+
+
+class XetraReportConfig(NamedTuple):
+    """
+    Configuration of an additional report computed from the same source data as report 1
+
+    name: name of the report
+    transform: name the transform has been registered with (XetraETL.register_report)
+               or its import path 'module:function'
+    trg_key: key prefix of the report files, the run timestamp & format are appended
+    trg_format: format of the report files (csv or parquet)
+    """
+    name: str
+    transform: str
+    trg_key: str
+    trg_format: str = 'parquet'
+
+
+class XetraETLConfig(NamedTuple):
+    """
+    Execution configuration & arguments of the pipeline
+    """
+    max_workers: int = 1
+    stream: bool = False
+    incremental: bool = False
+    meta_store: str = 'csv'
+    async_extract: bool = False
+    transform_processes: int = 1
+    reports: list = ()
+    transform_backend: str = 'pandas'
+    lookback_pushdown: bool = True
+    backfill_shard_days: int = 0
+    checkpoint: bool = False
+    change_detection: bool = False
+    backfill_processes: int = 1
+    trading_calendar: bool = False
 
 
 class XetraETL():
@@ -51,47 +100,285 @@ class XetraETL():
     @params meta_key: str <- might need to get rid of this one,
     @params src_args: source arguments for the pipeline,
     @params target_args: target arguments for the pipeline
+    @params etl_args: execution arguments for the pipeline (concurrency etc.)
+    @params s3_bucket_source_async: optional AsyncS3BucketConnector of the source bucket,
+                                    used for the extraction with etl_args.async_extract
+    @params shard: optional (extract_date, extract_date_list) of a backfill shard. The dates are
+                   not taken from the meta file, the outputs are keyed by the date range of the
+                   shard instead of the run timestamp and the meta file is not updated,
+                   see xetra.transformers.backfill
     """
+    # report transforms by name, see register_report
+    report_transforms = {}
+
     def __init__(self,
                  s3_bucket_source: S3BucketConnector,
                  s3_bucket_target: S3BucketConnector,
                  meta_key: str,
                  src_args: XetraSourceConfig,
-                 target_args: XetraTargetConfig):
+                 target_args: XetraTargetConfig,
+                 etl_args: XetraETLConfig = XetraETLConfig(),
+                 s3_bucket_source_async=None,
+                 shard: tuple = None):
         self._logger = logging.getLogger(__name__)
         self.s3_bucket_source = s3_bucket_source
+        self.s3_bucket_source_async = s3_bucket_source_async
         self.s3_bucket_target = s3_bucket_target
         self.meta_key = meta_key
         self.src_args = src_args
         self.target_args = target_args
-        self.meta = MetaProcess()
-        self.extract_date, self.extract_date_list = self.meta.return_date_list(self.s3_bucket_target,
-                                                                               self.src_args.src_first_extract_date)
+        self.etl_args = etl_args
+        if etl_args.transform_backend not in [backend.value for backend in TransformBackends]:
+            raise WrongFormatException(f'Unsupported transform backend {etl_args.transform_backend}')
+        self.meta = MetaProcess(self.etl_args.meta_store, self.etl_args.trading_calendar)
+        self.shard = shard
+        if shard is None:
+            self.extract_date, self.extract_date_list = \
+                self.meta.return_date_list(self.s3_bucket_target, self.src_args.src_first_extract_date)
+            if len(self.extract_date_list) > 1 and self.extract_date < self.extract_date_list[1]:
+                # after the first run the returned extract date is src_first_extract_date, the first
+                # date of the list is the processed look-back date before the first unprocessed one
+                self.extract_date = self.extract_date_list[1]
+        else:
+            # shards run side by side, a shared state table would be overwritten by each of them
+            self.extract_date, self.extract_date_list = shard
+            self.etl_args = self.etl_args._replace(incremental=False)
         self.meta_update_list = [date for date in self.extract_date_list if date >= self.extract_date]
+        # look-back dates after the extract date, of processed dates reported again
+        self.gap_lookback_dates = ()
+        # source objects recorded after the load, with etl_args.change_detection
+        self.source_objects = None
+        if self.etl_args.change_detection and shard is None and not self.etl_args.backfill_shard_days:
+            self._add_changed_dates()
+        self.reports = [(report, self.resolve_report(report.transform)) for report in self.etl_args.reports]
+        # dates only extracted for the previous closing price, additional reports need all rows
+        self.lookback_dates = tuple(date for date in self.extract_date_list
+                                    if date < self.extract_date or date in self.gap_lookback_dates) \
+            if self.etl_args.lookback_pushdown and not self.reports else ()
+
+    def _add_changed_dates(self):
+        """
+        Adds the processed dates whose source objects have been republished or late-added
+        since they were recorded to the run. A changed date is reported again together with
+        the next date with source data, whose previous closing price it provides, and the
+        date with source data before it is extracted as look-back date. All other processed
+        dates are left alone.
+        """
+        date_col = MetaProcessFormat.META_SOURCE_DATE_COLUMN.value
+        df_listing = self.meta.list_source_objects(self.s3_bucket_source, self.src_args.src_first_extract_date)
+        df_record = self.meta.read_source_record(self.s3_bucket_target)
+        changed = self.meta.changed_dates(df_listing, df_record)
+        source_dates = sorted(df_listing[date_col].unique())
+        reprocess = set(changed)
+        for date in changed:
+            following = bisect.bisect_right(source_dates, date)
+            if following < len(source_dates):
+                reprocess.add(source_dates[following])
+        if changed:
+            self._logger.info("Source objects of %s have changed, reprocessing %s",
+                              ', '.join(changed), ', '.join(sorted(reprocess)))
+        report_dates = set(self.meta_update_list) | reprocess
+        first_new_date = self.extract_date_list[0] if self.extract_date_list else self.extract_date
+        lookback = set()
+        for date in reprocess:
+            previous = bisect.bisect_left(source_dates, date) - 1
+            if previous >= 0 and source_dates[previous] not in report_dates:
+                lookback.add(source_dates[previous])
+        self.extract_date_list = sorted(set(self.extract_date_list) | report_dates | lookback)
+        if reprocess:
+            # the report starts at the first reprocessed date, earlier dates are look-back dates
+            self.extract_date = min(report_dates)
+        self.gap_lookback_dates = tuple(date for date in self.extract_date_list
+                                        if date >= self.extract_date and date not in report_dates)
+        # processed before the record existed, taken over as they are
+        unrecorded = set(source_dates[:bisect.bisect_left(source_dates, first_new_date)]) - set(df_record[date_col])
+        self.source_objects = df_listing[df_listing[date_col].isin(report_dates | unrecorded)]
+
+    def _drop_gap_lookback(self, df: pd.DataFrame):
+        """
+        Drops the look-back dates of reprocessed dates from the report
+
+        @params df: report dataframe
+        """
+        if not self.gap_lookback_dates or df.empty:
+            return df
+        return df[~df[self.src_args.src_col_date].isin(self.gap_lookback_dates)].reset_index(drop=True)
+
+    @classmethod
+    def register_report(cls, name: str, transform):
+        """
+        Registers a report transform, to be referenced by name in XetraReportConfig.transform
+
+        @params name: name of the transform
+        @params transform: callable taking the source dataframe and the XetraETL instance,
+                           returning the report dataframe. It must not modify the source data,
+                           all reports of a run share it.
+        """
+        cls.report_transforms[name] = transform
+        return transform
+
+    @classmethod
+    def resolve_report(cls, transform: str):
+        """
+        Returns the registered transform, or imports it from a 'module:function' path
+
+        @params transform: name or import path of the transform
+        """
+        if transform in cls.report_transforms:
+            return cls.report_transforms[transform]
+        module, _, function = transform.partition(':')
+        try:
+            return getattr(importlib.import_module(module), function)
+        except (ImportError, AttributeError, ValueError):
+            raise UnknownReport(f'Report transform {transform} is neither registered nor importable')
+
+    def _map(self, func, items: list):
+        """
+        Applies func to every item, in a bounded thread pool when more than one
+        worker is configured. The results always follow the order of items.
+
+        @params func: callable taking a single item
+        @params items: list of items to be processed
+        """
+        if self.etl_args.max_workers > 1 and len(items) > 1:
+            with ThreadPoolExecutor(max_workers=self.etl_args.max_workers) as executor:
+                return list(executor.map(func, items))
+        return [func(item) for item in items]
+
+    def _reduce_lookback(self, key: str, df: pd.DataFrame):
+        """
+        Files of a look-back date are only needed for the previous closing price,
+        of these only the first & last trade of every ISIN is kept
+
+        @params key: key of the source file, starting with its date
+        @params df: data of the source file
+        """
+        if self.lookback_dates and key.startswith(self.lookback_dates):
+            return first_last_rows(df, self.src_args)
+        return df
+
+    def _read_source_file(self, key: str):
+        """
+        Reads a single source file, parsing only the source columns
+        with the declared source dtypes. Files of look-back dates are
+        reduced to the rows needed for the previous closing price.
+
+        @params key: key of the source file
+        """
+        df = self.s3_bucket_source.read_s3_to_df(key, S3FileTypes.CSV.value,
+                                                 columns=self.src_args.src_columns,
+                                                 dtypes=self.src_args.src_dtypes)
+        return self._reduce_lookback(key, df)
+
+    def list_source_files(self):
+        """
+        Lists the source files of every date in the datelist, concurrently
+        if etl_args.max_workers > 1.
+
+        returns:
+        key manifest, a single list of keys ordered by date
+        """
+        listings = self._map(self.s3_bucket_source.list_files_in_prefix, self.extract_date_list)
+        return [key for keys in listings for key in keys]
 
+    @run_metrics.staged('extract')
     def extract(self):
         """
-        Iterate thru datelist and for each file call list files in prefix function
+        Iterate thru datelist and for each file call list files in prefix function.
+        Files are listed, fetched & parsed concurrently if etl_args.max_workers > 1.
 
         @todo : covert hardcoded file format types to params
         """
         self._logger.info("Extracting data from s3 bucket ...")
-        files = [key for date in self.extract_date_list
-                 for key in self.s3_bucket_source.list_files_in_prefix(date)]
+        files = self.list_source_files()
+        if not files:
+            df = pd.DataFrame()
+            self._logger.info("Dataframe empty")
+        else:
+            df = concat_frames(self._map(self._read_source_file, files))
+        run_metrics.add('extract', objects=len(files), rows_out=len(df))
+        self._logger.info("Data extraction finished")
+        return df
+
+    async def extract_async(self):
+        """
+        Like extract, but with the asynchronous source connector: all prefixes are listed
+        and all files fetched concurrently, with up to max_in_flight requests of the
+        connector in flight at the same time.
+        """
+        self._logger.info("Extracting data from s3 bucket ...")
+        async with self.s3_bucket_source_async as s3_bucket:
+            listings = await asyncio.gather(*[s3_bucket.list_files_in_prefix(date)
+                                              for date in self.extract_date_list])
+            files = [key for keys in listings for key in keys]
+            frames = await asyncio.gather(*[s3_bucket.read_s3_to_df(key, S3FileTypes.CSV.value,
+                                                                    columns=self.src_args.src_columns,
+                                                                    dtypes=self.src_args.src_dtypes)
+                                            for key in files])
+        frames = [self._reduce_lookback(key, df) for key, df in zip(files, frames)]
         if not files:
             df = pd.DataFrame()
             self._logger.info("Dataframe empty")
         else:
-            df = self.s3_bucket_source.read_s3_to_df(files[0], S3FileTypes.CSV.value)
-            df = pd.concat([self.s3_bucket_source.read_s3_to_df(obj, S3FileTypes.CSV.value)
-                            for obj in files], ignore_index=True)
+            df = concat_frames(frames)
+        run_metrics.add('extract', objects=len(files), rows_out=len(df))
         self._logger.info("Data extraction finished")
         return df
 
+    def extract_stream(self, date_list: list = None):
+        """
+        Generator version of extract. Yields the source data one date at a time,
+        in date order, so only a single day of raw data is held in memory.
+
+        @params date_list: dates to be extracted, defaults to the full datelist
+        returns:
+        generator of one dataframe per date with source files
+        """
+        self._logger.info("Streaming data from s3 bucket ...")
+        date_list = self.extract_date_list if date_list is None else date_list
+        listings = self._map(self.s3_bucket_source.list_files_in_prefix, date_list)
+        for date, files in zip(date_list, listings):
+            if files:
+                self._logger.info("Extracting data of %s", date)
+                df = concat_frames(self._map(self._read_source_file, files))
+                run_metrics.add('extract', objects=len(files), rows_out=len(df))
+                yield df
+        self._logger.info("Data extraction finished")
+
+    def _aggregate_daily(self, df: pd.DataFrame):
+        """
+        Reduces the source data to one row per ISIN & Date holding opening, closing,
+        minimum & maximum price and the traded volume of the day
+
+        @params df: source dataframe (output of extract stage)
+        """
+        if self.etl_args.transform_backend == TransformBackends.POLARS.value:
+            return polars_kernels.aggregate_ohlcv(df, self.src_args, self.target_args)
+        return aggregate_ohlcv(df, self.src_args, self.target_args)
+
+    def _finalize_report1(self, df: pd.DataFrame, min_date: str = None):
+        """
+        Adds the change to the previous closing price to the daily aggregates
+        and drops the look-back dates
+
+        @params df: daily aggregates, one row per ISIN & Date
+        @params min_date: first date of the report, defaults to the extract date
+        """
+        min_date = self.extract_date if min_date is None else min_date
+        if self.etl_args.transform_backend == TransformBackends.POLARS.value:
+            df = polars_kernels.prev_closing_change(df, self.src_args, self.target_args, min_date)
+        else:
+            df = prev_closing_change(df, self.src_args, self.target_args, min_date)
+        return self._drop_gap_lookback(df)
+
+    @run_metrics.staged('transform_report1')
     def transform_report1(self, df: pd.DataFrame):
         """
         Transform the dataframe via grouping, aggregation and other operations to
-        generate the output dataframe
+        generate the output dataframe. With etl_args.transform_backend 'polars' the
+        transformation runs as one lazy, multi-threaded polars query plan, otherwise with
+        etl_args.transform_processes > 1 the data is sharded by ISIN and the shards are
+        transformed in a pool of processes.
 
         @params df: dataframe to be transformed / converted (output of extract stage)
         """
@@ -99,58 +386,362 @@ class XetraETL():
             self._logger.info("Dataframe is empty, no transformation will be applied")
             return df
         self._logger.info("Applying transformation to the Xetra source data - report 1")
-        df = df.loc[:, self.src_args.src_columns]
-        df.dropna(inplace=True)
-        df[self.target_args.trg_col_op_price] = df.sort_values(by=[self.src_args.src_col_time])\
-                                                  .groupby([self.src_args.src_col_isin,
-                                                            self.src_args.src_col_date]
-                                                           )[self.src_args.src_col_start_price].transform('first')
-        df[self.target_args.trg_col_clos_price] = df.sort_values(by=[self.src_args.src_col_time])\
-                                                    .groupby([self.src_args.src_col_isin,
-                                                              self.src_args.src_col_date]
-                                                             )[self.src_args.src_col_start_price].transform('last')
-        df = df.groupby([self.src_args.src_col_isin, self.src_args.src_col_date],
-                        as_index=False).agg(opening_price_eur=(self.target_args.trg_col_op_price, 'min'),
-                                            closing_price_eur=(self.target_args.trg_col_clos_price, 'min'),
-                                            minimum_price_eur=(self.src_args.src_col_min_price, 'min'),
-                                            maximum_price_eur=(self.src_args.src_col_max_price, 'max'),
-                                            daily_traded_volume=(self.src_args.src_col_traded_vol, 'sum'))
-        df['prev_closing_price'] = df.sort_values(by=[self.src_args.src_col_date])\
-                                     .groupby([self.src_args.src_col_isin]
-                                              )[self.target_args.trg_col_op_price].shift(1)
-        df[self.target_args.trg_col_ch_prev_clos] = ((df[self.target_args.trg_col_op_price] -
-                                                      df['prev_closing_price']) /
-                                                     df['prev_closing_price']) * 100
-        df.drop(columns='prev_closing_price', inplace=True)
-        df = df.round(decimals=2)
-        df = df[df.Date >= self.extract_date].reset_index(drop=True)
-        df.round(decimals=2)
+        run_metrics.add('transform_report1', rows_in=len(df))
+        if self.etl_args.transform_backend == TransformBackends.POLARS.value:
+            df = polars_kernels.transform_report1(df, self.src_args, self.target_args, self.extract_date)
+            df = self._drop_gap_lookback(df)
+        elif self.etl_args.transform_processes > 1:
+            df = transform_report1_sharded(df, self.src_args, self.target_args, self.extract_date,
+                                           self.etl_args.transform_processes)
+            df = self._drop_gap_lookback(df)
+        else:
+            df = self._aggregate_daily(df)
+            df = self._finalize_report1(df)
+        run_metrics.add('transform_report1', rows_out=len(df))
+        self._logger.info("Transformation complete")
+        return df
+
+    @run_metrics.staged('transform_report1')
+    def transform_report1_stream(self, stream):
+        """
+        Streaming version of transform_report1. Every day of source data is reduced to
+        its daily aggregate as soon as it arrives, the raw rows are released right after.
+        The stage timing includes the extraction, which is driven by the stream.
+
+        @params stream: iterable of source dataframes, one per date (output of extract_stream)
+        """
+        self._logger.info("Applying transformation to the Xetra source data stream - report 1")
+        df_daily = [self._aggregate_daily(df) for df in stream]
+        if not df_daily:
+            self._logger.info("Dataframe is empty, no transformation will be applied")
+            return pd.DataFrame()
+        df = self._finalize_report1(pd.concat(df_daily, ignore_index=True))
+        run_metrics.add('transform_report1', rows_out=len(df))
+        self._logger.info("Transformation complete")
+        return df
+
+    def _checkpoint_keys(self, date: str):
+        """
+        Keys of the daily aggregate & the manifest of source keys of a date in the staging prefix.
+        Aggregates of look-back dates only hold the first & last trades and are kept apart.
+
+        @params date: date of the checkpoint
+        """
+        name = self.target_args.trg_staging_prefix + date
+        if date in self.lookback_dates:
+            name += CheckpointFormat.CHECKPOINT_LOOKBACK_SUFFIX.value
+        return (name + CheckpointFormat.CHECKPOINT_AGGREGATE_SUFFIX.value,
+                name + CheckpointFormat.CHECKPOINT_MANIFEST_SUFFIX.value)
+
+    def _read_checkpoint(self, date: str, files: list, staged: set):
+        """
+        Returns the checkpointed daily aggregate of a date, None if there
+        is no checkpoint for exactly these source files
+
+        @params date: date of the checkpoint
+        @params files: keys of the source files of the date
+        @params staged: keys found in the staging prefix
+        """
+        aggregate_key, manifest_key = self._checkpoint_keys(date)
+        if manifest_key not in staged:
+            return None
+        df_manifest = self.s3_bucket_target.read_s3_to_df(manifest_key, S3FileTypes.CSV.value)
+        if list(df_manifest[CheckpointFormat.CHECKPOINT_SOURCE_KEY_COLUMN.value]) != files:
+            self._logger.info("Source files of %s have changed since the checkpoint", date)
+            return None
+        if aggregate_key not in staged:
+            # the day had no complete rows, empty aggregates are not written
+            return pd.DataFrame()
+        return self.s3_bucket_target.read_s3_to_df(aggregate_key, S3FileTypes.PARQUET.value)
+
+    def _write_checkpoint(self, date: str, files: list, df_daily: pd.DataFrame):
+        """
+        Writes the daily aggregate of a date and the manifest of its source keys to the
+        staging prefix. The manifest is written last, it marks the checkpoint as complete.
+
+        @params date: date of the checkpoint
+        @params files: keys of the source files of the date
+        @params df_daily: daily aggregate of the date
+        """
+        aggregate_key, manifest_key = self._checkpoint_keys(date)
+        df_manifest = pd.DataFrame({CheckpointFormat.CHECKPOINT_SOURCE_KEY_COLUMN.value: files})
+        self.s3_bucket_target.write_df_to_s3(df_daily, aggregate_key, S3FileTypes.PARQUET.value)
+        self.s3_bucket_target.write_df_to_s3(df_manifest, manifest_key, S3FileTypes.CSV.value)
+
+    def aggregate_daily_checkpointed(self, date_list: list = None):
+        """
+        Extracts & aggregates the source data one date at a time like extract_stream and
+        transform_report1_stream, checkpointing the daily aggregate of every date in the
+        staging prefix of the target bucket together with the manifest of its source keys.
+        A restarted run takes the aggregates of finished dates from the staging prefix,
+        unless their source keys have changed, and resumes at the first unfinished date.
+
+        @params date_list: dates to be aggregated, defaults to the full datelist
+        returns:
+        list of daily aggregates, one per date with source files
+        """
+        date_list = self.extract_date_list if date_list is None else date_list
+        staged = set(self.s3_bucket_target.list_files_in_prefix(self.target_args.trg_staging_prefix))
+        listings = self._map(self.s3_bucket_source.list_files_in_prefix, date_list)
+        df_daily = []
+        for date, files in zip(date_list, listings):
+            if not files:
+                continue
+            df = self._read_checkpoint(date, files, staged)
+            if df is not None:
+                self._logger.info("Daily aggregate of %s taken from checkpoint", date)
+                run_metrics.add('checkpoint', objects=1, rows_out=len(df))
+            else:
+                self._logger.info("Extracting data of %s", date)
+                df_src = concat_frames(self._map(self._read_source_file, files))
+                run_metrics.add('extract', objects=len(files), rows_out=len(df_src))
+                df = self._aggregate_daily(df_src)
+                self._write_checkpoint(date, files, df)
+            df_daily.append(df)
+        return df_daily
+
+    @run_metrics.staged('transform_report1')
+    def transform_report1_checkpointed(self):
+        """
+        Checkpointed version of extract & transform_report1, see aggregate_daily_checkpointed
+        """
+        self._logger.info("Applying checkpointed transformation to the Xetra source data - report 1")
+        df_daily = self.aggregate_daily_checkpointed()
+        if not df_daily:
+            self._logger.info("Dataframe is empty, no transformation will be applied")
+            return pd.DataFrame()
+        df = self._finalize_report1(pd.concat(df_daily, ignore_index=True))
+        run_metrics.add('transform_report1', rows_out=len(df))
         self._logger.info("Transformation complete")
         return df
 
-    def load(self, df: pd.DataFrame):
+    def remove_checkpoints(self):
+        """
+        Deletes the checkpoints of the dates of the run from the staging prefix
+        """
+        self.s3_bucket_target.delete_files([key for date in self.extract_date_list
+                                            for key in self._checkpoint_keys(date)])
+
+    @run_metrics.staged('transform_reports')
+    def transform_reports(self, df: pd.DataFrame):
+        """
+        Runs the transforms of all additional reports over the same source data
+
+        @params df: source dataframe (output of extract stage)
+        returns:
+        list of tuples (XetraReportConfig, report dataframe)
+        """
+        if df.empty:
+            return [(report, df) for report, _ in self.reports]
+        self._logger.info("Applying transformation to the Xetra source data - %s",
+                          ', '.join(report.name for report, _ in self.reports))
+        return [(report, transform(df, self)) for report, transform in self.reports]
+
+    def _fan_out(self, stream, df_reports: list):
+        """
+        Passes a stream of source dataframes through, running the transforms of the
+        additional reports on every dataframe on the way. The reports of all dataframes
+        are concatenated into df_reports once the stream is exhausted.
+
+        @params stream: iterable of source dataframes, one per date
+        @params df_reports: list extended with tuples (XetraReportConfig, report dataframe)
+        """
+        parts = [[] for _ in self.reports]
+        for df in stream:
+            for idx, (_, df_report) in enumerate(self.transform_reports(df)):
+                parts[idx].append(df_report)
+            yield df
+        df_reports.extend((report, pd.concat(part, ignore_index=True) if part else pd.DataFrame())
+                          for (report, _), part in zip(self.reports, parts))
+
+    def read_state(self):
+        """
+        Reads the incremental state table from the target bucket. The state holds
+        the latest daily aggregate (incl. date & prices) of every ISIN processed so far.
+
+        returns:
+        state dataframe, None if no state has been written yet
+        """
+        try:
+            return self.s3_bucket_target.read_s3_to_df(self.target_args.trg_state_key,
+                                                       S3FileTypes.PARQUET.value)
+        except self.s3_bucket_target.exceptions.NoSuchKey:
+            self._logger.info("No state found, previous closing prices are taken from the look-back date")
+            return None
+
+    def _update_state(self, df_state: pd.DataFrame, df_daily: pd.DataFrame):
+        """
+        Returns the state table updated with the latest daily aggregate of every ISIN
+
+        @params df_state: current state, may be None
+        @params df_daily: daily aggregates of the run
+        """
+        df = pd.concat([df_state, df_daily], ignore_index=True)
+        return df.sort_values(by=[self.src_args.src_col_isin, self.src_args.src_col_date])\
+                 .drop_duplicates(subset=[self.src_args.src_col_isin], keep='last')\
+                 .reset_index(drop=True)
+
+    @run_metrics.staged('transform_report1')
+    def transform_report1_incremental(self, df_reports: list = None):
+        """
+        Incremental version of extract & transform_report1. If the state table already
+        holds the look-back date, the look-back date is not extracted at all and only the
+        new dates are read and aggregated. State rows before the look-back date are not
+        used for the previous closing price, as in the batch mode.
+        The stage timing includes the extraction, which is driven by the stream.
+
+        @params df_reports: if given, the additional reports are computed over the
+                            extracted dates as well and appended to this list
+
+        returns:
+        tuple of (report dataframe, updated state dataframe)
+        """
+        df_state = self.read_state()
+        lookback_date, new_dates = self.extract_date_list[:1], self.extract_date_list[1:]
+        # the state is only written by incremental runs, it is stale after other runs & backfills
+        # both paths report from the extract date, the first date after the look-back date
+        if df_state is not None and new_dates and lookback_date[0] < self.extract_date and \
+                lookback_date[0] <= df_state[self.src_args.src_col_date].max() < new_dates[0]:
+            self._logger.info("Previous closing prices taken from state, skipping look-back date %s",
+                              lookback_date[0])
+            date_list, df_lookback = new_dates, df_state[df_state[self.src_args.src_col_date] >= lookback_date[0]]
+        else:
+            date_list, df_lookback = self.extract_date_list, None
+        self._logger.info("Applying incremental transformation to the Xetra source data - report 1")
+        if self.etl_args.checkpoint and df_reports is None:
+            df_daily = self.aggregate_daily_checkpointed(date_list)
+        else:
+            stream = self.extract_stream(date_list)
+            if df_reports is not None:
+                stream = self._fan_out(stream, df_reports)
+            df_daily = [self._aggregate_daily(df) for df in stream]
+        if not df_daily:
+            self._logger.info("Dataframe is empty, no transformation will be applied")
+            return pd.DataFrame(), df_state
+        df_daily = pd.concat(df_daily, ignore_index=True)
+        df_new_state = self._update_state(df_state, df_daily)
+        if df_lookback is not None:
+            df_daily = pd.concat([df_lookback, df_daily], ignore_index=True)
+        df = self._finalize_report1(df_daily, self.extract_date)
+        run_metrics.add('transform_report1', rows_out=len(df))
+        self._logger.info("Transformation complete")
+        return df, df_new_state
+
+    def load_partitioned(self, df: pd.DataFrame):
+        """
+        Writes the report as date partitioned dataset, one file per trading day at
+        target_args.trg_partition_key (e.g. 'report1/date={date}/xetra_daily_report1.parquet').
+        The keys are deterministic, a rerun overwrites exactly the days it touches.
+
+        @params df: dataframe to be uploaded to the s3 bucket (output of transform stage)
+        returns:
+        list of keys written
+        """
+        if df.empty:
+            self._logger.info("Dataframe is empty. No files will be written to s3")
+            return []
+        partitions = [(self.target_args.trg_partition_key.format(date=date), df_date.reset_index(drop=True))
+                      for date, df_date in df.groupby(self.src_args.src_col_date, sort=True)]
+        self._map(lambda partition: self.s3_bucket_target.write_df_to_s3(partition[1], partition[0],
+                                                                         S3FileTypes.PARQUET.value),
+                  partitions)
+        return [key for key, _ in partitions]
+
+    def output_suffix(self):
+        """
+        Suffix of the target keys of the run: the run timestamp,
+        for a backfill shard its first & last date
+        """
+        if self.shard is not None:
+            return f'{self.extract_date}_{self.extract_date_list[-1]}'
+        return datetime.today().strftime(self.target_args.trg_key_date_format)
+
+    def load_reports(self, df_reports: list):
         """
-        Loads the data to an s3 bucket, updates meta file
+        Writes the additional reports, each one to its own target key
+
+        @params df_reports: list of tuples (XetraReportConfig, report dataframe)
+        returns:
+        list of keys written
+        """
+        suffix = self.output_suffix()
+        reports = [(f'{report.trg_key}{suffix}.{report.trg_format}', report.trg_format, df)
+                   for report, df in df_reports]
+        self._map(lambda report: self.s3_bucket_target.write_df_to_s3(report[2], report[0], report[1]), reports)
+        return [key for key, _, _ in reports]
+
+    @run_metrics.staged('load')
+    def load(self, df: pd.DataFrame, df_state: pd.DataFrame = None, df_reports: list = None):
+        """
+        Loads the data to an s3 bucket, updates state & meta file and removes the checkpoints of the run
 
         @params df: dataframe to be uploaded to the s3 bucket (output of transform stage)
+        @params df_state: incremental state table, written before the meta file if given
+        @params df_reports: additional reports, list of tuples (XetraReportConfig, report dataframe)
 
         @todo : covert hardcoded file format types to params
         """
-        target_key = self.target_args.trg_key +\
-            datetime.today().strftime(self.target_args.trg_key_date_format) +\
-            "." + self.target_args.trg_format
-        self.s3_bucket_target.write_df_to_s3(df, target_key, S3FileTypes.PARQUET.value)
+        run_metrics.add('load', rows_in=len(df))
+        if self.target_args.trg_partition_key:
+            self.load_partitioned(df)
+        else:
+            target_key = self.target_args.trg_key + self.output_suffix() + "." + self.target_args.trg_format
+            self.s3_bucket_target.write_df_to_s3(df, target_key, S3FileTypes.PARQUET.value)
         self._logger.info("Xetra data sucessfully written.")
-        self.meta.update_meta_file(self.s3_bucket_target,
-                                   self.meta_update_list)
-        self._logger.info("Meta file has been updated")
+        if df_reports:
+            self.load_reports(df_reports)
+            self._logger.info("Additional reports have been written")
+        if df_state is not None:
+            self.s3_bucket_target.write_df_to_s3(df_state, self.target_args.trg_state_key,
+                                                 S3FileTypes.PARQUET.value)
+            self._logger.info("State has been updated")
+        if self.shard is not None:
+            self._logger.info("Backfill shard, the meta file is updated once all shards are done")
+        else:
+            self.meta.update_meta_file(self.s3_bucket_target,
+                                       self.meta_update_list)
+            self._logger.info("Meta file has been updated")
+        if self.source_objects is not None:
+            self.meta.update_source_record(self.s3_bucket_target, self.source_objects)
+            self._logger.info("Source objects have been recorded")
+        if self.etl_args.checkpoint:
+            self.remove_checkpoints()
+            self._logger.info("Checkpoints have been removed")
         return True
 
     def etl_report1(self):
         """
-        Main ETL Function, acts as wrapper to other smaller functions
+        Main ETL Function, acts as wrapper to other smaller functions.
+        With etl_args.stream the data is extracted & aggregated one day at a time,
+        with etl_args.async_extract the source files are fetched by the asynchronous connector,
+        with etl_args.incremental previous closing prices are carried over in a state table,
+        with etl_args.checkpoint the daily aggregates are checkpointed and a restarted run resumes
+        at the first unfinished date, with etl_args.change_detection processed dates whose source
+        objects have changed are reported again.
+        The additional reports of etl_args.reports are computed from the same extracted
+        data, in the streaming & incremental modes one day at a time. They need all source rows,
+        checkpoints are not used with additional reports.
         """
-        df = self.extract()
-        df = self.transform_report1(df)
-        self.load(df)
+        df_reports = [] if self.reports else None
+        if self.etl_args.incremental:
+            df, df_state = self.transform_report1_incremental(df_reports)
+            self.load(df, df_state, df_reports)
+            return True
+        if self.etl_args.checkpoint and not self.reports:
+            df = self.transform_report1_checkpointed()
+        elif self.etl_args.stream:
+            stream = self.extract_stream()
+            if self.reports:
+                stream = self._fan_out(stream, df_reports)
+            df = self.transform_report1_stream(stream)
+        else:
+            if self.etl_args.async_extract:
+                with run_metrics.stage('extract'):
+                    df = asyncio.run(self.extract_async())
+            else:
+                df = self.extract()
+            if self.reports:
+                df_reports = self.transform_reports(df)
+            df = self.transform_report1(df)
+        self.load(df, df_reports=df_reports)
         return True